@@ -0,0 +1,4 @@
+import time
+
+# When the app package started importing, the origin of the cold-start timings
+IMPORT_STARTED = time.perf_counter()
@@ -0,0 +1,354 @@
+"""Admission control: event-loop lag shedding and adaptive per-provider concurrency limits"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from .providers.base import BaseProvider
+from .providers.errors import ProviderError, ProviderTimeoutError
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# Event-loop lag above which low priority requests are shed, twice this sheds normal ones too
+ADMISSION_MAX_LOOP_LAG_MS = float(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", "100"))
+ADMISSION_LAG_INTERVAL_MS = float(os.getenv("ADMISSION_LAG_INTERVAL_MS", "50"))
+# Concurrency limit per provider: starts at the initial value, moves between min and max
+# (max defaults to the provider's max_concurrency)
+ADMISSION_INITIAL_LIMIT = int(os.getenv("ADMISSION_INITIAL_LIMIT", "16"))
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", "2"))
+ADMISSION_MAX_LIMIT = int(os.getenv("ADMISSION_MAX_LIMIT", "0"))
+# Factor the limit is cut by on an overload signal
+ADMISSION_BACKOFF = float(os.getenv("ADMISSION_BACKOFF", "0.9"))
+# Recent latency this many times the lowest seen counts as overload. 0 reacts only to
+# timeouts and upstream 429 / 5xx: with answers of very different lengths, latency
+# alone does not tell load apart from long answers
+ADMISSION_LATENCY_TOLERANCE = float(os.getenv("ADMISSION_LATENCY_TOLERANCE", "0"))
+# Longest a request waits for a slot; if the expected wait is longer it is shed at once
+ADMISSION_QUEUE_TIMEOUT_MS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "1000"))
+
+LOW = 0
+NORMAL = 1
+HIGH = 2
+PRIORITIES = {"low": LOW, "normal": NORMAL, "high": HIGH}
+
+# Set from the X-Priority header by AdmissionMiddleware
+request_priority: ContextVar[int] = ContextVar("request_priority", default=NORMAL)
+
+# Upstream statuses that mean "too much load", as opposed to a bad request
+OVERLOAD_STATUS_CODES = {429, 502, 503, 504}
+
+
+class OverloadedError(ProviderError):
+    """Shed by admission control before reaching the provider"""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float, provider: Optional[str] = None):
+        super().__init__(message, provider=provider, retryable=False)
+        self.retry_after = retry_after
+
+
+def is_overload(error: BaseException) -> bool:
+    if isinstance(error, (ProviderTimeoutError, asyncio.TimeoutError)):
+        return True
+    return (
+        isinstance(error, ProviderError)
+        and not isinstance(error, OverloadedError)
+        and error.retryable
+        and error.status_code in OVERLOAD_STATUS_CODES
+    )
+
+
+class LoopLagMonitor:
+    """How late a timer fires on the event loop, i.e. how long ready callbacks wait"""
+
+    def __init__(self, interval_ms: float = ADMISSION_LAG_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lag_ms = max(time.monotonic() - start - self.interval, 0.0) * 1000
+            self.max_lag_ms = max(self.max_lag_ms, self.lag_ms)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit for one provider with a priority queue in front.
+
+    Every finished call is a sample. A timeout or an upstream 429 / 5xx,
+    or (with a `tolerance`) recent latency above `tolerance` times the
+    no-load latency, cuts the limit by `backoff`, at most once per round
+    trip (only samples that started after the last cut count). Other
+    samples grow it by 1/limit while the limit is in use, i.e. by about
+    one per round trip.
+
+    Recent latency is an EWMA; no-load latency is the lowest latency
+    seen, drifting slowly up so that a slower model or network is learnt.
+
+    Requests past the limit wait by priority, then arrival. A request is
+    shed at once instead of waiting when its priority is low, or when the
+    queue ahead of it would take longer than `queue_timeout` to drain.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_limit: int,
+        initial: int = ADMISSION_INITIAL_LIMIT,
+        min_limit: int = ADMISSION_MIN_LIMIT,
+        backoff: float = ADMISSION_BACKOFF,
+        tolerance: float = ADMISSION_LATENCY_TOLERANCE,
+        queue_timeout_ms: float = ADMISSION_QUEUE_TIMEOUT_MS,
+    ):
+        self.name = name
+        self.min_limit = min(min_limit, max_limit)
+        self.max_limit = max_limit
+        self.limit = float(max(self.min_limit, min(initial, max_limit)))
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.queue_timeout = queue_timeout_ms / 1000
+        self.in_flight = 0
+        self.short_latency_ms: Optional[float] = None
+        self.min_latency_ms: Optional[float] = None
+        self._last_cut = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self.decreases = 0
+
+    def _expected_wait(self, priority: int) -> float:
+        """Seconds until a request of `priority` joining the queue now would get a slot"""
+        ahead = sum(1 for negated, _, _ in self._waiters if -negated >= priority)
+        latency = (self.short_latency_ms or 0.0) / 1000
+        return (ahead + 1) / max(self.limit, 1) * latency
+
+    async def acquire(self, priority: int, retry_after: float, max_wait: Optional[float] = None):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        timeout = self.queue_timeout if max_wait is None else min(self.queue_timeout, max_wait)
+        if priority == LOW or self._expected_wait(priority) > timeout:
+            raise OverloadedError(
+                f"{self.name} is at its concurrency limit ({int(self.limit)}), retry later",
+                retry_after=retry_after,
+                provider=self.name,
+            )
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._order), future))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return
+            future.cancel()
+            raise OverloadedError(
+                f"no {self.name} slot within {timeout * 1000:.0f}ms, retry later",
+                retry_after=retry_after,
+                provider=self.name,
+            )
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled: hand the slot back
+                self.release()
+            future.cancel()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def on_sample(self, started_at: float, latency_ms: Optional[float], overloaded: bool):
+        if latency_ms is not None:
+            if self.short_latency_ms is None:
+                self.short_latency_ms = self.min_latency_ms = latency_ms
+            self.short_latency_ms += (latency_ms - self.short_latency_ms) * 0.1
+            if latency_ms < self.min_latency_ms:
+                self.min_latency_ms = latency_ms
+            else:
+                self.min_latency_ms += (latency_ms - self.min_latency_ms) * 0.001
+            if self.tolerance and self.short_latency_ms > self.tolerance * self.min_latency_ms:
+                overloaded = True
+        if overloaded:
+            if started_at >= self._last_cut:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_cut = time.monotonic()
+                self.decreases += 1
+        elif self.in_flight + 1 >= self.limit / 2:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": sum(1 for _, _, future in self._waiters if not future.done()),
+            "decreases": self.decreases,
+            "latency_ms": round(self.short_latency_ms or 0.0, 1),
+            "min_latency_ms": round(self.min_latency_ms or 0.0, 1),
+        }
+
+
+class AdmissionController:
+    def __init__(self, enabled: bool = ADMISSION_ENABLED, max_loop_lag_ms: float = ADMISSION_MAX_LOOP_LAG_MS):
+        self.enabled = enabled
+        self.max_loop_lag_ms = max_loop_lag_ms
+        self.loop_lag = LoopLagMonitor()
+        self.limits: Dict[str, AdaptiveLimit] = {}
+        self.admitted = 0
+        self.shed_loop_lag = 0
+        self.shed_limit = 0
+
+    def start(self):
+        if self.enabled:
+            self.loop_lag.start()
+
+    async def close(self):
+        await self.loop_lag.close()
+
+    def _limit(self, provider: BaseProvider) -> AdaptiveLimit:
+        limit = self.limits.get(provider.name)
+        if limit is None:
+            max_limit = ADMISSION_MAX_LIMIT or provider.max_concurrency
+            limit = self.limits[provider.name] = AdaptiveLimit(provider.name, max_limit)
+        return limit
+
+    def shed_for_lag(self, priority: int) -> bool:
+        """Whether the event loop is too far behind to take a request of this priority"""
+        if not self.enabled or priority == HIGH:
+            return False
+        lag = self.loop_lag.lag_ms
+        if lag > 2 * self.max_loop_lag_ms or (priority == LOW and lag > self.max_loop_lag_ms):
+            self.shed_loop_lag += 1
+            return True
+        return False
+
+    @staticmethod
+    def retry_after(provider: BaseProvider) -> float:
+        """Seconds a shed client should wait: the provider's recent p99"""
+        return max(1.0, math.ceil((provider.latency_percentile(99) or 0.0) / 1000))
+
+    async def acquire(self, provider: BaseProvider, max_wait: Optional[float] = None) -> float:
+        """
+        Wait for (or be refused) a slot for `provider`, at most `max_wait`
+        seconds if given; returns the start time to release with
+        """
+        if not self.enabled:
+            return time.monotonic()
+        try:
+            await self._limit(provider).acquire(
+                request_priority.get(), self.retry_after(provider), max_wait
+            )
+        except OverloadedError:
+            self.shed_limit += 1
+            raise
+        self.admitted += 1
+        return time.monotonic()
+
+    def release(self, provider: BaseProvider, started_at: float, error: Optional[BaseException] = None):
+        """Give the slot back and feed the call's outcome to the provider's limit"""
+        if not self.enabled:
+            return
+        limit = self._limit(provider)
+        limit.release()
+        if error is None:
+            limit.on_sample(started_at, (time.monotonic() - started_at) * 1000, False)
+        elif is_overload(error):
+            limit.on_sample(started_at, None, True)
+
+    @asynccontextmanager
+    async def slot(self, provider: BaseProvider, max_wait: Optional[float] = None) -> AsyncIterator[None]:
+        started_at = await self.acquire(provider, max_wait)
+        try:
+            yield
+        except BaseException as e:
+            self.release(provider, started_at, e)
+            raise
+        self.release(provider, started_at)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "loop_lag_ms": round(self.loop_lag.lag_ms, 1),
+            "max_loop_lag_ms": round(self.loop_lag.max_lag_ms, 1),
+            "admitted": self.admitted,
+            "shed_loop_lag": self.shed_loop_lag,
+            "shed_limit": self.shed_limit,
+            "providers": {name: limit.stats() for name, limit in self.limits.items()},
+        }
+
+
+admission = AdmissionController()
+
+
+class AdmissionMiddleware:
+    """
+    Reads the request's `X-Priority` (low, normal, high) and, for chat
+    requests, refuses them with a 503 before the body is even read when the
+    event loop is lagging too far behind to serve them in time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/chat"):
+            await self.app(scope, receive, send)
+            return
+        priority = NORMAL
+        for name, value in scope["headers"]:
+            if name == b"x-priority":
+                priority = PRIORITIES.get(value.decode("latin-1").strip().lower(), NORMAL)
+                break
+        if admission.shed_for_lag(priority):
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 503,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"retry-after", b"1"),
+                    ],
+                }
+            )
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": b'{"error":503,"detail":"Server overloaded, retry later","provider":null}',
+                }
+            )
+            return
+        token = request_priority.set(priority)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_priority.reset(token)
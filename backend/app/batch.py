@@ -0,0 +1,115 @@
+"""Bounded parallel fan-out behind /chat/batch"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from pydantic import ValidationError
+
+from .models import APIKeyRequestProvider, ChatRequest
+from .tracing import untraced_context
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+# Requests of one batch in flight at once
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "32"))
+# Upstream calls of one batch in flight per provider, leaves room for /chat traffic
+BATCH_PROVIDER_CONCURRENCY = int(os.getenv("BATCH_PROVIDER_CONCURRENCY", "8"))
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class ProviderLimiter:
+    """One semaphore per provider, created on first use"""
+
+    def __init__(self, limit: int = BATCH_PROVIDER_CONCURRENCY):
+        self.limit = limit
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @asynccontextmanager
+    async def slot(self, provider_name: str) -> AsyncIterator[None]:
+        semaphore = self._semaphores.get(provider_name)
+        if semaphore is None:
+            semaphore = self._semaphores[provider_name] = asyncio.Semaphore(self.limit)
+        async with semaphore:
+            yield
+
+
+def parse_jsonl(body: bytes) -> List[Union[ChatRequest, ValidationError]]:
+    """One ChatRequest per non-empty line; invalid lines are kept as their error"""
+    items: List[Union[ChatRequest, ValidationError]] = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(ChatRequest.model_validate_json(line))
+        except ValidationError as e:
+            items.append(e)
+    return items
+
+
+def parse_api_keys_header(value: str) -> List[APIKeyRequestProvider]:
+    """`name=key,name=key` as sent in the X-API-Keys header"""
+    keys = []
+    for pair in value.split(","):
+        name, _, api_key = pair.strip().partition("=")
+        if name and api_key:
+            keys.append(APIKeyRequestProvider(name=name.strip(), api_key=api_key.strip()))
+    return keys
+
+
+def with_default_keys(
+    request: ChatRequest, api_keys: List[APIKeyRequestProvider]
+) -> ChatRequest:
+    if request.api_keys or not api_keys:
+        return request
+    return request.model_copy(update={"api_keys": api_keys})
+
+
+async def fan_out(
+    items: Sequence[T],
+    worker: Callable[[T], Awaitable[R]],
+    concurrency: int = BATCH_CONCURRENCY,
+) -> AsyncIterator[Tuple[int, Union[R, Exception]]]:
+    """
+    Run `worker` over `items` with at most `concurrency` calls in flight and
+    yield `(index, result)` in completion order. A failing item yields its
+    exception instead of stopping the batch.
+
+    Only `concurrency` tasks are created however large the batch is; they
+    pull the next item from a shared iterator. If the consumer stops early
+    (client disconnect) the remaining work is cancelled.
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    pending = iter(enumerate(items))
+
+    async def run():
+        for index, item in pending:
+            try:
+                outcome = await worker(item)
+            except Exception as e:
+                outcome = e
+            results.put_nowait((index, outcome))
+
+    # Items keep the request's priority but must not record spans into its trace
+    tasks = [
+        asyncio.create_task(run(), context=untraced_context())
+        for _ in range(min(concurrency, len(items)))
+    ]
+    try:
+        for _ in range(len(items)):
+            yield await results.get()
+    finally:
+        for task in tasks:
+            task.cancel()
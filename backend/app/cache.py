@@ -0,0 +1,387 @@
+"""Response cache in front of chat_completion"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .health import hash_api_key, health_registry
+from .models import ChatRequest, ChatResponse
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+# Path to a SQLite file shared by every worker on the host, unset = in-process only
+RESPONSE_CACHE_SHARED_PATH = os.getenv("RESPONSE_CACHE_SHARED_PATH")
+# Rows kept in the shared tier, the ones closest to expiry are deleted past this
+RESPONSE_CACHE_SHARED_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_SHARED_MAX_ENTRIES", "100000"))
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "false").lower() == "true"
+RESPONSE_CACHE_SEMANTIC_THRESHOLD = float(
+    os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", "0.95")
+)
+RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES = int(
+    os.getenv("RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES", "10000")
+)
+# Semantic indexes kept in memory, least recently used ones are dropped past this
+RESPONSE_CACHE_SEMANTIC_MAX_PARTITIONS = int(
+    os.getenv("RESPONSE_CACHE_SEMANTIC_MAX_PARTITIONS", "256")
+)
+# "key": entries are private to the API key that produced them.
+# "shared": entries are shared across keys, but only served to keys the
+# health registry has seen working, so an arbitrary key string gets nothing
+RESPONSE_CACHE_SCOPE = os.getenv("RESPONSE_CACHE_SCOPE", "key").lower()
+
+
+def _digest(payload: dict) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def cacheable(request: ChatRequest) -> bool:
+    """`cache` if the request sets it, else only deterministic (temperature 0) requests"""
+    return request.cache if request.cache is not None else request.temperature == 0
+
+
+def request_keys(
+    provider: str, model: str, request: ChatRequest, api_key: Optional[str] = None
+) -> Tuple[str, str]:
+    """
+    Canonical cache keys for a request.
+    Returns (params_key, exact_key): params_key covers everything except the
+    messages and partitions the semantic index, exact_key covers everything.
+    With `api_key` both keys are scoped to that key.
+    """
+    params = {
+        "provider": provider,
+        "model": model,
+        "temperature": request.temperature,
+        "max_tokens": request.max_tokens,
+    }
+    if api_key is not None:
+        params["api_key"] = hash_api_key(api_key)
+    messages = [[m.role.value, m.content] for m in request.message]
+    return _digest(params), _digest({**params, "messages": messages})
+
+
+class LRUCache:
+    """In-process LRU tier bounded by total value bytes, with per-entry TTL"""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.bytes = 0
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+        self.bytes += len(value)
+        while self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _remove(self, key: str):
+        value, _ = self._entries.pop(key)
+        self.bytes -= len(value)
+
+
+class SharedCache(ABC):
+    """Optional second tier shared between workers (e.g. Redis, SQLite)"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        pass
+
+
+class SQLiteSharedCache(SharedCache):
+    """
+    Local stand-in for a shared cache server, backed by one SQLite file.
+    Every `sweep_every` writes, expired rows are deleted and the table is
+    trimmed to `max_entries`.
+    """
+
+    sweep_every = 100
+
+    def __init__(self, path: str, max_entries: int = RESPONSE_CACHE_SHARED_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = itertools.count(1)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS response_cache_expires_at "
+                "ON response_cache (expires_at)"
+            )
+            self._sweep(conn)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT value FROM response_cache WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl_seconds),
+            )
+            if next(self._writes) % self.sweep_every == 0:
+                self._sweep(conn)
+
+    def _sweep(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        (rows,) = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()
+        if rows > self.max_entries:
+            conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                "SELECT key FROM response_cache ORDER BY expires_at LIMIT ?)",
+                (rows - self.max_entries,),
+            )
+
+
+class HashingEmbedder:
+    """
+    Cheap local text embedding: hashed character trigrams, L2 normalised.
+    Good enough to catch near-duplicate prompts (casing, punctuation,
+    small edits) without calling an embedding model.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        text = " ".join(text.lower().split())
+        for i in range(max(len(text) - 2, 1)):
+            trigram = text[i : i + 3].encode("utf-8")
+            bucket = int.from_bytes(hashlib.blake2b(trigram, digest_size=4).digest(), "little")
+            vector[bucket % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticIndex:
+    """
+    In-memory vector index for one parameter partition.
+    Vectors live in a buffer that doubles as entries arrive and becomes a
+    ring buffer at `max_entries`, so a lookup is a single matrix-vector product.
+    """
+
+    INITIAL_ROWS = 64
+
+    def __init__(self, dim: int, max_entries: int):
+        self.max_entries = max_entries
+        rows = min(self.INITIAL_ROWS, max_entries)
+        self._vectors = np.zeros((rows, dim), dtype=np.float32)
+        self._keys: List[Optional[str]] = [None] * len(self._vectors)
+        self._size = 0
+        self._next = 0
+
+    def add(self, vector: np.ndarray, key: str):
+        rows = len(self._vectors)
+        if self._next == rows and rows < self.max_entries:
+            grown = np.zeros(
+                (min(rows * 2, self.max_entries), self._vectors.shape[1]), dtype=np.float32
+            )
+            grown[:rows] = self._vectors
+            self._vectors = grown
+            self._keys.extend([None] * (len(grown) - rows))
+        self._next %= len(self._vectors)
+        self._vectors[self._next] = vector
+        self._keys[self._next] = key
+        self._next += 1
+        self._size = min(self._size + 1, self.max_entries)
+
+    def search(self, vector: np.ndarray) -> Tuple[Optional[str], float]:
+        if self._size == 0:
+            return None, 0.0
+        scores = self._vectors[: self._size] @ vector
+        best = int(np.argmax(scores))
+        return self._keys[best], float(scores[best])
+
+
+class ResponseCache:
+    """
+    Exact-match response cache with an in-process LRU tier, an optional
+    shared tier and an opt-in semantic (near-duplicate) lookup.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        shared: Optional[SharedCache] = None,
+        semantic: bool = RESPONSE_CACHE_SEMANTIC,
+        semantic_threshold: float = RESPONSE_CACHE_SEMANTIC_THRESHOLD,
+        semantic_max_entries: int = RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES,
+        semantic_max_partitions: int = RESPONSE_CACHE_SEMANTIC_MAX_PARTITIONS,
+        scope: str = RESPONSE_CACHE_SCOPE,
+    ):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.local = LRUCache(max_bytes, ttl_seconds)
+        self.shared = shared
+        self.semantic = semantic
+        self.semantic_threshold = semantic_threshold
+        self.semantic_max_entries = semantic_max_entries
+        self.semantic_max_partitions = semantic_max_partitions
+        self.scope = scope
+        self.embedder = HashingEmbedder()
+        self._indexes: "OrderedDict[str, SemanticIndex]" = OrderedDict()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    async def _lookup(self, key: str) -> Optional[bytes]:
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            try:
+                value = await asyncio.to_thread(self.shared.get, key)
+            except Exception as e:
+                logger.warning(f"shared cache read failed: {e}")
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def _prompt_text(self, request: ChatRequest) -> str:
+        return "\n".join(f"{m.role.value}: {m.content}" for m in request.message)
+
+    def _keys(
+        self, provider: str, model: str, request: ChatRequest, api_key: str
+    ) -> Tuple[str, str]:
+        scoped_key = api_key if self.scope == "key" else None
+        return request_keys(provider, model, request, scoped_key)
+
+    async def get(
+        self, provider: str, model: str, request: ChatRequest, api_key: str
+    ) -> Optional[ChatResponse]:
+        """Return a cached response flagged with `cached=True`, or None"""
+        if not self.enabled:
+            return None
+        if self.scope != "key" and not health_registry.is_validated(provider, api_key):
+            self.misses += 1
+            return None
+        params_key, exact_key = self._keys(provider, model, request, api_key)
+        cache_type = "exact"
+        value = await self._lookup(exact_key)
+
+        if value is None and self.semantic and params_key in self._indexes:
+            self._indexes.move_to_end(params_key)
+            vector = self.embedder.embed(self._prompt_text(request))
+            match, score = self._indexes[params_key].search(vector)
+            if match is not None and score >= self.semantic_threshold:
+                value = await self._lookup(match)
+                cache_type = "semantic"
+
+        if value is None:
+            self.misses += 1
+            return None
+
+        if cache_type == "exact":
+            self.exact_hits += 1
+        else:
+            self.semantic_hits += 1
+        self.bytes_saved += len(value)
+        response = ChatResponse.model_validate_json(value)
+        return response.model_copy(update={"cached": True, "cache_type": cache_type})
+
+    async def set(
+        self,
+        provider: str,
+        model: str,
+        request: ChatRequest,
+        api_key: str,
+        response: ChatResponse,
+    ):
+        """Store a fresh provider response"""
+        if not self.enabled:
+            return
+        params_key, exact_key = self._keys(provider, model, request, api_key)
+        value = response.model_dump_json().encode("utf-8")
+        self.local.set(exact_key, value)
+        if self.shared is not None:
+            try:
+                await asyncio.to_thread(self.shared.set, exact_key, value, self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"shared cache write failed: {e}")
+        if self.semantic:
+            index = self._indexes.get(params_key)
+            if index is None:
+                index = SemanticIndex(self.embedder.dim, self.semantic_max_entries)
+                self._indexes[params_key] = index
+                if len(self._indexes) > self.semantic_max_partitions:
+                    self._indexes.popitem(last=False)
+            self._indexes.move_to_end(params_key)
+            index.add(self.embedder.embed(self._prompt_text(request)), exact_key)
+
+    def stats(self) -> Dict[str, float]:
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "entries": len(self.local),
+            "bytes": self.local.bytes,
+            "semantic_partitions": len(self._indexes),
+        }
+
+
+response_cache = ResponseCache(
+    shared=SQLiteSharedCache(RESPONSE_CACHE_SHARED_PATH)
+    if RESPONSE_CACHE_SHARED_PATH
+    else None,
+)
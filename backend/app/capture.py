@@ -0,0 +1,242 @@
+"""Opt-in capture of /chat traffic and provider answers, for replay with benchmarks/replay.py"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from .models import ChatRequest, ChatResponse
+
+logger = logging.getLogger(__name__)
+
+# JSON lines file the captured exchanges are appended to, unset captures nothing.
+# "{pid}" is replaced by the worker's pid so that workers write separate files
+CAPTURE_PATH = os.getenv("CAPTURE_PATH", "")
+# Share of requests captured
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "1.0"))
+# Replace message and answer text by same-length digests: equal texts stay equal,
+# so cache hits and token counts are roughly preserved, but nothing is readable
+CAPTURE_REDACT_CONTENT = os.getenv("CAPTURE_REDACT_CONTENT", "false").lower() == "true"
+# Exchanges held in memory; past this the oldest unwritten ones are dropped
+CAPTURE_BUFFER_SIZE = int(os.getenv("CAPTURE_BUFFER_SIZE", "10000"))
+CAPTURE_FLUSH_INTERVAL_SECONDS = float(os.getenv("CAPTURE_FLUSH_INTERVAL_SECONDS", "1"))
+
+# The exchange being captured for the current request, if any
+current_exchange: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    "current_exchange", default=None
+)
+
+
+def redact(text: str) -> str:
+    """A same-length stand-in for `text`, equal for equal texts"""
+    digest = hashlib.sha256(text.encode()).hexdigest()
+    return (digest * (len(text) // len(digest) + 1))[: len(text)]
+
+
+def fingerprint(request: ChatRequest, redacted: bool = False) -> str:
+    """What identifies a provider call's answer: model, sampling and messages"""
+    content = redact if redacted else str
+    payload = [
+        request.model,
+        request.temperature,
+        request.max_tokens,
+        [(m.role.value, content(m.content)) for m in request.message],
+    ]
+    return hashlib.sha256(json.dumps(payload).encode()).hexdigest()[:16]
+
+
+class TrafficCapture:
+    """
+    Every sampled /chat and /chat/stream request is captured as one JSON
+    line: arrival time, the request without API keys, the status and
+    latency the client saw, and a "cassette" of every provider call made
+    for it (retries and hedges included) with its latency, time to first
+    token, answer or error.
+
+    Exchanges go to an in-memory ring buffer on the request path and are
+    appended to the file in batches on a worker thread.
+    """
+
+    def __init__(
+        self,
+        path: str = CAPTURE_PATH,
+        sample_rate: float = CAPTURE_SAMPLE_RATE,
+        redacted: bool = CAPTURE_REDACT_CONTENT,
+        buffer_size: int = CAPTURE_BUFFER_SIZE,
+        flush_interval: float = CAPTURE_FLUSH_INTERVAL_SECONDS,
+    ):
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self.sample_rate = sample_rate
+        self.redacted = redacted
+        self.flush_interval = flush_interval
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self._task: Optional[asyncio.Task] = None
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _text(self, text: str) -> str:
+        return redact(text) if self.redacted else text
+
+    def _sanitized(self, request: ChatRequest) -> Dict[str, Any]:
+        data = request.model_dump(mode="json", exclude={"api_keys", "session_id"})
+        data["api_keys"] = [{"name": item.name} for item in request.api_keys]
+        for message in data["message"]:
+            message["content"] = self._text(message["content"])
+        return data
+
+    def begin(self, endpoint: str, request: ChatRequest) -> Optional[Dict[str, Any]]:
+        """
+        Start capturing this request if it is sampled, for the rest of the
+        current context; session turns are not captured, they cannot be replayed
+        """
+        if not self.enabled or request.session_id or random.random() >= self.sample_rate:
+            return None
+        exchange = {
+            "ts": time.time(),
+            "endpoint": endpoint,
+            "request": self._sanitized(request),
+            "calls": [],
+            "_start": time.perf_counter(),
+            # Scrubbed from error details, never written
+            "_keys": [item.api_key for item in request.api_keys if item.api_key],
+        }
+        current_exchange.set(exchange)
+        return exchange
+
+    def record_call(
+        self,
+        provider: str,
+        request: ChatRequest,
+        latency_ms: float,
+        response: Optional[ChatResponse] = None,
+        error: Optional[BaseException] = None,
+        ttft_ms: Optional[float] = None,
+        text: Optional[str] = None,
+        model: Optional[str] = None,
+    ):
+        """
+        Add one provider call to the cassette of the request being captured:
+        its `response` or `error`, or for a stream the `text` it produced
+        """
+        exchange = current_exchange.get()
+        if exchange is None:
+            return
+        call: Dict[str, Any] = {
+            "provider": provider,
+            "key": fingerprint(request, self.redacted),
+            "latency_ms": round(latency_ms, 1),
+            "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+        }
+        if response is not None:
+            call.update(
+                status=200,
+                model=response.model,
+                response=self._text(response.response),
+                prompt_tokens=response.prompt_tokens,
+                completion_tokens=response.completion_tokens,
+                cost=response.cost,
+            )
+        elif error is not None:
+            detail = str(error)
+            for key in exchange["_keys"]:
+                detail = detail.replace(key, "***")
+            call.update(
+                status=getattr(error, "status_code", 500),
+                error=type(error).__name__,
+                detail=self._text(detail),
+                retryable=bool(getattr(error, "retryable", False)),
+            )
+        else:
+            call.update(status=200, model=model, response=self._text(text or ""))
+        exchange["calls"].append(call)
+
+    def finish(self, exchange: Optional[Dict[str, Any]], status: int, cached: bool = False):
+        if exchange is None:
+            return
+        exchange["latency_ms"] = round((time.perf_counter() - exchange.pop("_start")) * 1000, 1)
+        del exchange["_keys"]
+        exchange["status"] = status
+        exchange["cached"] = cached
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(exchange)
+        self.captured += 1
+
+    @contextmanager
+    def exchange(self, endpoint: str, request: ChatRequest) -> Iterator[Dict[str, Any]]:
+        """Capture the request around the block; set "status"/"cached" on what it yields"""
+        token = current_exchange.set(None)
+        exchange = self.begin(endpoint, request)
+        outcome: Dict[str, Any] = {"status": 200, "cached": False}
+        try:
+            yield outcome
+        except BaseException as e:
+            self.finish(exchange, getattr(e, "status_code", 500))
+            raise
+        finally:
+            current_exchange.reset(token)
+        self.finish(exchange, outcome["status"], outcome["cached"])
+
+    def _append(self, lines: List[str]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        batch = list(self._buffer)
+        self._buffer.clear()
+        try:
+            await asyncio.to_thread(self._append, [json.dumps(e) + "\n" for e in batch])
+        except Exception as e:
+            self.failed_flushes += 1
+            self.dropped += len(batch)
+            logger.warning(f"writing {len(batch)} captured exchanges failed: {e}")
+            return
+        self.written += len(batch)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self.enabled and self._task is None:
+            logger.info(f"capturing {self.sample_rate:.0%} of /chat traffic to {self.path}")
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the flusher and write what is left"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "sample_rate": self.sample_rate,
+            "redacted": self.redacted,
+            "buffered": len(self._buffer),
+            "captured": self.captured,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+traffic_capture = TrafficCapture()
@@ -0,0 +1,204 @@
+"""Provider metrics, health and circuit state shared by the workers of one host"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .health import health_registry
+from .models import ProviderStatus
+from .providers.base import BaseProvider, merged_status
+from .resilience import CLOSED, HALF_OPEN, OPEN, breakers, get_breaker, stats
+
+logger = logging.getLogger(__name__)
+
+# SQLite file every worker on the host syncs through, unset runs standalone
+CLUSTER_STATE_PATH = os.getenv("CLUSTER_STATE_PATH", "")
+# How often each worker publishes its state and reads its peers'
+CLUSTER_SYNC_INTERVAL_SECONDS = float(os.getenv("CLUSTER_SYNC_INTERVAL_SECONDS", "2"))
+# A worker that has not published for this long is considered gone
+CLUSTER_WORKER_TTL_SECONDS = float(os.getenv("CLUSTER_WORKER_TTL_SECONDS", "10"))
+
+_SEVERITY = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class ClusterState:
+    """
+    Each worker keeps counting in its own memory, so the request path pays
+    nothing. Every `sync_interval` seconds a background task writes the
+    worker's exported state as one JSON row and reads the rows of the live
+    peers, all in one IMMEDIATE transaction on a worker thread. `/status`
+    merges the worker's live state with the peers' last published ones.
+
+    Syncing also spreads what one worker learned to the others: newer
+    health entries are adopted, and a circuit opened by a peer opens the
+    local breaker for the rest of the peer's open period.
+    """
+
+    def __init__(
+        self,
+        path: str = CLUSTER_STATE_PATH,
+        sync_interval: float = CLUSTER_SYNC_INTERVAL_SECONDS,
+        worker_ttl: float = CLUSTER_WORKER_TTL_SECONDS,
+    ):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.worker_ttl = worker_ttl
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.started_at = time.time()
+        self.peers: List[Dict[str, Any]] = []
+        self.providers: Dict[str, BaseProvider] = {}
+        self._local = threading.local()
+        self._task: Optional[asyncio.Task] = None
+        self.syncs = 0
+        self.failed_syncs = 0
+        self.last_sync_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cluster_workers ("
+                "worker_id TEXT PRIMARY KEY, updated_at REAL NOT NULL, state TEXT NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def local_state(self) -> Dict[str, Any]:
+        """This worker's state as published to its peers"""
+        return {
+            "worker_id": self.worker_id,
+            "started_at": self.started_at,
+            "providers": {name: p.export_state() for name, p in self.providers.items()},
+            "health": health_registry.export(),
+            "circuits": {name: breaker.state for name, breaker in breakers.items()},
+            "open_circuits": {
+                name: breaker.open_remaining()
+                for name, breaker in breakers.items()
+                if breaker.open_remaining() > 0
+            },
+            "resilience": stats.as_dict(),
+        }
+
+    def _exchange(self, state: str) -> List[Dict[str, Any]]:
+        """Publish our row, drop dead workers' rows, return the live peers'"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cluster_workers (worker_id, updated_at, state) "
+                "VALUES (?, ?, ?)",
+                (self.worker_id, now, state),
+            )
+            conn.execute(
+                "DELETE FROM cluster_workers WHERE updated_at < ?", (now - self.worker_ttl,)
+            )
+            rows = conn.execute(
+                "SELECT updated_at, state FROM cluster_workers WHERE worker_id != ?",
+                (self.worker_id,),
+            ).fetchall()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [{**json.loads(state), "updated_at": updated_at} for updated_at, state in rows]
+
+    def _leave(self):
+        conn = self._connection()
+        conn.execute("DELETE FROM cluster_workers WHERE worker_id = ?", (self.worker_id,))
+
+    def _apply(self, peers: List[Dict[str, Any]]):
+        now = time.time()
+        for peer in peers:
+            health_registry.merge([tuple(entry) for entry in peer["health"]])
+            for name, remaining in peer["open_circuits"].items():
+                get_breaker(name).adopt_open(remaining - (now - peer["updated_at"]))
+
+    async def sync(self):
+        """Publish this worker's state and take in the peers'"""
+        start = time.perf_counter()
+        try:
+            peers = await asyncio.to_thread(self._exchange, json.dumps(self.local_state()))
+        except Exception as e:
+            self.failed_syncs += 1
+            logger.warning(f"cluster state sync failed: {e}")
+            return
+        self.peers = peers
+        self._apply(peers)
+        self.syncs += 1
+        self.last_sync_ms = (time.perf_counter() - start) * 1000
+
+    async def _run(self):
+        while True:
+            await self.sync()
+            await asyncio.sleep(self.sync_interval)
+
+    async def start(self, providers: Dict[str, BaseProvider]):
+        """Start syncing the given providers' state, if a state file is configured"""
+        self.providers = providers
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop syncing and leave the cluster"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await asyncio.to_thread(self._leave)
+        except Exception as e:
+            logger.warning(f"leaving the cluster failed: {e}")
+
+    def _workers(self) -> List[Dict[str, Any]]:
+        return [self.local_state(), *self.peers]
+
+    def provider_statuses(self) -> List[ProviderStatus]:
+        """Every provider's status summed over the live workers"""
+        states: Dict[str, List[Dict[str, Any]]] = {}
+        for worker in self._workers():
+            for name, state in worker["providers"].items():
+                states.setdefault(name, []).append(state)
+        return [merged_status(name, provider_states) for name, provider_states in states.items()]
+
+    def oldest_start(self) -> float:
+        """When the longest-running live worker started"""
+        return min(worker["started_at"] for worker in self._workers())
+
+    def resilience_status(self) -> Dict[str, object]:
+        """Resilience counters summed over the workers, each circuit at its worst state"""
+        workers = self._workers()
+        totals: Dict[str, object] = {}
+        circuits: Dict[str, str] = {}
+        for worker in workers:
+            for name, value in worker["resilience"].items():
+                totals[name] = totals.get(name, 0) + value
+            for name, state in worker["circuits"].items():
+                if _SEVERITY[state] >= _SEVERITY[circuits.get(name, CLOSED)]:
+                    circuits[name] = state
+        return {**totals, "circuits": circuits}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "workers": len(self.peers) + 1,
+            "syncs": self.syncs,
+            "failed_syncs": self.failed_syncs,
+            "last_sync_ms": round(self.last_sync_ms, 2),
+        }
+
+
+cluster_state = ClusterState()
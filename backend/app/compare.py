@@ -0,0 +1,69 @@
+"""Concurrent fan-out of one chat request behind /chat/compare"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple, TypeVar, Union
+
+from .tracing import untraced_context
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Outcome of one target: its result, its exception, or None if it was cancelled
+Outcome = Optional[Union[R, Exception]]
+
+
+async def race(
+    targets: Sequence[T],
+    worker: Callable[[T], Awaitable[R]],
+    accept: Optional[Callable[[R], bool]] = None,
+) -> Tuple[List[Tuple[Outcome, float]], Optional[int]]:
+    """
+    Run `worker` on every target at once and return each one's
+    `(outcome, milliseconds)` in target order, plus the winner's index.
+
+    Without `accept` every call runs to the end and there is no winner, so
+    this takes as long as the slowest target. With it, the first result
+    `accept` approves wins and the calls still running are cancelled, so it
+    takes as long as the fastest acceptable one; if none is acceptable all
+    outcomes are returned without a winner.
+    """
+    start = time.perf_counter()
+    outcomes: List[Tuple[Outcome, float]] = [(None, 0.0)] * len(targets)
+
+    async def run(index: int, target: T):
+        try:
+            outcome = await worker(target)
+        except Exception as e:
+            outcome = e
+        outcomes[index] = (outcome, (time.perf_counter() - start) * 1000)
+        return outcome
+
+    # Calls keep the request's priority but must not record spans into its trace
+    tasks = {
+        asyncio.create_task(run(index, target), context=untraced_context()): index
+        for index, target in enumerate(targets)
+    }
+    winner = None
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if accept is None:
+                continue
+            accepted = [
+                tasks[task]
+                for task in done
+                if not isinstance(task.result(), Exception) and accept(task.result())
+            ]
+            if accepted:
+                winner = min(accepted, key=lambda index: outcomes[index][1])
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    for task in pending:
+        if task.cancelled():
+            outcomes[tasks[task]] = (None, (time.perf_counter() - start) * 1000)
+    return outcomes, winner
@@ -0,0 +1,253 @@
+"""Cached provider health registry"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+HEALTH_TTL_SECONDS = float(os.getenv("HEALTH_TTL_SECONDS", "60"))
+HEALTH_FAILURE_THRESHOLD = int(os.getenv("HEALTH_FAILURE_THRESHOLD", "3"))
+# A probe that takes longer marks the key unhealthy
+HEALTH_PROBE_TIMEOUT_MS = float(os.getenv("HEALTH_PROBE_TIMEOUT_MS", "5000"))
+# (provider, key) entries kept, least recently used ones are dropped past this
+HEALTH_MAX_ENTRIES = int(os.getenv("HEALTH_MAX_ENTRIES", "10000"))
+
+# (provider, key hash, status, error, wall-clock checked_at, failures, verified)
+ExportedEntry = Tuple[str, str, bool, Optional[str], float, int, bool]
+
+
+def hash_api_key(api_key: str) -> str:
+    """Stable, non-reversible identifier for an API key"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class HealthEntry:
+    """Last known health of one (provider, api key) pair"""
+
+    status: bool
+    error: Optional[str]
+    checked_at: float
+    consecutive_failures: int = 0
+    # The key has worked at least once (a successful call or passing probe)
+    verified: bool = False
+
+
+class HealthRegistry:
+    """
+    Health status keyed by (provider, hashed API key).
+
+    - Fresh entries are served straight from memory.
+    - Stale entries of verified keys are served as-is while a background
+      probe revalidates them.
+    - Unknown and never verified keys are optimistically treated as healthy
+      and never probed in the background, so junk keys cost no upstream
+      calls; real chat failures (passive mode) mark a key unhealthy after
+      `failure_threshold` consecutive errors.
+    - At most `max_entries` entries are kept, in LRU order.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = HEALTH_TTL_SECONDS,
+        failure_threshold: int = HEALTH_FAILURE_THRESHOLD,
+        probe_timeout_ms: float = HEALTH_PROBE_TIMEOUT_MS,
+        max_entries: int = HEALTH_MAX_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.failure_threshold = failure_threshold
+        self.probe_timeout_ms = probe_timeout_ms
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], HealthEntry]" = OrderedDict()
+        self._refreshing: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def _key(self, provider_name: str, api_key: str) -> Tuple[str, str]:
+        return (provider_name, hash_api_key(api_key))
+
+    def get(self, provider_name: str, api_key: str) -> Optional[HealthEntry]:
+        """Return the cached entry, if any, without probing"""
+        key = self._key(provider_name, api_key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: Tuple[str, str], entry: HealthEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def is_validated(self, provider_name: str, api_key: str) -> bool:
+        """The key has been seen working: a passing probe or a successful call"""
+        entry = self.get(provider_name, api_key)
+        return (
+            entry is not None
+            and entry.status
+            and entry.consecutive_failures == 0
+            and entry.error is None
+        )
+
+    def is_fresh(self, entry: HealthEntry) -> bool:
+        return (time.monotonic() - entry.checked_at) < self.ttl_seconds
+
+    def record_probe(
+        self, provider_name: str, api_key: str, status: bool, error: Optional[str]
+    ):
+        """Store the outcome of an active health probe"""
+        key = self._key(provider_name, api_key)
+        previous = self._entries.get(key)
+        self._store(
+            key,
+            HealthEntry(
+                status=status,
+                error=error,
+                checked_at=time.monotonic(),
+                consecutive_failures=0 if status else self.failure_threshold,
+                verified=status or (previous is not None and previous.verified),
+            ),
+        )
+
+    def record_result(
+        self,
+        provider_name: str,
+        api_key: str,
+        success: bool,
+        error: Optional[str] = None,
+    ):
+        """Passive health: update status from a real chat completion outcome"""
+        key = self._key(provider_name, api_key)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = HealthEntry(status=True, error=None, checked_at=time.monotonic())
+        self._store(key, entry)
+
+        if success:
+            entry.status = True
+            entry.error = None
+            entry.consecutive_failures = 0
+            entry.verified = True
+            entry.checked_at = time.monotonic()
+            return
+
+        entry.consecutive_failures += 1
+        entry.error = error
+        if entry.consecutive_failures >= self.failure_threshold:
+            if entry.status:
+                logger.warning(
+                    f"{provider_name} marked unhealthy after "
+                    f"{entry.consecutive_failures} consecutive failures"
+                )
+            entry.status = False
+            entry.checked_at = time.monotonic()
+
+    def export(self) -> List[ExportedEntry]:
+        """Entries as `ExportedEntry` tuples"""
+        offset = time.time() - time.monotonic()
+        return [
+            (
+                provider_name,
+                key_hash,
+                e.status,
+                e.error,
+                e.checked_at + offset,
+                e.consecutive_failures,
+                e.verified,
+            )
+            for (provider_name, key_hash), e in self._entries.items()
+        ]
+
+    def merge(self, entries: List[ExportedEntry]):
+        """Adopt another worker's `export()`ed entries that are newer than ours"""
+        offset = time.time() - time.monotonic()
+        for provider_name, key_hash, status, error, checked_at, failures, verified in entries:
+            checked_at -= offset
+            entry = self._entries.get((provider_name, key_hash))
+            if entry is None or entry.checked_at < checked_at:
+                self._store(
+                    (provider_name, key_hash),
+                    HealthEntry(
+                        status=status,
+                        error=error,
+                        checked_at=checked_at,
+                        consecutive_failures=failures,
+                        verified=verified or (entry is not None and entry.verified),
+                    ),
+                )
+
+    async def _probe(self, provider, api_key: str) -> Dict[str, Union[bool, str]]:
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(
+                provider.health_check(api_key), timeout=self.probe_timeout_ms / 1000
+            )
+            status, error = bool(result["status"]), result["error"]
+        except asyncio.TimeoutError:
+            status, error = False, f"health check timed out after {self.probe_timeout_ms:.0f}ms"
+        except Exception as e:
+            status, error = False, str(e).split("\n")[0]
+        self.record_probe(provider.name, api_key, status, error)
+        return {
+            "status": status,
+            "error": error,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    def _start_probe(self, provider, api_key: str) -> asyncio.Task:
+        """The in-flight probe for this key, started if there is none"""
+        key = self._key(provider.name, api_key)
+        task = self._refreshing.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._probe(provider, api_key))
+            self._refreshing[key] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+        return task
+
+    async def probe(self, provider, api_key: str) -> Dict[str, Union[bool, str]]:
+        """
+        Run an active health check now (bounded by `probe_timeout_ms`) and
+        cache the result. Concurrent probes of the same key share one call.
+        """
+        return await asyncio.shield(self._start_probe(provider, api_key))
+
+    async def probe_all(self, checks: List[Tuple[object, str]]) -> List[Dict[str, Union[bool, str]]]:
+        """Probe several (provider, api key) pairs concurrently"""
+        return await asyncio.gather(*(self.probe(provider, key) for provider, key in checks))
+
+    def _schedule_refresh(self, provider, api_key: str):
+        self._start_probe(provider, api_key)
+
+    def status(self, provider, api_key: str) -> Dict[str, Union[str, bool]]:
+        """
+        Non-blocking health lookup used on the request path.
+        Never awaits a probe; schedules one in the background when the
+        entry of a verified key is older than the TTL. A stale entry of a
+        never verified key is forgotten instead, passive failures mark it again.
+        """
+        entry = self.get(provider.name, api_key)
+        if entry is not None and not self.is_fresh(entry):
+            if entry.verified:
+                self._schedule_refresh(provider, api_key)
+            else:
+                del self._entries[self._key(provider.name, api_key)]
+                entry = None
+        if entry is None:
+            return {"name": provider.name, "status": True, "error": None}
+        return {"name": provider.name, "status": entry.status, "error": entry.error}
+
+    async def close(self):
+        """Cancel in-flight background probes"""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refreshing.clear()
+
+
+health_registry = HealthRegistry()
@@ -0,0 +1,452 @@
+"""Asynchronous chat jobs: durable store, priority scheduler and webhooks"""
+
+import asyncio
+import itertools
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import httpx
+import shortuuid
+
+from .metrics import WindowedStats
+from .models import ChatRequest, ChatResponse, JobRequest, JobResponse, JobStatus
+
+logger = logging.getLogger(__name__)
+
+# Empty path keeps jobs in memory only (lost on restart)
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join("data", "jobs.db"))
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", "10000"))
+JOBS_LONG_POLL_MAX_SECONDS = float(os.getenv("JOBS_LONG_POLL_MAX_SECONDS", "30"))
+JOBS_WEBHOOK_ALLOWED_HOSTS = {
+    host.strip()
+    for host in os.getenv("JOBS_WEBHOOK_ALLOWED_HOSTS", "localhost,127.0.0.1,::1").split(",")
+    if host.strip()
+}
+JOBS_WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("JOBS_WEBHOOK_TIMEOUT_SECONDS", "10"))
+JOBS_WEBHOOK_RETRIES = int(os.getenv("JOBS_WEBHOOK_RETRIES", "3"))
+# Fernet key (`cryptography`) the SQLite store encrypts API keys with, so that
+# unfinished jobs can run after a restart; unset keeps API keys in memory only
+JOBS_KEY_SECRET = os.getenv("JOBS_KEY_SECRET", "")
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+
+FINISHED = (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+
+def generate_job_id() -> str:
+    return "JOB" + shortuuid.ShortUUID().random(length=12)
+
+
+def _timestamp(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, timezone.utc) if value is not None else None
+
+
+@dataclass
+class Job:
+    """One background chat request and its outcome"""
+
+    id: str
+    request: ChatRequest
+    priority: int
+    created_at: float
+    status: JobStatus = JobStatus.QUEUED
+    webhook_url: Optional[str] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def to_response(self) -> JobResponse:
+        return JobResponse(
+            id=self.id,
+            status=self.status,
+            priority=self.priority,
+            created_at=_timestamp(self.created_at),
+            started_at=_timestamp(self.started_at),
+            finished_at=_timestamp(self.finished_at),
+            result=self.result,
+            error=self.error,
+            status_code=self.status_code,
+        )
+
+
+class JobStore(ABC):
+    """Where jobs are kept so they survive restarts"""
+
+    @abstractmethod
+    def save(self, job: Job):
+        pass
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        pass
+
+    @abstractmethod
+    def unfinished(self) -> List[Job]:
+        """Queued and running jobs, oldest first"""
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryJobStore(JobStore):
+    """Non-durable store for tests and throwaway deployments"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+
+    def save(self, job: Job):
+        self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def unfinished(self) -> List[Job]:
+        jobs = [job for job in self._jobs.values() if not job.finished]
+        return sorted(jobs, key=lambda job: job.created_at)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Jobs in one SQLite file (WAL), the default durable backend.
+    API keys are never written in clear: with `key_secret` they are stored
+    encrypted, without it only their provider names are kept.
+    """
+
+    _COLUMNS = (
+        "id, status, priority, request, webhook_url, created_at, started_at, "
+        "finished_at, result, error, status_code"
+    )
+
+    def __init__(self, path: str, key_secret: str = JOBS_KEY_SECRET):
+        if key_secret and Fernet is None:
+            raise RuntimeError("JOBS_KEY_SECRET needs the `cryptography` package")
+        self.path = path
+        self._fernet = Fernet(key_secret) if key_secret else None
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, priority INTEGER NOT NULL, "
+                "request TEXT NOT NULL, webhook_url TEXT, created_at REAL NOT NULL, "
+                "started_at REAL, finished_at REAL, result TEXT, error TEXT, "
+                "status_code INTEGER)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _seal(self, api_key: str) -> str:
+        if self._fernet is None or not api_key:
+            return ""
+        return self._fernet.encrypt(api_key.encode("utf-8")).decode("ascii")
+
+    def _unseal(self, token: str) -> str:
+        """The stored key, or "" if it was not stored or the secret has changed"""
+        if self._fernet is None or not token:
+            return ""
+        try:
+            return self._fernet.decrypt(token.encode("ascii")).decode("utf-8")
+        except InvalidToken:
+            return ""
+
+    def _stored_request(self, request: ChatRequest) -> str:
+        api_keys = [
+            item.model_copy(update={"api_key": self._seal(item.api_key)})
+            for item in request.api_keys
+        ]
+        return request.model_copy(update={"api_keys": api_keys}).model_dump_json()
+
+    def _loaded_request(self, data: str) -> ChatRequest:
+        request = ChatRequest.model_validate_json(data)
+        api_keys = [
+            item.model_copy(update={"api_key": self._unseal(item.api_key)})
+            for item in request.api_keys
+        ]
+        return request.model_copy(update={"api_keys": api_keys})
+
+    def save(self, job: Job):
+        with self._connection() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO jobs ({self._COLUMNS}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.id,
+                    job.status.value,
+                    job.priority,
+                    self._stored_request(job.request),
+                    job.webhook_url,
+                    job.created_at,
+                    job.started_at,
+                    job.finished_at,
+                    job.result.model_dump_json() if job.result else None,
+                    job.error,
+                    job.status_code,
+                ),
+            )
+
+    def _row_to_job(self, row) -> Job:
+        return Job(
+            id=row[0],
+            status=JobStatus(row[1]),
+            priority=row[2],
+            request=self._loaded_request(row[3]),
+            webhook_url=row[4],
+            created_at=row[5],
+            started_at=row[6],
+            finished_at=row[7],
+            result=ChatResponse.model_validate_json(row[8]) if row[8] else None,
+            error=row[9],
+            status_code=row[10],
+        )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._connection().execute(
+            f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def unfinished(self) -> List[Job]:
+        rows = self._connection().execute(
+            f"SELECT {self._COLUMNS} FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+            (JobStatus.QUEUED.value, JobStatus.RUNNING.value),
+        ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def webhook_url_error(url: str) -> Optional[str]:
+    """Why `url` cannot be used as a webhook, None if it can"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return "webhook_url must be an http(s) URL"
+    if parsed.hostname not in JOBS_WEBHOOK_ALLOWED_HOSTS:
+        return f"webhook host {parsed.hostname} is not allowed"
+    return None
+
+
+Runner = Callable[[ChatRequest], Awaitable[ChatResponse]]
+# Exception -> (status code, detail, provider)
+ErrorMapper = Callable[[Exception], Tuple[int, str, Optional[str]]]
+
+
+class JobQueue:
+    """
+    Priority scheduler with a fixed pool of worker tasks.
+    Uses the SQLite store at JOBS_DB_PATH unless given another `store`.
+
+    Jobs are ordered by priority (high first), then submission order. Every
+    state change is written to the store (on a worker thread, the store may
+    block) before it is visible, so on start
+    the queue reloads unfinished jobs; jobs that were running when the
+    process died are queued again. A recovered job whose API keys could not
+    be restored (no JOBS_KEY_SECRET, or a different one) fails with 410.
+    """
+
+    def __init__(
+        self,
+        store: Optional[JobStore] = None,
+        workers: int = JOBS_WORKERS,
+        max_queued: int = JOBS_MAX_QUEUED,
+    ):
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._active: Dict[str, Job] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._deliveries: Set[asyncio.Task] = set()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._runner: Optional[Runner] = None
+        self._describe_error: Optional[ErrorMapper] = None
+        self.running = 0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.recovered = 0
+        self.wait_times = WindowedStats()
+
+    def _enqueue(self, job: Job):
+        self._active[job.id] = job
+        self._queue.put_nowait((-job.priority, next(self._sequence), job.id))
+
+    async def start(self, runner: Runner, describe_error: ErrorMapper):
+        """Reload unfinished jobs from the store and start the workers"""
+        if self.store is None:
+            self.store = SQLiteJobStore(JOBS_DB_PATH) if JOBS_DB_PATH else MemoryJobStore()
+        self._runner = runner
+        self._describe_error = describe_error
+        for job in await asyncio.to_thread(self.store.unfinished):
+            if any(not item.api_key for item in job.request.api_keys):
+                await self._fail_without_keys(job)
+                continue
+            if job.status == JobStatus.RUNNING:
+                job.status = JobStatus.QUEUED
+                job.started_at = None
+                await asyncio.to_thread(self.store.save, job)
+            self._enqueue(job)
+            self.recovered += 1
+        if self.recovered:
+            logger.info(f"recovered {self.recovered} unfinished jobs")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def _fail_without_keys(self, job: Job):
+        job.status = JobStatus.FAILED
+        job.status_code = 410
+        job.error = "API keys could not be restored after a restart; resubmit the job"
+        job.finished_at = time.time()
+        job.request = job.request.model_copy(update={"api_keys": []})
+        await asyncio.to_thread(self.store.save, job)
+        self.failed += 1
+        logger.warning(f"job {job.id} recovered without its API keys, marked failed")
+
+    async def close(self):
+        """Stop the workers; interrupted jobs stay `running` and are retried on start"""
+        for task in [*self._tasks, *self._deliveries]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._deliveries, return_exceptions=True)
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self.store is not None:
+            self.store.close()
+
+    def is_full(self) -> bool:
+        return self._queue.qsize() >= self.max_queued
+
+    async def submit(self, request: JobRequest) -> Job:
+        job = Job(
+            id=generate_job_id(),
+            request=ChatRequest(**request.model_dump(exclude={"priority", "webhook_url"})),
+            priority=request.priority,
+            webhook_url=request.webhook_url,
+            created_at=time.time(),
+        )
+        await asyncio.to_thread(self.store.save, job)
+        self._enqueue(job)
+        self.submitted += 1
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = self._active.get(job_id)
+        if job is None:
+            job = await asyncio.to_thread(self.store.get, job_id)
+        return job
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Long poll: return once the job has finished or `timeout` seconds passed"""
+        job = await self.get(job_id)
+        if job is None or job.finished or timeout <= 0:
+            return job
+        done = self._done.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(done.wait(), timeout=min(timeout, JOBS_LONG_POLL_MAX_SECONDS))
+        except asyncio.TimeoutError:
+            pass
+        return await self.get(job_id)
+
+    async def _work(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._active.get(job_id)
+            if job is not None:
+                await self._run(job)
+
+    async def _run(self, job: Job):
+        job.status = JobStatus.RUNNING
+        job.started_at = time.time()
+        await asyncio.to_thread(self.store.save, job)
+        self.running += 1
+        self.wait_times.record((job.started_at - job.created_at) * 1000, True)
+        try:
+            job.result = await self._runner(job.request)
+            job.status = JobStatus.SUCCEEDED
+            job.status_code = 200
+            self.succeeded += 1
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.status_code, job.error, _ = self._describe_error(e)
+            self.failed += 1
+        finally:
+            self.running -= 1
+
+        job.finished_at = time.time()
+        job.request = job.request.model_copy(update={"api_keys": []})
+        await asyncio.to_thread(self.store.save, job)
+        self._active.pop(job.id, None)
+        done = self._done.pop(job.id, None)
+        if done is not None:
+            done.set()
+        if job.webhook_url:
+            task = asyncio.create_task(self._deliver(job))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, job: Job):
+        """POST the finished job to its webhook, retrying with backoff"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=JOBS_WEBHOOK_TIMEOUT_SECONDS)
+        payload = job.to_response().model_dump(mode="json")
+        for attempt in range(JOBS_WEBHOOK_RETRIES + 1):
+            try:
+                response = await self._client.post(job.webhook_url, json=payload)
+                if response.status_code < 500:
+                    return
+                error = f"status {response.status_code}"
+            except httpx.HTTPError as e:
+                error = str(e) or type(e).__name__
+            if attempt < JOBS_WEBHOOK_RETRIES:
+                await asyncio.sleep(random.uniform(0, 0.5 * 2**attempt))
+        logger.warning(f"webhook for job {job.id} failed: {error}")
+
+    def stats(self) -> Dict[str, object]:
+        window = self.wait_times.snapshot()
+        return {
+            "queued": self._queue.qsize(),
+            "running": self.running,
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "recovered": self.recovered,
+            "wait_p50_ms": window["p50"],
+            "wait_p95_ms": window["p95"],
+            "wait_p99_ms": window["p99"],
+        }
+
+
+job_queue = JobQueue()
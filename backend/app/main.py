@@ -1,27 +1,82 @@
 from dotenv import load_dotenv
-from fastapi import FastAPI, Header, HTTPException, Depends
+from fastapi import FastAPI, Header, HTTPException, Depends, Query, Request
 from contextlib import asynccontextmanager
 import logging
-from .providers import list_providers, get_provider, GeminiProvider
-from typing import Dict, List, Union
+from .providers import list_providers
+from typing import Dict, List, Optional, Tuple, Union
 from .providers import BaseProvider
+from .health import health_registry
+from .cache import cacheable, response_cache, request_keys
+from .coalescing import single_flight
+from .routing import estimate_request_tokens, router
+from .ratelimit import rate_limiter
+from .telemetry import OPENMETRICS_CONTENT_TYPE, TelemetryMiddleware, render_openmetrics
+from .tracing import mark, span
+from .resilience import (
+    REQUEST_TIMEOUT_MS,
+    get_breaker,
+    resilient_completion,
+    resilience_status,
+    should_hedge,
+)
+from .providers import ProviderError
+from .batch import (
+    BATCH_CONCURRENCY,
+    BATCH_MAX_ITEMS,
+    ProviderLimiter,
+    fan_out,
+    parse_api_keys_header,
+    parse_jsonl,
+    with_default_keys,
+)
+from .jobs import job_queue, webhook_url_error
+from .sessions import SESSION_SUMMARY_MAX_TOKENS, Session, session_store
+from .usage import GROUP_COLUMNS, usage_pipeline
+from .cluster import cluster_state
+from .serialization import FastJSONResponse, FastJSONRoute
+from .startup import startup
+from .compare import race
+from .admission import AdmissionMiddleware, admission
+from .capture import traffic_capture
+from .health import hash_api_key
+from contextlib import nullcontext
+from pydantic import ValidationError
 from fastapi.middleware.cors import CORSMiddleware
 import time
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 from .models import (
     HealthResponse,
+    APIKeyProviderStatus,
+    APIKeyRequestProvider,
+    BatchChatRequest,
+    BatchItemResult,
     ChatResponse,
     ChatRequest,
+    ChatMessage,
+    CompareMode,
+    CompareRequest,
+    CompareResponse,
+    CompareResult,
+    CompareTarget,
+    JobRequest,
+    JobResponse,
+    MessageRole,
     Provider,
+    SessionCreate,
+    SessionInfo,
+    UsageAggregate,
+    UsageReport,
     SystemStatus,
     ErrorResponse,
     HealthRequest,
     ProviderList,
     ProviderInfo
 )
-import os
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import asyncio
+import json
+import math
 
 load_dotenv()
 
@@ -30,6 +85,7 @@ logger = logging.getLogger(__name__)
 # Global variables
 providers: Dict[str, BaseProvider] = {}
 start_time = time.time()
+startup.imported()
 
 
 @asynccontextmanager
@@ -37,24 +93,35 @@ async def lifespan(app: FastAPI):
     """FastAPI lifespan manager for startup and shutdown events"""
     # startup
     logger.info("Starting app....")
-    initialized_count = 0
-    available_provider = list_providers()
-    for provider_name in available_provider:
-        try:
-            provider = get_provider(provider_name)
-            providers[provider_name] = provider
-            initialized_count += 1
-        except Exception as e:
-            logger.error(f"failed to initialize {provider_name} provider")
-    if initialized_count == 0:
+    providers.update(await startup.build_providers(list_providers()))
+    if not providers:
         logger.error("No providers initialized successfully!")
     else:
         logger.info(f"Available providers: {', '.join(providers.keys())}")
 
+    await usage_pipeline.start()
+    admission.start()
+    traffic_capture.start()
+    await cluster_state.start(providers)
+    await job_queue.start(_chat, _describe_error)
+    session_store.summarizer = _summarize_session
+    # Serve /healthz right away, /readyz once the providers are warm
+    warmup = asyncio.create_task(startup.warm_up(providers))
+
     yield
 
     # shutdown
     logger.info("Shutting down the service...")
+    warmup.cancel()
+    await job_queue.close()
+    await admission.close()
+    await traffic_capture.close()
+    await cluster_state.close()
+    await session_store.close()
+    await health_registry.close()
+    await usage_pipeline.close()
+    for provider in providers.values():
+        provider.close()
 
 
 app = FastAPI(
@@ -67,15 +134,21 @@ app = FastAPI(
     """,
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
+# Set before the routes below are declared
+app.router.route_class = FastJSONRoute
 
+# Innermost, so shed requests still get CORS headers and are counted
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "PATCH"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],
     allow_headers=["*"],
 )
+app.add_middleware(TelemetryMiddleware)
 
 # ROOT END POINT
 
@@ -83,6 +156,12 @@ app.add_middleware(
 def healthz():
     return {"ok": True}
 
+
+@app.get("/readyz")
+def readyz():
+    """503 until the providers are built and warmed up, with the cold-start timings"""
+    return JSONResponse(status_code=200 if startup.ready else 503, content=startup.report())
+
 @app.get("/", tags=["General"])
 async def root():
     """Welcome endpoint"""
@@ -91,46 +170,80 @@ async def root():
 
 async def check_all_providers_health(
     key_mapping: Dict[str, str] = {},
-) -> List[Dict[str, Union[str, bool]]]:
+) -> List[APIKeyProviderStatus]:
     """
-    Check health of all providers using the passed API keys.
-    Returns a list of provider name + status.
-    Raises HTTPException if any provider fails.
+    Probe every enabled provider with its API key, all at once, each
+    bounded by the health probe timeout. Uses the running provider
+    instances; a missing key or provider is reported, not raised.
     """
-    results: List[Dict[str, Union[str, bool]]] = []
-    available_providers = list_providers()
-
-    for name in available_providers:
-        provider_class = get_provider(name)
-        if name not in key_mapping:
-            raise HTTPException(
-                status_code=400, detail=f"Missing API key for provider: {name}"
+    results: Dict[str, APIKeyProviderStatus] = {}
+    checks = []
+    for name in list_providers():
+        if name not in providers:
+            results[name] = APIKeyProviderStatus(
+                name=name, status=False, error="Provider is not initialized"
             )
+        elif name not in key_mapping:
+            results[name] = APIKeyProviderStatus(
+                name=name, status=False, error=f"Missing API key for provider: {name}"
+            )
+        else:
+            checks.append((providers[name], key_mapping[name]))
 
-        health_result = await provider_class.health_check(key_mapping[name])
-        status = health_result["status"]
-        error = health_result["error"]
-        if not status:
-            raise HTTPException(status_code=400, detail=f"{name}: {error}")
-        results.append({"name": name, "status": status})
-
-    return results
+    probed = await health_registry.probe_all(checks)
+    for (provider, _), result in zip(checks, probed):
+        results[provider.name] = APIKeyProviderStatus(name=provider.name, **result)
+    return [results[name] for name in list_providers()]
 
 
 @app.post("/health", response_model=HealthResponse, tags=["Health"])
 async def health(api_keys: HealthRequest):
+    """
+    Check every provider with the given keys concurrently.
+    `degraded` if some fail, `503` with the same body if all do.
+    """
     uptime_seconds = time.time() - start_time
     uptime_pretty = str(timedelta(seconds=int(uptime_seconds)))
     key_mapping = {item.name: item.api_key for item in api_keys.providers}
     result = await check_all_providers_health(key_mapping)
-    return HealthResponse(provider=result, uptime=uptime_pretty)
+    healthy = sum(p.status for p in result)
+    if healthy == len(result):
+        status = "healthy"
+    elif healthy:
+        status = "degraded"
+    else:
+        status = "unhealthy"
+    response = HealthResponse(status=status, provider=result, uptime=uptime_pretty)
+    if status == "unhealthy":
+        return JSONResponse(status_code=503, content=response.model_dump())
+    return response
+
+
+def _cached_providers_health(
+    key_mapping: Dict[str, str],
+) -> List[Dict[str, Union[str, bool]]]:
+    """
+    Health of every initialized provider that has an API key, read from the
+    health registry. Never blocks on a probe; stale or unknown entries are
+    refreshed in the background.
+    """
+    if not key_mapping:
+        raise HTTPException(status_code=400, detail="Missing API keys")
+    return [
+        health_registry.status(provider, key_mapping[name])
+        for name, provider in providers.items()
+        if name in key_mapping
+    ]
 
 
 async def _select_provider(request: ChatRequest, healthy_providers: List[str]) -> str:
     """Select the optimal provider for the request"""
 
     if request.provider == Provider.AUTO:
-        return healthy_providers[0]
+        candidates = [providers[name] for name in healthy_providers if name in providers]
+        if not candidates:
+            return healthy_providers[0]
+        return router.select(candidates, request).name
 
     if request.provider.value not in healthy_providers:
         raise HTTPException(status_code=400, detail="Provided model not availble")
@@ -141,7 +254,9 @@ async def _select_provider(request: ChatRequest, healthy_providers: List[str]) -
 async def _filter_healthy_providers(providers: List[Dict[str, bool]]) -> List[str]:
     """Filter only healthy providers"""
     healthy_providers = [
-        provider["name"] for provider in providers if provider["status"]
+        provider["name"]
+        for provider in providers
+        if provider["status"] and get_breaker(provider["name"]).is_available()
     ]
     if not healthy_providers:
         raise HTTPException(
@@ -151,17 +266,37 @@ async def _filter_healthy_providers(providers: List[Dict[str, bool]]) -> List[st
     return healthy_providers
 
 
-@app.post("/chat", response_model=ChatResponse, tags=["chat"])
-async def chat_response(request: ChatRequest):
+async def _spill_over_rate_limited(
+    request: ChatRequest, healthy_providers: List[str], key_mapping: Dict[str, str]
+) -> List[str]:
     """
-    Generate AI chat completion using the optimal provider.
-    **Auto-routing logic:**
-    - Complex analysis → Gemini(high quality)
+    In AUTO mode leave out providers whose quota for this key is exhausted,
+    as long as another one can take the request right away.
     """
+    if request.provider != Provider.AUTO or len(healthy_providers) < 2:
+        return healthy_providers
+    tokens = estimate_request_tokens(request)
+    available = [
+        name
+        for name in healthy_providers
+        if name in providers
+        and await rate_limiter.estimated_wait(providers[name], key_mapping[name], tokens) == 0
+    ]
+    if not available or len(available) == len(healthy_providers):
+        return healthy_providers
+    rate_limiter.spillovers += 1
+    return available
+
+
+async def _resolve_provider(request: ChatRequest) -> Tuple[BaseProvider, str]:
+    """Pick a healthy provider for the request and the API key to call it with"""
     key_mapping = {item.name: item.api_key for item in request.api_keys or []}
-    result = await check_all_providers_health(key_mapping)
-    healthy_providers = await _filter_healthy_providers(result)
-    selected_provider_name = await _select_provider(request, healthy_providers)
+    with span("health"):
+        result = _cached_providers_health(key_mapping)
+        healthy_providers = await _filter_healthy_providers(result)
+    with span("routing"):
+        healthy_providers = await _spill_over_rate_limited(request, healthy_providers, key_mapping)
+        selected_provider_name = await _select_provider(request, healthy_providers)
 
     if selected_provider_name not in providers:
         raise HTTPException(
@@ -175,26 +310,483 @@ async def chat_response(request: ChatRequest):
             status_code=401,
             detail=f"Missing API key for selected provider: {selected_provider_name}",
         )
-    response = await selected_provider.chat_completion(request, api_key=api_key)
+    return selected_provider, api_key
+
+
+def _model_name(request: ChatRequest, provider: BaseProvider) -> str:
+    """Model the request will run on"""
+    return request.model or getattr(provider, "model_name", provider.name)
+
+
+def _hedge_target(
+    request: ChatRequest, selected: BaseProvider, api_key: str
+) -> Tuple[BaseProvider, str]:
+    """
+    Where to send a hedged duplicate: in AUTO mode another healthy provider
+    picked by the router, otherwise (or if there is none) the same provider.
+    """
+    if request.provider != Provider.AUTO:
+        return selected, api_key
+    key_mapping = {item.name: item.api_key for item in request.api_keys or []}
+    others = [
+        providers[status["name"]]
+        for status in _cached_providers_health(key_mapping)
+        if status["status"]
+        and status["name"] != selected.name
+        and get_breaker(status["name"]).is_available()
+    ]
+    if not others:
+        return selected, api_key
+    alternate = router.select(others, request)
+    return alternate, key_mapping[alternate.name]
+
+
+async def _complete(
+    provider: BaseProvider, model_name: str, request: ChatRequest, api_key: str
+) -> ChatResponse:
+    """
+    Take an admission slot and call the provider with deadline, retries and
+    optional hedging. Deterministic requests (temperature 0) that are
+    already in flight with the same payload and API key share that single
+    upstream call, and only its leader holds a slot.
+    """
+    hedge_target = _hedge_target(request, provider, api_key) if should_hedge(request) else None
+
+    async def call():
+        async with admission.slot(provider, _max_wait(request)):
+            return await resilient_completion(provider, api_key, request, hedge_target)
+
+    if request.temperature != 0:
+        return await call()
+    _, key = request_keys(provider.name, model_name, request, api_key)
+    if hedge_target is not None and hedge_target[0] is not provider:
+        # The answer may come from the hedge target: only share it with
+        # callers that would have hedged there too
+        key = f"{key}:{hedge_target[0].name}"
+    return await single_flight.do(key, call)
+
+
+def _max_wait(request: ChatRequest) -> float:
+    """Longest a request may wait for admission: its whole deadline"""
+    return (request.timeout_ms or REQUEST_TIMEOUT_MS) / 1000
+
+
+async def _chat(
+    request: ChatRequest, limiter: Optional[ProviderLimiter] = None
+) -> ChatResponse:
+    """Resolve a provider, serve from cache or call it, and cache the result"""
+    if request.session_id:
+        return await _session_chat(request, limiter)
+    selected_provider, api_key = await _resolve_provider(request)
+    request = selected_provider.fit_to_context(request)
+    model_name = _model_name(request, selected_provider)
+    cache = cacheable(request)
+    if cache:
+        with span("cache"):
+            cached = await response_cache.get(
+                selected_provider.name, model_name, request, api_key
+            )
+        if cached:
+            return cached
+
+    slot = limiter.slot(selected_provider.name) if limiter else nullcontext()
+    with span("provider"):
+        async with slot:
+            response = await _complete(selected_provider, model_name, request, api_key)
     if not response:
-        raise HTTPException(status_code=500, detail=f"AI provider error: {selected_provider_name}")
+        raise HTTPException(status_code=500, detail=f"AI provider error: {selected_provider.name}")
+    # A hedged duplicate on another provider may have answered: that answer
+    # must not be cached as the selected provider's
+    if cache and response.provider == selected_provider.name:
+        await response_cache.set(selected_provider.name, model_name, request, api_key, response)
     return response
 
 
-        
+def _get_session(session_id: str) -> Session:
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+    return session
+
+
+def _session_request(session: Session, request: ChatRequest) -> ChatRequest:
+    """The session's history plus the new messages, with the session's keys if none are sent"""
+    if not request.api_keys and session.api_keys:
+        request = request.model_copy(update={"api_keys": session.api_keys})
+    return session.expand(request)
+
+
+async def _session_chat(
+    request: ChatRequest, limiter: Optional[ProviderLimiter] = None
+) -> ChatResponse:
+    """One turn of a server-side session; turns of a session run one at a time"""
+    session = _get_session(request.session_id)
+    async with session.lock:
+        response = await _chat(_session_request(session, request), limiter)
+        session_store.record(session, request.message, response.response, request.api_keys)
+    return response.model_copy(update={"session_id": session.id})
+
+
+async def _summarize_session(
+    messages: List[ChatMessage],
+    previous: Optional[str],
+    api_keys: List[APIKeyRequestProvider],
+) -> str:
+    """Fold turns that left a session's window into its running summary"""
+    transcript = "\n".join(f"{m.role.value}: {m.content}" for m in messages)
+    if previous:
+        transcript = f"Summary so far: {previous}\n{transcript}"
+    request = ChatRequest(
+        message=[
+            ChatMessage(
+                role=MessageRole.USER,
+                content="Summarize this conversation in a few sentences, keeping facts, "
+                f"names and decisions a later reply may need:\n\n{transcript}",
+            )
+        ],
+        api_keys=api_keys,
+        max_tokens=SESSION_SUMMARY_MAX_TOKENS,
+        temperature=0,
+    )
+    return (await _chat(request)).response
+
+
+@app.post("/chat", response_model=ChatResponse, tags=["chat"])
+async def chat_response(request: ChatRequest):
+    """
+    Generate AI chat completion using the optimal provider.
+    **Auto-routing logic:**
+    - Complex analysis → Gemini(high quality)
+    """
+    mark("validation")
+    with traffic_capture.exchange("/chat", request) as outcome:
+        response = await _chat(request)
+        outcome["cached"] = response.cached
+    # Built by our own code, so returned as-is instead of re-validated
+    return FastJSONResponse(response)
+
+
+def _describe_error(e: Exception) -> Tuple[int, str, Optional[str]]:
+    """Status code, detail and provider /chat would have answered with for `e`"""
+    if isinstance(e, HTTPException):
+        return e.status_code, str(e.detail), None
+    if isinstance(e, ProviderError):
+        return e.status_code, str(e), e.provider
+    if isinstance(e, ValidationError):
+        return 422, e.errors()[0]["msg"], None
+    logger.error(f"Unexpected error: {e!r}")
+    return 500, "An unexpected error occurred. Please try again later.", None
+
+
+def _batch_item_result(index: int, outcome: Union[ChatResponse, Exception]) -> BatchItemResult:
+    """Map one batch outcome to the status and error /chat would have returned"""
+    if isinstance(outcome, ChatResponse):
+        return BatchItemResult(index=index, status=200, response=outcome)
+    status, error, provider = _describe_error(outcome)
+    return BatchItemResult(index=index, status=status, error=error, provider=provider)
+
+
+@app.post("/chat/batch", tags=["chat"])
+async def chat_batch(
+    http_request: Request, x_api_keys: Optional[str] = Header(default=None)
+):
+    """
+    Run many chat requests in one call and stream the results as NDJSON,
+    one `BatchItemResult` line per request in completion order.
+    - `application/json`: a `BatchChatRequest`
+    - `application/x-ndjson` / `application/jsonl`: one `ChatRequest` per line,
+      keys for lines without `api_keys` go in `X-API-Keys: name=key,...`
+    Requests run with bounded concurrency overall and per provider; a failing
+    request yields an error line and does not stop the batch.
+    """
+    body = await http_request.body()
+    content_type = http_request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items = parse_jsonl(body)
+        api_keys = parse_api_keys_header(x_api_keys or "")
+        concurrency = BATCH_CONCURRENCY
+    else:
+        try:
+            batch = BatchChatRequest.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        items = batch.requests
+        api_keys = batch.api_keys
+        concurrency = min(batch.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+    if not items:
+        raise HTTPException(status_code=400, detail="Empty batch")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400, detail=f"Batch too large, at most {BATCH_MAX_ITEMS} requests"
+        )
+    mark("validation")
+
+    limiter = ProviderLimiter()
+
+    async def run_item(item: Union[ChatRequest, ValidationError]) -> ChatResponse:
+        if isinstance(item, ValidationError):
+            raise item
+        return await _chat(with_default_keys(item, api_keys), limiter)
+
+    async def results():
+        async for index, outcome in fan_out(items, run_item, concurrency):
+            yield _batch_item_result(index, outcome).model_dump_json() + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+def _compare_result(target: CompareTarget, outcome, latency_ms: float) -> CompareResult:
+    result = CompareResult(
+        provider=target.provider.value, model=target.model, latency_ms=round(latency_ms, 1)
+    )
+    if outcome is None:
+        result.cancelled = True
+    elif isinstance(outcome, ChatResponse):
+        result.status = 200
+        result.response = outcome
+    else:
+        result.status, result.error, _ = _describe_error(outcome)
+    return result
+
+
+@app.post("/chat/compare", response_model=CompareResponse, tags=["chat"])
+async def chat_compare(request: CompareRequest):
+    """
+    Send one chat request to several providers / models at once.
+    - `mode: all`: every answer side by side with its latency, tokens and
+      cost; takes as long as the slowest target
+    - `mode: first`: the first successful answer with at least
+      `min_completion_tokens` wins and the other calls are cancelled
+    Each target goes through the same health checks, cache, rate limits
+    and retries as `/chat`; a failing target does not fail the comparison.
+    """
+    if request.session_id:
+        raise HTTPException(status_code=400, detail="Sessions cannot be compared")
+    targets = request.targets
+    if not targets:
+        key_names = {item.name for item in request.api_keys}
+        targets = [CompareTarget(provider=name) for name in providers if name in key_names]
+    if not targets:
+        raise HTTPException(status_code=400, detail="No providers to compare")
+    base = ChatRequest(**request.model_dump(exclude={"targets", "mode", "min_completion_tokens"}))
+    mark("validation")
+
+    async def ask(target: CompareTarget) -> ChatResponse:
+        update = {"provider": target.provider, "model": target.model or base.model}
+        return await _chat(base.model_copy(update=update))
+
+    def acceptable(response: ChatResponse) -> bool:
+        return bool(response.response) and (
+            (response.completion_tokens or 0) >= request.min_completion_tokens
+        )
+
+    start = time.perf_counter()
+    outcomes, winner = await race(
+        targets, ask, acceptable if request.mode == CompareMode.FIRST else None
+    )
+    return FastJSONResponse(
+        CompareResponse(
+            mode=request.mode,
+            results=[
+                _compare_result(target, outcome, latency_ms)
+                for target, (outcome, latency_ms) in zip(targets, outcomes)
+            ],
+            winner=winner,
+            wall_ms=round((time.perf_counter() - start) * 1000, 1),
+        )
+    )
+
+
+def _sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat/stream", tags=["chat"])
+async def chat_stream(request: ChatRequest):
+    """
+    Stream an AI chat completion as Server-Sent Events.
+    - `data: {"delta": "..."}` for every chunk
+    - `event: done` with provider, model, time to first token and latency
+    - `event: error` with the status /chat would have answered if the provider fails mid-stream
+    If the client disconnects, the upstream provider stream is cancelled.
+    """
+    mark("validation")
+    # Before the session history is expanded: session turns are not captured
+    capture = traffic_capture.begin("/chat/stream", request)
+    session = _get_session(request.session_id) if request.session_id else None
+    new_messages = request.message
+    if session is not None:
+        request = _session_request(session, request)
+    try:
+        selected_provider, api_key = await _resolve_provider(request)
+        request = selected_provider.fit_to_context(request)
+        # Shed before answering 200, the slot is held until the stream ends
+        admitted_at = await admission.acquire(selected_provider, _max_wait(request))
+    except Exception as e:
+        traffic_capture.finish(capture, getattr(e, "status_code", 500))
+        raise
+
+    async def event_stream():
+        start_time = time.time()
+        ttft_ms = None
+        chunks: List[str] = []
+        lock = session.lock if session is not None else nullcontext()
+        error: Optional[BaseException] = None
+        try:
+            async with lock:
+                async for text in selected_provider.stream_chat_completion(
+                    request, api_key=api_key
+                ):
+                    if ttft_ms is None:
+                        ttft_ms = (time.time() - start_time) * 1000
+                    chunks.append(text)
+                    yield _sse_event({"delta": text})
+                if session is not None:
+                    session_store.record(
+                        session, new_messages, "".join(chunks), request.api_keys
+                    )
+        except Exception as e:
+            error = e
+            latency_ms = (time.time() - start_time) * 1000
+            traffic_capture.record_call(selected_provider.name, request, latency_ms, error=e)
+            status = getattr(e, "status_code", 500)
+            traffic_capture.finish(capture, status)
+            yield _sse_event(
+                {"detail": str(e), "provider": selected_provider.name, "status": status},
+                event="error",
+            )
+            return
+        except BaseException as e:
+            error = e
+            # The client went away
+            traffic_capture.finish(capture, 499)
+            raise
+        finally:
+            admission.release(selected_provider, admitted_at, error)
+        traffic_capture.record_call(
+            selected_provider.name,
+            request,
+            (time.time() - start_time) * 1000,
+            ttft_ms=ttft_ms,
+            text="".join(chunks),
+            model=_model_name(request, selected_provider),
+        )
+        traffic_capture.finish(capture, 200)
+        yield _sse_event(
+            {
+                "provider": selected_provider.name,
+                "model": _model_name(request, selected_provider),
+                "ttft_ms": round(ttft_ms or 0.0, 1),
+                "latency_ms": round((time.time() - start_time) * 1000, 1),
+            },
+            event="done",
+        )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/jobs", response_model=JobResponse, status_code=202, tags=["jobs"])
+async def create_job(request: JobRequest):
+    """
+    Queue a chat request and return its job id immediately.
+    Poll `GET /jobs/{id}` (`?wait=seconds` to long-poll) or set `webhook_url`
+    to receive the finished job as a JSON POST.
+    """
+    if request.webhook_url:
+        error = webhook_url_error(request.webhook_url)
+        if error:
+            raise HTTPException(status_code=400, detail=error)
+    if job_queue.is_full():
+        raise HTTPException(status_code=503, detail="Job queue is full. Please try again later.")
+    return (await job_queue.submit(request)).to_response()
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse, tags=["jobs"])
+async def get_job(job_id: str, wait: float = Query(default=0, ge=0)):
+    """Job state; with `wait` > 0, block up to that many seconds for it to finish"""
+    job = await job_queue.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job.to_response()
+
+
+@app.post("/sessions", response_model=SessionInfo, status_code=201, tags=["sessions"])
+async def create_session(request: SessionCreate):
+    """
+    Start a server-side conversation. Send its id as `session_id` on
+    /chat or /chat/stream with only the new message; the server keeps the
+    history, windowed to the session's token budget.
+    """
+    return session_store.create(request.system, request.token_budget).info()
+
+
+@app.get("/sessions/{session_id}", response_model=SessionInfo, tags=["sessions"])
+async def get_session(session_id: str):
+    """Session state and the history that will be sent with the next turn"""
+    return _get_session(session_id).info()
+
+
+@app.delete("/sessions/{session_id}", status_code=204, tags=["sessions"])
+async def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+
+
+@app.get("/usage", response_model=UsageReport, tags=["usage"])
+async def usage(
+    group_by: str = Query(default="provider", description="Comma separated: provider, model, key, hour"),
+    hours: float = Query(default=24, gt=0, description="Look back this many hours"),
+    provider: Optional[str] = None,
+    x_api_key: Optional[str] = Header(default=None, description="Only this key's usage"),
+):
+    """
+    Requests, errors, tokens, cost and latency percentiles of upstream
+    calls, aggregated per provider, model, API key and / or hour.
+    """
+    groups = [g.strip() for g in group_by.split(",") if g.strip()]
+    unknown = [g for g in groups if g not in GROUP_COLUMNS]
+    if unknown or not groups:
+        raise HTTPException(
+            status_code=400,
+            detail=f"group_by must be a list of: {', '.join(GROUP_COLUMNS)}",
+        )
+    until = time.time()
+    since = until - hours * 3600
+    rows = await usage_pipeline.aggregate(
+        groups,
+        since,
+        until,
+        provider=provider,
+        key_hash=hash_api_key(x_api_key) if x_api_key else None,
+    )
+    return UsageReport(
+        since=datetime.fromtimestamp(since, timezone.utc),
+        until=datetime.fromtimestamp(until, timezone.utc),
+        group_by=groups,
+        groups=[UsageAggregate(**row) for row in rows],
+    )
 
 
 @app.get("/status", response_model=SystemStatus, tags=["Health"])
 async def system_status():
     """Get detailed system status including provider metrics"""
-    provider_statuses = []
-    total_requests = 0
-    for provider in providers.values():
-        status = provider.get_status()
-        provider_statuses.append(status)
-        total_requests += status.total_requests
+    if cluster_state.enabled:
+        # Provider metrics, health and circuits of every worker on the host
+        provider_statuses = cluster_state.provider_statuses()
+        uptime = time.time() - cluster_state.oldest_start()
+        resilience = cluster_state.resilience_status()
+    else:
+        provider_statuses = [provider.get_status() for provider in providers.values()]
+        uptime = time.time() - start_time
+        resilience = resilience_status()
+    total_requests = sum(status.total_requests for status in provider_statuses)
 
-    uptime = time.time() - start_time
     overall_status = (
         "healthy" if any(p.healthy for p in provider_statuses) else "unhealthy"
     )
@@ -204,8 +796,32 @@ async def system_status():
         providers=provider_statuses,
         total_requests=total_requests,
         uptime=uptime,
+        cache=response_cache.stats(),
+        coalesced_requests=single_flight.coalesced,
+        resilience=resilience,
+        jobs=job_queue.stats(),
+        rate_limits=rate_limiter.stats(),
+        sessions=session_store.stats(),
+        usage=usage_pipeline.stats(),
+        admission=admission.stats(),
+        capture=traffic_capture.stats() if traffic_capture.enabled else None,
+        cluster=cluster_state.stats() if cluster_state.enabled else None,
+    )
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """Gateway and provider metrics in OpenMetrics text format"""
+    return PlainTextResponse(
+        render_openmetrics(
+            providers.values(),
+            response_cache.stats(),
+            single_flight.coalesced,
+            resilience_status(),
+        ),
+        media_type=OPENMETRICS_CONTENT_TYPE,
     )
 
+
 @app.get("/list", response_model=ProviderList,tags=["list"])
 async def list_all_providers():
     """List all avaialble providers"""
@@ -216,7 +832,7 @@ async def list_all_providers():
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc: HTTPException):
-    print("===========HTTPException Triggered===========")
+    logger.info(f"HTTPException {exc.status_code}: {exc.detail}")
     return JSONResponse(
         status_code=exc.status_code,
         content=ErrorResponse(
@@ -225,10 +841,27 @@ async def http_exception_handler(request, exc: HTTPException):
     )
 
 
+@app.exception_handler(ProviderError)
+async def provider_exception_handler(request, exc: ProviderError):
+    """Provider failures that survived retries and hedging."""
+    logger.warning(f"provider error ({exc.provider}): {exc}")
+    headers = None
+    retry_after = getattr(exc, "retry_after", None)
+    if retry_after is not None:
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))}
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=ErrorResponse(
+            error=exc.status_code, detail=str(exc), provider=exc.provider
+        ).dict(),
+        headers=headers,
+    )
+
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc: Exception):
     """Handle unexpected exceptions."""
-    print(f"=========Unexpected error==========2: {exc.detail}")
+    logger.exception(f"Unexpected error: {exc}")
     return JSONResponse(
         status_code=500,
         content=ErrorResponse(
@@ -241,8 +874,8 @@ async def general_exception_handler(request, exc: Exception):
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc: RequestValidationError):
-    print("======422 Validation Error=====")
     e = exc.errors()
+    logger.info(f"422 validation error: {e[0]['msg']}")
     return JSONResponse(
         status_code=422,
         content={
@@ -0,0 +1,194 @@
+"""Rolling provider metrics with fixed-bucket latency histograms"""
+
+import bisect
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+METRICS_WINDOW_SECONDS = float(os.getenv("METRICS_WINDOW_SECONDS", "60"))
+METRICS_WINDOW_SLOTS = int(os.getenv("METRICS_WINDOW_SLOTS", "12"))
+
+# Log-spaced bucket bounds (HDR style): 1ms up to ~2 minutes, ~10% wide each
+_MIN_MS = 1.0
+_GROWTH = 1.1
+_LOG_GROWTH = math.log(_GROWTH)
+BUCKET_BOUNDS: List[float] = [_MIN_MS * _GROWTH**i for i in range(124)]
+
+
+def bucket_index(latency_ms: float) -> int:
+    """O(1) bucket lookup, values past the last bound land in the last bucket"""
+    if latency_ms <= _MIN_MS:
+        return 0
+    index = int(math.ceil(math.log(latency_ms / _MIN_MS) / _LOG_GROWTH))
+    return min(index, len(BUCKET_BOUNDS) - 1)
+
+
+class _Slot:
+    """Counters for one slice of the sliding window"""
+
+    __slots__ = ("epoch", "buckets", "requests", "errors", "tokens", "latency_sum")
+
+    def __init__(self):
+        self.epoch = -1
+        self.buckets = [0] * len(BUCKET_BOUNDS)
+        self.requests = 0
+        self.errors = 0
+        self.tokens = 0
+        self.latency_sum = 0.0
+
+    def reset(self, epoch: int):
+        self.epoch = epoch
+        self.buckets = [0] * len(BUCKET_BOUNDS)
+        self.requests = 0
+        self.errors = 0
+        self.tokens = 0
+        self.latency_sum = 0.0
+
+
+class WindowedStats:
+    """
+    Latency histogram, error count and token throughput over a sliding
+    time window made of `slots` equal slices (a ring buffer).
+
+    Recording is O(1) and takes no lock: it is a handful of integer
+    increments with no await in between, so it cannot interleave with
+    another coroutine on the event loop. Old slices are reset lazily the
+    next time their position in the ring is reused.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = METRICS_WINDOW_SECONDS,
+        slots: int = METRICS_WINDOW_SLOTS,
+    ):
+        self.window_seconds = window_seconds
+        self.slot_seconds = window_seconds / slots
+        self._slots = [_Slot() for _ in range(slots)]
+
+    def _current(self, now: float) -> _Slot:
+        epoch = int(now / self.slot_seconds)
+        slot = self._slots[epoch % len(self._slots)]
+        if slot.epoch != epoch:
+            slot.reset(epoch)
+        return slot
+
+    def record(self, latency_ms: float, success: bool, tokens: int = 0):
+        slot = self._current(time.time())
+        slot.buckets[bucket_index(latency_ms)] += 1
+        slot.requests += 1
+        slot.latency_sum += latency_ms
+        slot.tokens += tokens
+        if not success:
+            slot.errors += 1
+
+    def _live_slots(self) -> List[_Slot]:
+        epoch = int(time.time() / self.slot_seconds)
+        oldest = epoch - len(self._slots) + 1
+        return [s for s in self._slots if oldest <= s.epoch <= epoch]
+
+    def _merged_buckets(self, slots: List[_Slot]) -> List[int]:
+        merged = [0] * len(BUCKET_BOUNDS)
+        for slot in slots:
+            for i, count in enumerate(slot.buckets):
+                if count:
+                    merged[i] += count
+        return merged
+
+    @staticmethod
+    def _percentile(buckets: List[int], total: int, percentile: float) -> Optional[float]:
+        if total == 0:
+            return None
+        rank = max(1, math.ceil(total * percentile / 100))
+        seen = 0
+        for i, count in enumerate(buckets):
+            seen += count
+            if seen >= rank:
+                return BUCKET_BOUNDS[i]
+        return BUCKET_BOUNDS[-1]
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Latency (ms) upper bound at `percentile` (0-100), None if no data"""
+        slots = self._live_slots()
+        total = sum(s.requests for s in slots)
+        return self._percentile(self._merged_buckets(slots), total, percentile)
+
+    def success_rate(self) -> float:
+        """Success rate over the window, 1.0 if no data"""
+        slots = self._live_slots()
+        requests = sum(s.requests for s in slots)
+        if requests == 0:
+            return 1.0
+        return 1 - sum(s.errors for s in slots) / requests
+
+    def export(self) -> Dict[str, object]:
+        """Raw window totals, JSON-serializable and mergeable with `merged_snapshot`"""
+        slots = self._live_slots()
+        buckets = self._merged_buckets(slots)
+        return {
+            "window_seconds": self.window_seconds,
+            "requests": sum(s.requests for s in slots),
+            "errors": sum(s.errors for s in slots),
+            "tokens": sum(s.tokens for s in slots),
+            "latency_sum": sum(s.latency_sum for s in slots),
+            "buckets": {str(i): count for i, count in enumerate(buckets) if count},
+        }
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        """All window metrics in one pass"""
+        return merged_snapshot([self.export()])
+
+
+def merged_snapshot(exports: List[Dict[str, object]]) -> Dict[str, Optional[float]]:
+    """Window metrics over several `WindowedStats.export()`s, e.g. one per worker"""
+    window_seconds = max((e["window_seconds"] for e in exports), default=METRICS_WINDOW_SECONDS)
+    requests = sum(e["requests"] for e in exports)
+    errors = sum(e["errors"] for e in exports)
+    tokens = sum(e["tokens"] for e in exports)
+    latency_sum = sum(e["latency_sum"] for e in exports)
+    buckets = [0] * len(BUCKET_BOUNDS)
+    for e in exports:
+        for i, count in e["buckets"].items():
+            buckets[int(i)] += count
+    return {
+        "window_seconds": window_seconds,
+        "requests": requests,
+        "error_rate": errors / requests if requests else 0.0,
+        "average_latency": latency_sum / requests if requests else 0.0,
+        "p50": WindowedStats._percentile(buckets, requests, 50),
+        "p95": WindowedStats._percentile(buckets, requests, 95),
+        "p99": WindowedStats._percentile(buckets, requests, 99),
+        "requests_per_second": requests / window_seconds,
+        "tokens_per_second": tokens / window_seconds,
+    }
+
+
+# Prometheus-style bucket bounds in seconds for lifetime histograms
+DEFAULT_SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+class Histogram:
+    """Cumulative (never reset) histogram for the /metrics exporter"""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds=DEFAULT_SECONDS_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[int]:
+        """Running totals per bucket, last entry is +Inf"""
+        totals, running = [], 0
+        for count in self.counts:
+            running += count
+            totals.append(running)
+        return totals
@@ -1,9 +1,11 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from enum import Enum
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict
 from datetime import datetime, timezone, timedelta
 import shortuuid
 
+from .providers.registry import enum_member_name, list_providers
+
 
 class MessageRole(str, Enum):
     """Message roles for chat conservation"""
@@ -13,11 +15,14 @@ class MessageRole(str, Enum):
     SYSTEM = "system"
 
 
-class Provider(str, Enum):
-    """Available LLM Providers"""
-
-    AUTO = "auto"
-    GEMINI = "gemini"
+# "auto" plus every enabled provider, e.g. Provider.GEMINI
+Provider = Enum(
+    "Provider",
+    {"AUTO": "auto", **{enum_member_name(name): name for name in list_providers()}},
+    type=str,
+    module=__name__,
+)
+Provider.__doc__ = "Available LLM Providers"
 
 def generate_id() -> str:
     return "PRO" + shortuuid.ShortUUID().random(length=6)
@@ -75,6 +80,27 @@ class ChatRequest(BaseModel):
         default_factory=list,
         description="Map of provider_name -> API key for AUTO mode",
     )
+    cache: Optional[bool] = Field(
+        default=None,
+        description="Serve from / store in the response cache (default: only temperature 0 requests)",
+    )
+    timeout_ms: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=600000,
+        description="Deadline for the whole request including retries (server default if not set)",
+    )
+    hedge: Optional[bool] = Field(
+        default=None,
+        description="Send a duplicate request if the first one is slow (server default if not set)",
+    )
+    session_id: Optional[str] = Field(
+        default=None,
+        description="Continue a server-side session; `message` then holds only the new messages",
+    )
+    # Set when `message` starts with a session's history (see sessions.py)
+    _session: Any = PrivateAttr(default=None)
+    _history_len: int = PrivateAttr(default=0)
 
     class Config:
         json_schema_extra = {
@@ -97,11 +123,20 @@ class ChatResponse(BaseModel):
     model: str = Field(..., description="Specific model that was used")
     response: str = Field(..., description="Generated AI response")
     token_used: int = Field(..., description="Number of tokens consumed")
+    prompt_tokens: Optional[int] = Field(default=None, description="Tokens in the prompt")
+    completion_tokens: Optional[int] = Field(
+        default=None, description="Tokens in the generated response"
+    )
     cost: float = Field(..., description="Cost in USD (0.00 for free tiers)")
     latency_ms: str = Field(..., description="Response time in milliseconds")
     timestamp: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc),
     )
+    session_id: Optional[str] = Field(default=None, description="Session the turn belongs to")
+    cached: bool = Field(default=False, description="Served from the response cache")
+    cache_type: Optional[str] = Field(
+        default=None, description="'exact' or 'semantic' when served from cache"
+    )
 
     class Congig:
         json_schema_extra = {
@@ -117,12 +152,159 @@ class ChatResponse(BaseModel):
         }
 
 
+class BatchChatRequest(BaseModel):
+    """Many chat requests run in one call"""
+
+    requests: List[ChatRequest] = Field(
+        ..., min_length=1, description="Chat requests to run, results keep their index"
+    )
+    api_keys: List[APIKeyRequestProvider] = Field(
+        default_factory=list,
+        description="API keys used by every request that does not carry its own",
+    )
+    concurrency: Optional[int] = Field(
+        default=None, ge=1, description="Max requests in flight (capped by the server)"
+    )
+
+
+class BatchItemResult(BaseModel):
+    """One NDJSON line of a /chat/batch response"""
+
+    index: int = Field(..., description="Position of the request in the batch")
+    status: int = Field(..., description="HTTP status the request would have had on /chat")
+    response: Optional[ChatResponse] = Field(default=None, description="Result on success")
+    error: Optional[str] = Field(default=None, description="Error detail on failure")
+    provider: Optional[str] = Field(default=None, description="Provider that caused the error")
+
+
+class CompareMode(str, Enum):
+    """How /chat/compare finishes"""
+
+    ALL = "all"
+    FIRST = "first"
+
+
+class CompareTarget(BaseModel):
+    """One provider (and optionally model) a compared request is sent to"""
+
+    provider: Provider = Field(..., description="Provider to call")
+    model: Optional[str] = Field(default=None, description="Model, the request's or provider default if not set")
+
+
+class CompareRequest(ChatRequest):
+    """One chat request answered by several providers at once"""
+
+    targets: List[CompareTarget] = Field(
+        default_factory=list,
+        max_length=16,
+        description="Providers / models to ask; every initialized provider with a key if empty",
+    )
+    mode: CompareMode = Field(
+        default=CompareMode.ALL,
+        description="'all': wait for every answer; 'first': first acceptable answer wins, the rest are cancelled",
+    )
+    min_completion_tokens: int = Field(
+        default=0, ge=0, description="In 'first' mode, answers with fewer tokens are not acceptable"
+    )
+
+
+class CompareResult(BaseModel):
+    """Outcome of one target of /chat/compare"""
+
+    provider: str = Field(..., description="Provider asked")
+    model: Optional[str] = Field(default=None, description="Model asked, provider default if not set")
+    status: Optional[int] = Field(
+        default=None, description="HTTP status /chat would have had, none if cancelled"
+    )
+    latency_ms: float = Field(..., description="Time from the start of the comparison to this outcome")
+    response: Optional[ChatResponse] = Field(default=None, description="Answer on success")
+    error: Optional[str] = Field(default=None, description="Error detail on failure")
+    cancelled: bool = Field(default=False, description="Cancelled because another answer won")
+
+
+class CompareResponse(BaseModel):
+    """Side-by-side results of /chat/compare, in target order"""
+
+    mode: CompareMode
+    results: List[CompareResult]
+    winner: Optional[int] = Field(
+        default=None, description="Index of the winning result in 'first' mode"
+    )
+    wall_ms: float = Field(..., description="Time the whole comparison took")
+
+
+class JobStatus(str, Enum):
+    """Lifecycle of an asynchronous chat job"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobRequest(ChatRequest):
+    """Chat request run in the background by the job queue"""
+
+    priority: int = Field(
+        default=0, ge=0, le=9, description="Higher runs first, FIFO within a priority"
+    )
+    webhook_url: Optional[str] = Field(
+        default=None, description="URL that receives the finished job as a JSON POST"
+    )
+
+
+class JobResponse(BaseModel):
+    """State of an asynchronous chat job"""
+
+    id: str = Field(..., description="Job id")
+    status: JobStatus = Field(..., description="queued, running, succeeded or failed")
+    priority: int = Field(..., description="Job priority")
+    created_at: datetime = Field(..., description="When the job was submitted")
+    started_at: Optional[datetime] = Field(default=None, description="When a worker picked it up")
+    finished_at: Optional[datetime] = Field(default=None, description="When it finished")
+    result: Optional[ChatResponse] = Field(default=None, description="Result on success")
+    error: Optional[str] = Field(default=None, description="Error detail on failure")
+    status_code: Optional[int] = Field(
+        default=None, description="HTTP status the request would have had on /chat"
+    )
+
+
+class SessionCreate(BaseModel):
+    """Start a server-side conversation"""
+
+    system: Optional[str] = Field(
+        default=None, min_length=1, description="System prompt kept at the top of every turn"
+    )
+    token_budget: Optional[int] = Field(
+        default=None, ge=1, description="History tokens kept before old turns are windowed out"
+    )
+
+
+class SessionInfo(BaseModel):
+    """State of a server-side conversation"""
+
+    id: str = Field(..., description="Session id to pass as `session_id`")
+    created_at: datetime = Field(..., description="When the session was created")
+    turns: int = Field(..., description="Completed turns")
+    history_tokens: int = Field(..., description="Tokens of history sent with the next turn")
+    token_budget: int = Field(..., description="History token budget")
+    summary: Optional[str] = Field(default=None, description="Summary of windowed-out turns")
+    messages: List[ChatMessage] = Field(
+        default_factory=list, description="History sent with the next turn"
+    )
+
+
 class APIKeyProviderStatus(BaseModel):
     name: str = Field(..., description="name of the service provider")
     status: bool = Field(..., description="status of the service provider")
+    error: Optional[str] = Field(default=None, description="Why the check failed")
+    latency_ms: Optional[float] = Field(default=None, description="Duration of the probe")
 
 
 class HealthResponse(BaseModel):
+    status: str = Field(
+        default="healthy", description="healthy, degraded (some providers failed) or unhealthy"
+    )
     provider: List[APIKeyProviderStatus] = Field(
         ..., description="list of providers and their status"
     )
@@ -133,6 +315,20 @@ class HealthRequest(BaseModel):
     providers: List[APIKeyRequestProvider]
 
 
+class WindowMetrics(BaseModel):
+    """Provider metrics over the recent sliding window"""
+
+    window_seconds: float = Field(..., description="Length of the sliding window")
+    requests: int = Field(..., description="Requests completed in the window")
+    error_rate: float = Field(..., description="Failed / total requests in the window")
+    average_latency: float = Field(..., description="Mean latency in the window (ms)")
+    p50: Optional[float] = Field(default=None, description="Median latency (ms)")
+    p95: Optional[float] = Field(default=None, description="95th percentile latency (ms)")
+    p99: Optional[float] = Field(default=None, description="99th percentile latency (ms)")
+    requests_per_second: float = Field(..., description="Request throughput")
+    tokens_per_second: float = Field(..., description="Token throughput")
+
+
 class ProviderStatus(BaseModel):
     """Status information for a single provider"""
 
@@ -140,8 +336,28 @@ class ProviderStatus(BaseModel):
     healthy: bool = Field(..., description="Whether the provider is currently healthy")
     last_check: datetime = Field(..., description="last health check timestamp")
     average_latency: float = Field(..., description="Average response time")
+    average_ttft: float = Field(
+        default=0.0, description="Average time to first token of streamed responses (ms)"
+    )
     success_rate: float = Field(..., description="success rate between 0.0 to 0.1")
     total_requests: int = Field(default=0, description="total request processed")
+    in_flight: int = Field(default=0, description="calls currently running upstream")
+    queue_depth: int = Field(
+        default=0, description="calls waiting for a free concurrency slot"
+    )
+    peak_queue_depth: int = Field(default=0, description="highest queue depth seen")
+    max_concurrency: int = Field(
+        default=0, description="max concurrent upstream calls for this provider"
+    )
+    client_pool: Optional[Dict[str, int]] = Field(
+        default=None, description="per-API-key client pool size, hits, misses, evictions"
+    )
+    window: Optional[WindowMetrics] = Field(
+        default=None, description="Latency percentiles, error rate and throughput, recent window"
+    )
+    models: Dict[str, WindowMetrics] = Field(
+        default_factory=dict, description="Recent window metrics per model"
+    )
 
 
 class SystemStatus(BaseModel):
@@ -151,6 +367,61 @@ class SystemStatus(BaseModel):
     providers: List[ProviderStatus] = Field(..., description="Status of all providers")
     total_requests: int = Field(..., description="total requests accross all providers")
     uptime: timedelta = Field(..., description="System uptime")
+    cache: Optional[Dict[str, float]] = Field(
+        default=None, description="Response cache hit ratio, bytes saved and size"
+    )
+    coalesced_requests: int = Field(
+        default=0, description="requests that shared an identical in-flight upstream call"
+    )
+    resilience: Optional[Dict[str, Any]] = Field(
+        default=None, description="Retries, timeouts, hedges and circuit breaker states"
+    )
+    jobs: Optional[Dict[str, Any]] = Field(
+        default=None, description="Job queue depth, running jobs and wait times"
+    )
+    rate_limits: Optional[Dict[str, float]] = Field(
+        default=None, description="Requests admitted, queued and rejected by the rate limiter"
+    )
+    sessions: Optional[Dict[str, float]] = Field(
+        default=None, description="Active, evicted and expired sessions, windowed messages"
+    )
+    usage: Optional[Dict[str, float]] = Field(
+        default=None, description="Usage events buffered, written and dropped"
+    )
+    cluster: Optional[Dict[str, Any]] = Field(
+        default=None, description="Workers whose provider metrics, health and circuits are merged"
+    )
+    admission: Optional[Dict[str, Any]] = Field(
+        default=None, description="Event-loop lag, requests shed and adaptive limits per provider"
+    )
+    capture: Optional[Dict[str, Any]] = Field(
+        default=None, description="Traffic capture for replay, when enabled"
+    )
+
+
+class UsageAggregate(BaseModel):
+    """Usage of one group; only the grouped-by fields are set"""
+
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    key: Optional[str] = Field(default=None, description="Hashed API key")
+    hour: Optional[datetime] = None
+    requests: int
+    errors: int
+    tokens: int
+    cost: float
+    latency_ms_avg: float
+    # Upper bounds of the latency histogram buckets (~10% wide)
+    latency_ms_p50: Optional[float] = None
+    latency_ms_p95: Optional[float] = None
+    latency_ms_p99: Optional[float] = None
+
+
+class UsageReport(BaseModel):
+    since: datetime
+    until: datetime
+    group_by: List[str]
+    groups: List[UsageAggregate]
 
 
 class ErrorResponse(BaseModel):
@@ -1,34 +1,53 @@
 """This file contais all the helper functions required"""
 
-from .base import BaseProvider
-from .gemini_provider import GeminiProvider
-from typing import List
-
-AVAILABLE_PROVIDERS = {
-    "gemini": GeminiProvider,
+import importlib
+
+from .errors import (
+    ProviderError,
+    ProviderTimeoutError,
+    CircuitOpenError,
+    RateLimitedError,
+    ContextLengthError,
+)
+from .registry import (
+    list_providers,
+    load_provider_class,
+    registered_providers,
+)
+
+# Imported on first access so an unused SDK is never loaded
+_LAZY_ATTRIBUTES = {
+    "BaseProvider": ".base",
+    "GeminiProvider": ".gemini_provider",
+    "OpenAICompatibleProvider": ".openai_provider",
+    "MockProvider": ".mock_provider",
 }
 
 
-def list_providers() -> List[str]:
-    """Get list of avaiable providers"""
-    return list(AVAILABLE_PROVIDERS.keys())
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
 
 
-def get_provider(provider_name: str) -> BaseProvider:
+def get_provider(provider_name: str) -> "BaseProvider":
     """Factory Function to get a provider instance"""
-    if provider_name not in AVAILABLE_PROVIDERS:
-        supported_providers = ", ".join(AVAILABLE_PROVIDERS.keys())
-        raise ValueError(
-            f"Provider {provider_name} not supported. Available providers are: {supported_providers}"
-        )
-
-    provider_class = AVAILABLE_PROVIDERS[provider_name]
+    provider_class = load_provider_class(provider_name)
     return provider_class()
 
 
 __all__ = [
-    BaseProvider,
-    GeminiProvider,
-    AVAILABLE_PROVIDERS,
-    list_providers,
+    "BaseProvider",
+    "ProviderError",
+    "ProviderTimeoutError",
+    "CircuitOpenError",
+    "RateLimitedError",
+    "ContextLengthError",
+    "GeminiProvider",
+    "OpenAICompatibleProvider",
+    "MockProvider",
+    "get_provider",
+    "list_providers",
+    "load_provider_class",
+    "registered_providers",
 ]
@@ -1,22 +1,62 @@
 from abc import ABC, abstractmethod
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from ..models import ChatRequest, ChatResponse, ProviderStatus
-from typing import Optional
+from ..models import ChatMessage, ChatRequest, ChatResponse, ProviderStatus, WindowMetrics
+from ..health import health_registry
+from ..usage import usage_pipeline
+from ..metrics import Histogram, WindowedStats, merged_snapshot
+from .. import tokens as token_counting
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
 from typing import Dict, Union
 
+PROVIDER_MAX_CONCURRENCY = int(os.getenv("PROVIDER_MAX_CONCURRENCY", "16"))
+
+_STREAM_END = object()
+
 
 class BaseProvider(ABC):
     """Base Provider class"""
 
-    def __init__(self, name):
+    def __init__(self, name, max_concurrency: Optional[int] = None):
         self.name = name
+        # Per-provider override, e.g. GEMINI_MAX_CONCURRENCY=32
+        self.max_concurrency = max_concurrency or int(
+            os.getenv(f"{name.upper()}_MAX_CONCURRENCY", PROVIDER_MAX_CONCURRENCY)
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix=f"{name}-io"
+        )
+        self._concurrency = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.peak_queue_depth = 0
+        # Providers that pool per-key SDK clients set this to a ClientPool
+        self.client_pool = None
         self.is_healthy = True
         self.last_check = datetime.now(timezone.utc)
         self.total_requests = 0
         self.successful_requests = 0
         self.failed_requests = 0
         self.total_latency = 0.0
+        self.streamed_requests = 0
+        self.total_ttft = 0.0
         self.last_error = None
+        self.window = WindowedStats()
+        self.latency_histogram = Histogram()
+        self.total_tokens = 0
+        self.total_cost = 0.0
+        self.model_windows: Dict[str, WindowedStats] = {}
+        # Prompt + output tokens the model accepts, None means unchecked
+        self.context_window: Optional[int] = None
+        self.tokenizer = token_counting.get_counter(
+            os.getenv(f"{name.upper()}_TOKENIZER", token_counting.TOKENIZER)
+        )
+        # Upstream quota per API key, None means unlimited (see ratelimit.py)
+        self.requests_per_minute: Optional[float] = None
+        self.tokens_per_minute: Optional[float] = None
 
     @abstractmethod
     def chat_completion(self, request: ChatRequest, api_key: str) -> ChatResponse:
@@ -33,12 +73,178 @@ class BaseProvider(ABC):
         """Check health of a particular provider"""
         pass
 
+    def count_tokens(self, text: str) -> int:
+        return self.tokenizer.count(text)
+
+    def count_prompt_tokens(self, messages: List[ChatMessage]) -> int:
+        return token_counting.count_message_tokens(self.tokenizer, messages)
+
+    def fit_to_context(self, request: ChatRequest) -> ChatRequest:
+        """Pre-flight: reject or truncate a request that does not fit `context_window`"""
+        request, _ = token_counting.fit_to_context(
+            request, self.tokenizer, self.context_window, self.name
+        )
+        return request
+
+    def format_prompt(
+        self, request: ChatRequest, format_messages: Callable[[List[ChatMessage]], List[Any]]
+    ) -> List[Any]:
+        """
+        Provider-formatted messages for a request. Session requests reuse the
+        session's already formatted history and only format the new messages,
+        unless the history was changed on the way (e.g. truncated to fit).
+        """
+        session = request._session
+        n = request._history_len
+        if session is not None:
+            history = session.history()
+            if len(history) == n and all(
+                a is b for a, b in zip(request.message[:n], history)
+            ):
+                return session.formatted(self.name, format_messages) + format_messages(
+                    request.message[n:]
+                )
+        return format_messages(request.message)
+
+    async def _acquire_slot(self):
+        if self._concurrency.locked():
+            self.queue_depth += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth)
+            try:
+                await self._concurrency.acquire()
+            finally:
+                self.queue_depth -= 1
+        else:
+            await self._concurrency.acquire()
+        self.in_flight += 1
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self._concurrency.release()
+
+    async def run_blocking(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking SDK call on the provider's own thread pool so it never
+        stalls the event loop. At most `max_concurrency` calls run at once;
+        the rest wait in line and are counted in `queue_depth`.
+
+        If the caller is cancelled (deadline, hedge loser) the worker thread
+        cannot be interrupted, so the slot is only released once it is done.
+        """
+        await self._acquire_slot()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+        future.add_done_callback(self._on_blocking_done)
+        return await asyncio.shield(future)
+
+    def _on_blocking_done(self, future: asyncio.Future):
+        self._release_slot()
+        if not future.cancelled():
+            # Mark abandoned failures as retrieved
+            future.exception()
+
+    async def iterate_blocking(
+        self, func: Callable[..., Iterator[Any]], *args, **kwargs
+    ) -> AsyncIterator[Any]:
+        """
+        Consume a blocking iterator (e.g. an SDK stream) on the provider's
+        thread pool, holding one concurrency slot for the whole stream.
+
+        `func` should be a generator function so no blocking work happens
+        until the first item is pulled. Items are pulled one at a time only
+        when the consumer asks for them, which gives natural backpressure.
+        If the consumer stops early (client disconnect) the iterator is
+        closed on the worker thread so the upstream stream is cancelled.
+        """
+        await self._acquire_slot()
+        loop = asyncio.get_running_loop()
+        iterator = func(*args, **kwargs)
+        pending = None
+        finished = False
+        try:
+            while True:
+                pending = loop.run_in_executor(
+                    self._executor, next, iterator, _STREAM_END
+                )
+                item = await pending
+                if item is _STREAM_END:
+                    finished = True
+                    return
+                yield item
+        finally:
+            if not finished and hasattr(iterator, "close"):
+                if pending is not None and not pending.done():
+                    # A pull is still running on the worker; close after it returns
+                    pending.add_done_callback(
+                        lambda _: self._close_iterator(iterator)
+                    )
+                else:
+                    self._close_iterator(iterator)
+            self._release_slot()
+
+    def _close_iterator(self, iterator: Iterator[Any]):
+        try:
+            self._executor.submit(iterator.close)
+        except RuntimeError:
+            # Executor already shut down
+            pass
+
+    async def stream_chat_completion(
+        self, request: ChatRequest, api_key: str
+    ) -> AsyncIterator[str]:
+        """
+        Stream a chat completion as text chunks.
+        Providers without native streaming yield the full response once.
+        """
+        response = await self.chat_completion(request, api_key=api_key)
+        yield response.response
+
+    async def warm_up(self, api_key: Optional[str] = None):
+        """
+        Pay up front what the first request would: the tokenizer, and with a
+        key the pooled client and its connection (through a health probe,
+        whose result is cached).
+        """
+        self.count_tokens("warm up")
+        if api_key:
+            result = await health_registry.probe(self, api_key)
+            if not result["status"]:
+                raise Exception(result["error"])
+
+    def close(self):
+        """Release the provider's worker threads"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.client_pool is not None:
+            self.client_pool.clear()
+
     def update_metrics(
-        self, latency_ms: float, success: bool, error: Optional[str] = None
+        self,
+        latency_ms: float,
+        success: bool,
+        error: Optional[str] = None,
+        api_key: Optional[str] = None,
+        ttft_ms: Optional[float] = None,
+        model: Optional[str] = None,
+        tokens: int = 0,
+        cost: float = 0.0,
     ):
         """update provider performance metrix"""
         self.total_requests += 1
         self.total_latency += latency_ms
+        self.total_tokens += tokens
+        self.total_cost += cost
+        self.latency_histogram.observe(latency_ms / 1000)
+        self.window.record(latency_ms, success, tokens)
+        if model:
+            model_window = self.model_windows.get(model)
+            if model_window is None:
+                model_window = self.model_windows[model] = WindowedStats()
+            model_window.record(latency_ms, success, tokens)
+        if ttft_ms is not None:
+            self.streamed_requests += 1
+            self.total_ttft += ttft_ms
         if success:
             self.successful_requests += 1
             self.last_error = None
@@ -46,18 +252,73 @@ class BaseProvider(ABC):
             self.failed_requests += 1
             self.last_error = error
 
-        print("self.total_requests========", self.total_requests)
+        if api_key:
+            health_registry.record_result(self.name, api_key, success, error)
+        usage_pipeline.record(self.name, model, api_key, success, latency_ms, tokens, cost)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Latency (ms) at `percentile` (0-100) over the metrics window, None if no data"""
+        return self.window.percentile(percentile)
+
+    def recent_success_rate(self) -> float:
+        """Success rate over the metrics window, 1.0 if no data"""
+        return self.window.success_rate()
+
+    def export_state(self) -> Dict[str, Any]:
+        """Counters and window totals, JSON-serializable and mergeable with `merged_status`"""
+        return {
+            "healthy": self.is_healthy,
+            "last_check": self.last_check.timestamp(),
+            "total_requests": self.total_requests,
+            "successful_requests": self.successful_requests,
+            "total_latency": self.total_latency,
+            "streamed_requests": self.streamed_requests,
+            "total_ttft": self.total_ttft,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "peak_queue_depth": self.peak_queue_depth,
+            "max_concurrency": self.max_concurrency,
+            "client_pool": self.client_pool.stats() if self.client_pool else None,
+            "window": self.window.export(),
+            "models": {model: window.export() for model, window in self.model_windows.items()},
+        }
 
     def get_status(self) -> ProviderStatus:
         """Get current provider status and metrics"""
+        return merged_status(self.name, [self.export_state()])
 
-        avg_latency = self.total_latency / max(self.total_requests, 1)
-        success_rate = self.successful_requests / max(self.total_requests, 1)
-        return ProviderStatus(
-            name=self.name,
-            healthy=self.is_healthy,
-            last_check=self.last_check,
-            average_latency=avg_latency,
-            success_rate=success_rate,
-            total_requests=self.total_requests,
-        )
+
+def merged_status(name: str, states: List[Dict[str, Any]]) -> ProviderStatus:
+    """
+    One provider's status over several `export_state()`s (one per worker):
+    counters add up, health comes from the most recent check.
+    """
+    total_requests = sum(s["total_requests"] for s in states)
+    streamed_requests = sum(s["streamed_requests"] for s in states)
+    latest = max(states, key=lambda s: s["last_check"])
+    pools = [s["client_pool"] for s in states if s["client_pool"]]
+    client_pool = None
+    if pools:
+        client_pool = {key: sum(pool.get(key, 0) for pool in pools) for key in pools[0]}
+    models: Dict[str, List[Dict[str, Any]]] = {}
+    for state in states:
+        for model, window in state["models"].items():
+            models.setdefault(model, []).append(window)
+    return ProviderStatus(
+        name=name,
+        healthy=latest["healthy"],
+        last_check=datetime.fromtimestamp(latest["last_check"], timezone.utc),
+        average_latency=sum(s["total_latency"] for s in states) / max(total_requests, 1),
+        average_ttft=sum(s["total_ttft"] for s in states) / max(streamed_requests, 1),
+        success_rate=sum(s["successful_requests"] for s in states) / max(total_requests, 1),
+        total_requests=total_requests,
+        in_flight=sum(s["in_flight"] for s in states),
+        queue_depth=sum(s["queue_depth"] for s in states),
+        peak_queue_depth=max(s["peak_queue_depth"] for s in states),
+        max_concurrency=sum(s["max_concurrency"] for s in states),
+        client_pool=client_pool,
+        window=WindowMetrics(**merged_snapshot([s["window"] for s in states])),
+        models={
+            model: WindowMetrics(**merged_snapshot(windows)) for model, windows in models.items()
+        },
+    )
@@ -0,0 +1,132 @@
+"""Bounded LRU pool of per-API-key SDK clients"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from ..health import hash_api_key
+
+logger = logging.getLogger(__name__)
+
+CLIENT_POOL_SIZE = int(os.getenv("CLIENT_POOL_SIZE", "64"))
+
+
+class ClientPool:
+    """
+    Keeps one isolated client per API key so repeat callers skip setup and
+    reuse the client's open connections. The least recently used client is
+    evicted once `max_size` keys are held.
+
+    Clients are leased (`lease`, or `acquire` / `release`) for as long as a
+    call uses them, possibly on a worker thread; an evicted client is only
+    closed once its last lease is returned.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], Any],
+        max_size: int = CLIENT_POOL_SIZE,
+        on_evict: Optional[Callable[[Any], None]] = None,
+    ):
+        self.factory = factory
+        self.max_size = max_size
+        self.on_evict = on_evict
+        self._clients: "OrderedDict[str, Any]" = OrderedDict()
+        # id(client) -> open leases, and evicted clients waiting for theirs
+        self._leases: Dict[int, int] = {}
+        self._retired: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, api_key: str) -> Any:
+        """Lease the pooled client for `api_key`, building it on first use"""
+        key = hash_api_key(api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.hits += 1
+                self._leases[id(client)] = self._leases.get(id(client), 0) + 1
+                return client
+            self.misses += 1
+
+        client = self.factory(api_key)
+
+        evicted = []
+        with self._lock:
+            existing = self._clients.get(key)
+            if existing is not None:
+                # Another caller built the same client first, keep theirs
+                self._clients.move_to_end(key)
+                evicted.append(client)
+                client = existing
+            else:
+                self._clients[key] = client
+                while len(self._clients) > self.max_size:
+                    _, old = self._clients.popitem(last=False)
+                    self.evictions += 1
+                    if self._leases.get(id(old)):
+                        self._retired[id(old)] = old
+                    else:
+                        evicted.append(old)
+            self._leases[id(client)] = self._leases.get(id(client), 0) + 1
+
+        for old in evicted:
+            self._close(old)
+        return client
+
+    def release(self, client: Any):
+        """Return a lease; closes the client if it was evicted and this was its last one"""
+        with self._lock:
+            remaining = self._leases.get(id(client), 0) - 1
+            if remaining > 0:
+                self._leases[id(client)] = remaining
+                return
+            self._leases.pop(id(client), None)
+            retired = self._retired.pop(id(client), None)
+        if retired is not None:
+            self._close(retired)
+
+    @contextmanager
+    def lease(self, api_key: str) -> Iterator[Any]:
+        client = self.acquire(api_key)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    def _close(self, client: Any):
+        if self.on_evict is None:
+            return
+        try:
+            self.on_evict(client)
+        except Exception as e:
+            logger.warning(f"failed to close pooled client: {e}")
+
+    def clear(self):
+        """Drop every pooled client, closing each once it is no longer leased"""
+        with self._lock:
+            clients = []
+            for client in self._clients.values():
+                if self._leases.get(id(client)):
+                    self._retired[id(client)] = client
+                else:
+                    clients.append(client)
+            self._clients.clear()
+        for client in clients:
+            self._close(client)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._clients),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "retired": len(self._retired),
+        }
@@ -0,0 +1,80 @@
+"""Errors raised by providers"""
+
+from typing import Optional
+
+
+class ProviderError(Exception):
+    """
+    A failed provider call.
+    `retryable` tells the resilience layer whether trying again can help
+    (timeouts, overload, 5xx) as opposed to errors that will repeat
+    (bad request, invalid key, safety block).
+    """
+
+    status_code = 500
+
+    def __init__(
+        self,
+        message: str,
+        provider: Optional[str] = None,
+        retryable: bool = False,
+        status_code: Optional[int] = None,
+    ):
+        super().__init__(message)
+        self.provider = provider
+        self.retryable = retryable
+        if status_code is not None:
+            self.status_code = status_code
+
+
+class ProviderTimeoutError(ProviderError):
+    """The call did not finish before the request deadline"""
+
+    status_code = 504
+
+    def __init__(self, message: str, provider: Optional[str] = None):
+        super().__init__(message, provider=provider, retryable=True)
+
+
+class CircuitOpenError(ProviderError):
+    """The provider's circuit breaker is open, the call was not attempted"""
+
+    status_code = 503
+
+    def __init__(self, provider: str):
+        super().__init__(
+            f"{provider} is temporarily unavailable (circuit open)",
+            provider=provider,
+            retryable=False,
+        )
+
+
+class RateLimitedError(ProviderError):
+    """The local quota for the provider and API key would not free up in time"""
+
+    status_code = 429
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(
+            f"rate limit for {provider} exceeded, retry in {retry_after:.1f}s",
+            provider=provider,
+            retryable=False,
+        )
+        self.retry_after = retry_after
+
+
+class ContextLengthError(ProviderError):
+    """The conversation plus max_tokens does not fit the model's context window"""
+
+    status_code = 400
+
+    def __init__(self, provider: Optional[str], tokens: int, context_window: int):
+        super().__init__(
+            f"request needs {tokens} tokens but the context window is {context_window}",
+            provider=provider,
+            retryable=False,
+        )
+
+
+def is_retryable(error: BaseException) -> bool:
+    return isinstance(error, ProviderError) and error.retryable
@@ -1,15 +1,58 @@
+import asyncio
+import functools
 import logging
+from contextlib import contextmanager
 from .base import BaseProvider
-import os
 import google.generativeai as genai
-from ..models import ChatRequest, ChatResponse, ChatMessage
+import google.ai.generativelanguage as glm
+from .client_pool import ClientPool
+from .errors import ProviderError
+from google.api_core import exceptions as google_exceptions
+from ..models import ChatRequest, ChatResponse, ChatMessage, MessageRole
 import time
-from typing import List, Dict, Union
+from typing import AsyncIterator, Iterator, List, Dict, Tuple, Union
 from datetime import datetime, timezone, timedelta
 from fastapi import HTTPException
 
 logger = logging.getLogger(__name__)
 
+# SDK errors where trying again can succeed
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.Aborted,
+)
+
+# Gemini calls the assistant role "model"
+ROLE_MAP = {
+    MessageRole.USER: "user",
+    MessageRole.ASSISTANT: "model",
+    MessageRole.SYSTEM: "system",
+}
+
+SAFETY_SETTINGS = {
+    genai.types.HarmCategory.HARM_CATEGORY_HARASSMENT: genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+    genai.types.HarmCategory.HARM_CATEGORY_HATE_SPEECH: genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+    genai.types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+    genai.types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+}
+
+
+@functools.lru_cache(maxsize=256)
+def generation_config(temperature: float, max_tokens: int) -> genai.types.GenerationConfig:
+    """Shared config per (temperature, max_tokens); the SDK copies it on every call"""
+    return genai.types.GenerationConfig(
+        temperature=temperature,
+        max_output_tokens=max_tokens,
+        candidate_count=1,
+        top_p=0.8,
+        top_k=10,
+    )
+
 
 class GeminiProvider(BaseProvider):
     """Google gemeni LLM provider"""
@@ -18,20 +61,60 @@ class GeminiProvider(BaseProvider):
         """initialize the gemini provider"""
         super().__init__("gemini")
 
+        # gemini-2.0-flash input limit
+        self.context_window = 1_048_576
+        # Free tier quota, override with GEMINI_RPM / GEMINI_TPM
+        self.requests_per_minute = 60
+
         self.model_name = "gemini-2.0-flash"
-        self.model = None  # Will be initialized dynamically
+        self.client_pool = ClientPool(self._build_client, on_evict=self._close_client)
 
-    def _initialize_model(self, api_key: str):
-        if not api_key:
-            raise ValueError("API KEY variable is required")
+    @staticmethod
+    def _build_client(api_key: str) -> glm.GenerativeServiceClient:
+        """
+        A client of its own per key instead of the process-global one set
+        by `genai.configure`, so concurrent tenants never share a key.
+        """
+        return glm.GenerativeServiceClient(client_options={"api_key": api_key})
 
+    @staticmethod
+    def _close_client(client: glm.GenerativeServiceClient):
+        client.transport.close()
+
+    @contextmanager
+    def _model(self, api_key: str, model_name: str) -> Iterator[genai.GenerativeModel]:
+        """
+        `model_name` on the key's pooled client, leased until the block exits;
+        all models of a key share its connection. Used on the worker thread
+        that makes the call, so an evicted client is not closed under it.
+        """
         try:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel(f"models/{self.model_name}")
+            client = self.client_pool.acquire(api_key)
         except Exception as e:
-            print(f"Failed to initialize Gemini provider: {e}")
+            logger.error(f"Failed to initialize Gemini provider: {e}")
             self.is_healthy = False
             raise HTTPException(status_code=401, detail="Invalid Gemini API key")
+        try:
+            model = genai.GenerativeModel(f"models/{model_name}")
+            model._client = client
+            yield model
+        finally:
+            self.client_pool.release(client)
+
+    @staticmethod
+    def _check_key(api_key: str):
+        if not api_key:
+            raise ValueError("API KEY variable is required")
+
+    def _generate(self, api_key: str, model_name: str, prompt, **kwargs):
+        """Blocking: one generate_content call"""
+        with self._model(api_key, model_name) as model:
+            return model.generate_content(prompt, **kwargs)
+
+    def _count_tokens(self, api_key: str, text: str):
+        """Blocking: count tokens with the default model"""
+        with self._model(api_key, self.model_name) as model:
+            return model.count_tokens(text)
 
     # def _format_message(self, messages: List[ChatMessage]) -> str:
     #     """Converts Chat messages to GEMINI compatible prompt"""
@@ -46,18 +129,42 @@ class GeminiProvider(BaseProvider):
     #     return "\n".join(formatted_message)
     
     def _format_message(self, messages: List[ChatMessage]):
-        role_map = {"user": "user", "assistant": "model", "system": "system"}
         return [
-            {"role": role_map[m.role], "parts": [{"text": m.content}]}
+            {"role": ROLE_MAP[m.role], "parts": [{"text": m.content}]}
             for m in messages
         ]
 
+    def _request_config(self, request: ChatRequest):
+        """Generation config and safety settings for a chat request"""
+        return generation_config(request.temperature, request.max_tokens), SAFETY_SETTINGS
+
+    def _usage(self, request: ChatRequest, response, text: str) -> Tuple[int, int]:
+        """
+        (prompt, completion) tokens: the API's usage metadata when the SDK
+        exposes it, else the candidate's token count, else the local counter.
+        """
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and usage.total_token_count:
+            return usage.prompt_token_count, usage.candidates_token_count
+        prompt_tokens = self.count_prompt_tokens(request.message)
+        candidates = getattr(response, "candidates", None)
+        if candidates and candidates[0].token_count:
+            return prompt_tokens, candidates[0].token_count
+        return prompt_tokens, self.count_tokens(text)
 
-    def _estimate_token(self, prompt: str, response: str) -> int:
-        """Estimated token count"""
-        total_chars = len(response)
-        estimated_token = int(total_chars / 4)
-        return int(estimated_token * 1.1)
+    def _provider_error(self, error: Exception) -> ProviderError:
+        """Wrap an SDK error keeping its HTTP status (e.g. 429), flag the ones worth retrying"""
+        status_code = None
+        if isinstance(error, google_exceptions.GoogleAPICallError):
+            status_code = error.code
+        elif isinstance(error, HTTPException):
+            status_code = error.status_code
+        return ProviderError(
+            f"GEMINI API Error: {str(error)}",
+            provider=self.name,
+            retryable=isinstance(error, RETRYABLE_ERRORS),
+            status_code=status_code,
+        )
 
     def estimated_cost(self, tokens: int, model: str) -> float:
         """Estimated cost for GEMINI api usage"""
@@ -65,37 +172,23 @@ class GeminiProvider(BaseProvider):
 
     async def chat_completion(self, request: ChatRequest, api_key: str) -> ChatResponse:
         """Generate Chat completion using GEMINI"""
-        self._initialize_model(api_key)
+        self._check_key(api_key)
+        model_name = request.model or self.model_name
         start_time = time.time()
         try:
-            prompt = self._format_message(request.message)
-            generation_config = genai.types.GenerationConfig(
-                temperature=request.temperature,
-                max_output_tokens=request.max_tokens,
-                candidate_count=1,
-                top_p=0.8,
-                top_k=10,
-            )
-            safety_settings = {
-                genai.types.HarmCategory.HARM_CATEGORY_HARASSMENT: genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                genai.types.HarmCategory.HARM_CATEGORY_HATE_SPEECH: genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                genai.types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                genai.types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-            }
+            prompt = self.format_prompt(request, self._format_message)
+            generation_config, safety_settings = self._request_config(request)
 
-            print("Sending request to gemini")
+            logger.debug("Sending request to gemini")
 
-            response = ""
-            try:
-                response = self.model.generate_content(
-                    prompt,
-                    generation_config=generation_config,
-                    safety_settings=safety_settings,
-                )
-            except Exception as e:
-                raise HTTPException(
-                    status=400, detail=f"error while getting response: {e}"
-                )
+            response = await self.run_blocking(
+                self._generate,
+                api_key,
+                model_name,
+                prompt,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+            )
             latency_ms: float = (time.time() - start_time) * 1000
 
             if not response.text:
@@ -108,14 +201,24 @@ class GeminiProvider(BaseProvider):
                         f"No response generated: {response.candidates[0].finish_reason.name}"
                     )
 
-            token_used = self._estimate_token(prompt, response.text)
-            cost = self.estimated_cost(token_used, "gemini-pro")
-            self.update_metrics(latency_ms, True)
+            prompt_tokens, completion_tokens = self._usage(request, response, response.text)
+            token_used = prompt_tokens + completion_tokens
+            cost = self.estimated_cost(token_used, model_name)
+            self.update_metrics(
+                latency_ms,
+                True,
+                api_key=api_key,
+                model=model_name,
+                tokens=token_used,
+                cost=cost,
+            )
             return ChatResponse(
                 provider="gemini",
-                model=self.model_name,
+                model=model_name,
                 response=response.text.strip(),
                 token_used=token_used,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
                 cost=cost,
                 latency_ms=str(timedelta(seconds=int(latency_ms))),
                 timestamp=datetime.now(timezone.utc),
@@ -123,27 +226,90 @@ class GeminiProvider(BaseProvider):
 
         except Exception as e:
             latency_ms: float = (time.time() - start_time) * 1000
-            self.update_metrics(latency_ms, False, str(e))
-            raise Exception(f"GEMINI API Error: {str(e)}")
+            self.update_metrics(
+                latency_ms, False, str(e), api_key=api_key, model=model_name
+            )
+            raise self._provider_error(e) from e
+
+    def _stream_chunks(
+        self, api_key: str, model_name: str, prompt, generation_config, safety_settings
+    ) -> Iterator[str]:
+        """Blocking generator over Gemini's streamed text chunks, leasing the client until closed"""
+        with self._model(api_key, model_name) as model:
+            response = model.generate_content(
+                prompt,
+                generation_config=generation_config,
+                safety_settings=safety_settings,
+                stream=True,
+            )
+            try:
+                for chunk in response:
+                    candidate = chunk.candidates[0] if chunk.candidates else None
+                    if candidate is not None and candidate.content.parts:
+                        yield chunk.text
+                    elif candidate is not None and candidate.finish_reason.name == "SAFETY":
+                        raise Exception("Content blocked by safety filters")
+            finally:
+                # Cancel the underlying gRPC stream if the consumer stopped early
+                cancel = getattr(response._iterator, "cancel", None)
+                if cancel is not None and not response._done:
+                    cancel()
+
+    async def stream_chat_completion(
+        self, request: ChatRequest, api_key: str
+    ) -> AsyncIterator[str]:
+        """Stream a chat completion from GEMINI chunk by chunk"""
+        self._check_key(api_key)
+        model_name = request.model or self.model_name
+        start_time = time.time()
+        ttft_ms = None
+        chunks: List[str] = []
+        try:
+            prompt = self.format_prompt(request, self._format_message)
+            generation_config, safety_settings = self._request_config(request)
+            async for text in self.iterate_blocking(
+                self._stream_chunks, api_key, model_name, prompt, generation_config, safety_settings
+            ):
+                if ttft_ms is None:
+                    ttft_ms = (time.time() - start_time) * 1000
+                chunks.append(text)
+                yield text
+        except (GeneratorExit, asyncio.CancelledError):
+            # Client went away; not a provider failure
+            raise
+        except Exception as e:
+            latency_ms: float = (time.time() - start_time) * 1000
+            self.update_metrics(
+                latency_ms, False, str(e), api_key=api_key, model=model_name
+            )
+            raise self._provider_error(e) from e
+
+        latency_ms: float = (time.time() - start_time) * 1000
+        token_used = self.count_prompt_tokens(request.message) + self.count_tokens(
+            "".join(chunks)
+        )
+        self.update_metrics(
+            latency_ms,
+            True,
+            api_key=api_key,
+            ttft_ms=ttft_ms,
+            model=model_name,
+            tokens=token_used,
+            cost=self.estimated_cost(token_used, model_name),
+        )
 
     async def health_check(self, api_key: str) -> Dict[str, Union[bool, str]]:
         """
-        Check if GEMINI API is accessible and responding.
+        Check if GEMINI API is accessible and accepts the key.
+        Counts the tokens of a short text instead of generating one:
+        same auth and routing path, no generation cost.
         Returns a dict with status and optional error message.
         """
-        self._initialize_model(api_key)
+        self._check_key(api_key)
 
         try:
-            test_config = genai.types.GenerationConfig(
-                max_output_tokens=10,
-                temperature=0
-            )
-            response = self.model.generate_content(
-                "hello",
-                generation_config=test_config
-            )
-            content = response.candidates[0].content.parts[0]
-            is_healthy = bool(content.text and len(content.text.strip()) > 0)
+            response = await self.run_blocking(self._count_tokens, api_key, "hello")
+            is_healthy = response.total_tokens > 0
             self.is_healthy = is_healthy
             self.last_check = datetime.now(timezone.utc)
 
@@ -151,7 +317,7 @@ class GeminiProvider(BaseProvider):
 
         except Exception as e:
             error_message = str(e).split("\n")[0]  # Simplify verbose tracebacks
-            print("❌ Gemini Health Check Failed:", error_message)
+            logger.warning(f"Gemini Health Check Failed: {error_message}")
             self.is_healthy = False
             self.last_check = datetime.now(timezone.utc)
-            return {"status": False, "error": error_message}
\ No newline at end of file
+            return {"status": False, "error": error_message}
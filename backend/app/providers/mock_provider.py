@@ -0,0 +1,187 @@
+"""In-process mock provider for load tests and local development"""
+
+import asyncio
+import math
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Union
+
+from ..models import ChatRequest, ChatResponse
+from .base import BaseProvider
+from .errors import ProviderError
+
+# "constant", "uniform", "normal", "lognormal" or "exponential"
+MOCK_LATENCY_DISTRIBUTION = os.getenv("MOCK_LATENCY_DISTRIBUTION", "lognormal")
+# Mean latency to the first token
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "200"))
+# Half-width for uniform, standard deviation for normal and lognormal
+MOCK_LATENCY_SPREAD_MS = float(os.getenv("MOCK_LATENCY_SPREAD_MS", "50"))
+# Share of calls that get MOCK_TAIL_MS extra latency
+MOCK_TAIL_RATE = float(os.getenv("MOCK_TAIL_RATE", "0"))
+MOCK_TAIL_MS = float(os.getenv("MOCK_TAIL_MS", "2000"))
+# Share of calls failing with a retryable 503 / a non-retryable 400
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+MOCK_FATAL_ERROR_RATE = float(os.getenv("MOCK_FATAL_ERROR_RATE", "0"))
+# Words per reply, 0 echoes the last message
+MOCK_RESPONSE_WORDS = int(os.getenv("MOCK_RESPONSE_WORDS", "0"))
+# Delay between streamed words
+MOCK_INTER_TOKEN_MS = float(os.getenv("MOCK_INTER_TOKEN_MS", "10"))
+
+_WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua"
+).split()
+
+
+def sample_latency_ms(distribution: str, mean_ms: float, spread_ms: float) -> float:
+    """One latency draw in milliseconds, never negative"""
+    if distribution == "uniform":
+        return random.uniform(max(mean_ms - spread_ms, 0.0), mean_ms + spread_ms)
+    if distribution == "normal":
+        return max(random.gauss(mean_ms, spread_ms), 0.0)
+    if distribution == "lognormal" and mean_ms > 0:
+        # mu and sigma that give this mean and standard deviation
+        sigma = math.sqrt(math.log(1 + (spread_ms / mean_ms) ** 2))
+        return random.lognormvariate(math.log(mean_ms) - sigma**2 / 2, sigma)
+    if distribution == "exponential" and mean_ms > 0:
+        return random.expovariate(1 / mean_ms)
+    return mean_ms
+
+
+class MockProvider(BaseProvider):
+    """
+    Provider that answers without any network call, with configurable
+    latency distribution, tail latency, error rates and streaming pace.
+    Waits are `asyncio.sleep`s, so thousands of concurrent calls cost no
+    threads; `max_concurrency` still bounds how many run at once.
+    """
+
+    def __init__(
+        self,
+        name: str = "mock",
+        distribution: str = MOCK_LATENCY_DISTRIBUTION,
+        latency_ms: float = MOCK_LATENCY_MS,
+        spread_ms: float = MOCK_LATENCY_SPREAD_MS,
+        tail_rate: float = MOCK_TAIL_RATE,
+        tail_ms: float = MOCK_TAIL_MS,
+        error_rate: float = MOCK_ERROR_RATE,
+        fatal_error_rate: float = MOCK_FATAL_ERROR_RATE,
+        response_words: int = MOCK_RESPONSE_WORDS,
+        inter_token_ms: float = MOCK_INTER_TOKEN_MS,
+        max_concurrency: Optional[int] = None,
+    ):
+        super().__init__(name, max_concurrency=max_concurrency)
+        self.model_name = f"{name}-model"
+        self.distribution = distribution
+        self.latency_ms = latency_ms
+        self.spread_ms = spread_ms
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.error_rate = error_rate
+        self.fatal_error_rate = fatal_error_rate
+        self.response_words = response_words
+        self.inter_token_ms = inter_token_ms
+
+    def _delay(self) -> float:
+        delay_ms = sample_latency_ms(self.distribution, self.latency_ms, self.spread_ms)
+        if random.random() < self.tail_rate:
+            delay_ms += self.tail_ms
+        return delay_ms / 1000
+
+    def _maybe_fail(self):
+        roll = random.random()
+        if roll < self.error_rate:
+            raise ProviderError(
+                "mock provider overloaded", provider=self.name, retryable=True, status_code=503
+            )
+        if roll < self.error_rate + self.fatal_error_rate:
+            raise ProviderError(
+                "mock provider rejected the request", provider=self.name, status_code=400
+            )
+
+    def _words(self, request: ChatRequest) -> List[str]:
+        if self.response_words <= 0:
+            return f"echo: {request.message[-1].content}".split(" ")
+        count = min(self.response_words, request.max_tokens)
+        return [_WORDS[i % len(_WORDS)] for i in range(count)]
+
+    def estimated_cost(self, tokens: int, model: str) -> float:
+        return 0.0
+
+    def _record(
+        self,
+        request: ChatRequest,
+        text: str,
+        start_time: float,
+        api_key: str,
+        ttft_ms: Optional[float] = None,
+    ) -> ChatResponse:
+        latency_ms = (time.time() - start_time) * 1000
+        model = request.model or self.model_name
+        prompt_tokens = self.count_prompt_tokens(request.message)
+        completion_tokens = self.count_tokens(text)
+        tokens = prompt_tokens + completion_tokens
+        self.update_metrics(
+            latency_ms, True, api_key=api_key, ttft_ms=ttft_ms, model=model, tokens=tokens
+        )
+        return ChatResponse(
+            provider=self.name,
+            model=model,
+            response=text,
+            token_used=tokens,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost=0.0,
+            latency_ms=f"{latency_ms:.1f}",
+            timestamp=datetime.now(timezone.utc),
+        )
+
+    async def chat_completion(self, request: ChatRequest, api_key: str) -> ChatResponse:
+        start_time = time.time()
+        words = self._words(request)
+        await self._acquire_slot()
+        try:
+            # A full reply takes the time to the first token plus generating the rest
+            await asyncio.sleep(self._delay() + (len(words) - 1) * self.inter_token_ms / 1000)
+            self._maybe_fail()
+        except ProviderError as e:
+            self.update_metrics(
+                (time.time() - start_time) * 1000, False, str(e), api_key=api_key,
+                model=request.model or self.model_name,
+            )
+            raise
+        finally:
+            self._release_slot()
+        return self._record(request, " ".join(words), start_time, api_key)
+
+    async def stream_chat_completion(
+        self, request: ChatRequest, api_key: str
+    ) -> AsyncIterator[str]:
+        start_time = time.time()
+        ttft_ms = None
+        words = self._words(request)
+        await self._acquire_slot()
+        try:
+            await asyncio.sleep(self._delay())
+            self._maybe_fail()
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(self.inter_token_ms / 1000)
+                if ttft_ms is None:
+                    ttft_ms = (time.time() - start_time) * 1000
+                yield word if i == 0 else " " + word
+        except ProviderError as e:
+            self.update_metrics(
+                (time.time() - start_time) * 1000, False, str(e), api_key=api_key,
+                model=request.model or self.model_name,
+            )
+            raise
+        finally:
+            self._release_slot()
+        self._record(request, " ".join(words), start_time, api_key, ttft_ms=ttft_ms)
+
+    async def health_check(self, api_key: str) -> Dict[str, Union[bool, str]]:
+        self.last_check = datetime.now(timezone.utc)
+        return {"status": True, "error": None}
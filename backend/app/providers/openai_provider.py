@@ -0,0 +1,228 @@
+"""OpenAI-compatible chat completions over HTTP (OpenAI, vLLM, llama.cpp, Ollama, ...)"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from ..models import ChatMessage, ChatRequest, ChatResponse
+from .base import BaseProvider
+from .errors import ProviderError
+
+logger = logging.getLogger(__name__)
+
+# e.g. http://localhost:8000/v1 for a local inference server
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_CONTEXT_WINDOW = int(os.getenv("OPENAI_CONTEXT_WINDOW", "128000"))
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "60"))
+# USD per 1K prompt / completion tokens, 0 for local models
+OPENAI_PROMPT_COST_PER_1K = float(os.getenv("OPENAI_PROMPT_COST_PER_1K", "0"))
+OPENAI_COMPLETION_COST_PER_1K = float(os.getenv("OPENAI_COMPLETION_COST_PER_1K", "0"))
+
+# Upstream statuses where trying again can succeed
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class OpenAICompatibleProvider(BaseProvider):
+    """
+    Any server speaking the OpenAI `/chat/completions` API. Calls are
+    native async HTTP on one pooled client, so they use no worker threads;
+    `max_concurrency` bounds the requests in flight.
+    """
+
+    def __init__(self, name: str = "openai", base_url: str = OPENAI_BASE_URL):
+        super().__init__(name)
+        self.base_url = base_url.rstrip("/")
+        self.model_name = OPENAI_MODEL
+        self.context_window = OPENAI_CONTEXT_WINDOW
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=OPENAI_TIMEOUT_S,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+
+    def _format_message(self, messages: List[ChatMessage]) -> List[Dict[str, str]]:
+        return [{"role": m.role.value, "content": m.content} for m in messages]
+
+    def _payload(self, request: ChatRequest, stream: bool) -> Dict[str, Any]:
+        return {
+            "model": request.model or self.model_name,
+            "messages": self.format_prompt(request, self._format_message),
+            "temperature": request.temperature,
+            "max_tokens": request.max_tokens,
+            "stream": stream,
+        }
+
+    @staticmethod
+    def _headers(api_key: str) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {api_key}"}
+
+    def _provider_error(self, error: Exception) -> ProviderError:
+        """Wrap an HTTP error keeping its status, flag the ones worth retrying"""
+        if isinstance(error, httpx.HTTPStatusError):
+            status_code = error.response.status_code
+            return ProviderError(
+                f"{self.name.upper()} API Error {status_code}: {error.response.text[:200]}",
+                provider=self.name,
+                retryable=status_code in RETRYABLE_STATUS_CODES,
+                status_code=status_code,
+            )
+        return ProviderError(
+            f"{self.name.upper()} API Error: {error!r}",
+            provider=self.name,
+            retryable=isinstance(error, httpx.TransportError),
+            status_code=502 if isinstance(error, httpx.TransportError) else None,
+        )
+
+    def _usage(self, request: ChatRequest, body: Dict[str, Any], text: str) -> Tuple[int, int]:
+        """(prompt, completion) tokens from the response's usage, else the local counter"""
+        usage = body.get("usage") or {}
+        if usage.get("prompt_tokens") is not None and usage.get("completion_tokens") is not None:
+            return usage["prompt_tokens"], usage["completion_tokens"]
+        return self.count_prompt_tokens(request.message), self.count_tokens(text)
+
+    def estimated_cost(self, tokens: int, model: str) -> float:
+        """Estimated cost, priced at the completion rate when the split is unknown"""
+        return tokens / 1000 * OPENAI_COMPLETION_COST_PER_1K
+
+    def _cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (
+            prompt_tokens / 1000 * OPENAI_PROMPT_COST_PER_1K
+            + completion_tokens / 1000 * OPENAI_COMPLETION_COST_PER_1K
+        )
+
+    async def chat_completion(self, request: ChatRequest, api_key: str) -> ChatResponse:
+        model = request.model or self.model_name
+        start_time = time.time()
+        await self._acquire_slot()
+        try:
+            response = await self._client.post(
+                "/chat/completions",
+                json=self._payload(request, stream=False),
+                headers=self._headers(api_key),
+            )
+            response.raise_for_status()
+            body = response.json()
+            text = body["choices"][0]["message"]["content"] or ""
+            if not text:
+                raise Exception(
+                    f"No response generated: {body['choices'][0].get('finish_reason')}"
+                )
+        except Exception as e:
+            self.update_metrics(
+                (time.time() - start_time) * 1000, False, str(e), api_key=api_key, model=model
+            )
+            raise self._provider_error(e) from e
+        finally:
+            self._release_slot()
+
+        latency_ms = (time.time() - start_time) * 1000
+        prompt_tokens, completion_tokens = self._usage(request, body, text)
+        token_used = prompt_tokens + completion_tokens
+        cost = self._cost(prompt_tokens, completion_tokens)
+        self.update_metrics(
+            latency_ms, True, api_key=api_key, model=model, tokens=token_used, cost=cost
+        )
+        return ChatResponse(
+            provider=self.name,
+            model=body.get("model") or model,
+            response=text.strip(),
+            token_used=token_used,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost=cost,
+            latency_ms=f"{latency_ms:.1f}",
+            timestamp=datetime.now(timezone.utc),
+        )
+
+    async def stream_chat_completion(
+        self, request: ChatRequest, api_key: str
+    ) -> AsyncIterator[str]:
+        """Stream the `data:` deltas of an OpenAI server-sent event stream"""
+        model = request.model or self.model_name
+        start_time = time.time()
+        ttft_ms = None
+        chunks: List[str] = []
+        await self._acquire_slot()
+        try:
+            async with self._client.stream(
+                "POST",
+                "/chat/completions",
+                json=self._payload(request, stream=True),
+                headers=self._headers(api_key),
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or []
+                    text = (choices[0].get("delta") or {}).get("content") if choices else None
+                    if text:
+                        if ttft_ms is None:
+                            ttft_ms = (time.time() - start_time) * 1000
+                        chunks.append(text)
+                        yield text
+        except (GeneratorExit, asyncio.CancelledError):
+            # Client went away; leaving the `async with` closes the upstream stream
+            raise
+        except Exception as e:
+            self.update_metrics(
+                (time.time() - start_time) * 1000, False, str(e), api_key=api_key, model=model
+            )
+            raise self._provider_error(e) from e
+        finally:
+            self._release_slot()
+
+        prompt_tokens = self.count_prompt_tokens(request.message)
+        completion_tokens = self.count_tokens("".join(chunks))
+        self.update_metrics(
+            (time.time() - start_time) * 1000,
+            True,
+            api_key=api_key,
+            ttft_ms=ttft_ms,
+            model=model,
+            tokens=prompt_tokens + completion_tokens,
+            cost=self._cost(prompt_tokens, completion_tokens),
+        )
+
+    async def health_check(self, api_key: str) -> Dict[str, Union[bool, str]]:
+        """The server is up and accepts the key if it lists its models"""
+        try:
+            response = await self._client.get("/models", headers=self._headers(api_key))
+            response.raise_for_status()
+            self.is_healthy = True
+            error: Optional[str] = None
+        except Exception as e:
+            error = str(self._provider_error(e)).split("\n")[0]
+            logger.warning(f"{self.name} Health Check Failed: {error}")
+            self.is_healthy = False
+        self.last_check = datetime.now(timezone.utc)
+        return {"status": self.is_healthy, "error": error}
+
+    async def warm_up(self, api_key: Optional[str] = None):
+        if not api_key:
+            # Any answer, even a 401, leaves a connection open in the pool
+            await self._client.get("/models")
+        await super().warm_up(api_key)
+
+    def close(self):
+        super().close()
+        try:
+            asyncio.get_running_loop().create_task(self._client.aclose())
+        except RuntimeError:
+            # No running loop; the client's connections go with the process
+            pass
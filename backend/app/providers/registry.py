@@ -0,0 +1,69 @@
+"""
+Provider discovery. Built-in providers and those installed as
+`llm_platform.providers` entry points are listed by name only; a
+provider's module (and its SDK) is imported the first time it is built.
+"""
+
+import functools
+import importlib
+import logging
+import os
+import re
+from importlib.metadata import entry_points
+from typing import Dict, List, Type
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "llm_platform.providers"
+# Providers to initialize, comma separated, "all" for every registered one
+PROVIDERS = os.getenv("PROVIDERS", "gemini")
+
+# name -> "module:class", relative to this package
+BUILTIN_PROVIDERS: Dict[str, str] = {
+    "gemini": ".gemini_provider:GeminiProvider",
+    "openai": ".openai_provider:OpenAICompatibleProvider",
+    "mock": ".mock_provider:MockProvider",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def registered_providers() -> Dict[str, str]:
+    """Every provider that can be built, name -> import path; plugins may override built-ins"""
+    registry = dict(BUILTIN_PROVIDERS)
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        registry[entry_point.name] = entry_point.value
+    return registry
+
+
+def list_providers() -> List[str]:
+    """Names of the providers enabled with PROVIDERS, without importing them"""
+    registry = registered_providers()
+    if PROVIDERS.strip() == "all":
+        return list(registry)
+    names = []
+    for name in (n.strip() for n in PROVIDERS.split(",")):
+        if not name:
+            continue
+        if name not in registry:
+            logger.warning(f"provider {name} is not registered, skipping it")
+            continue
+        names.append(name)
+    return names
+
+
+def enum_member_name(provider_name: str) -> str:
+    return re.sub(r"\W", "_", provider_name).upper()
+
+
+@functools.lru_cache(maxsize=None)
+def load_provider_class(provider_name: str) -> Type:
+    """Import a provider's module and return its class"""
+    registry = registered_providers()
+    if provider_name not in registry:
+        supported_providers = ", ".join(registry)
+        raise ValueError(
+            f"Provider {provider_name} not supported. Available providers are: {supported_providers}"
+        )
+    module_name, _, attribute = registry[provider_name].partition(":")
+    module = importlib.import_module(module_name, package=__package__)
+    return getattr(module, attribute)
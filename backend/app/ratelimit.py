@@ -0,0 +1,357 @@
+"""Token-bucket quotas per (provider, API key) with fair waiting"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .health import hash_api_key
+from .providers.base import BaseProvider
+from .providers.errors import RateLimitedError
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# How long a request may queue for quota before it is rejected with 429
+RATE_LIMIT_MAX_WAIT_MS = float(os.getenv("RATE_LIMIT_MAX_WAIT_MS", "5000"))
+# "memory" (per process) or "sqlite" (shared by every worker using the same file)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", os.path.join("data", "ratelimit.db"))
+
+
+@dataclass(frozen=True)
+class Limits:
+    """Per-minute quota, None means unlimited"""
+
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+
+    @property
+    def unlimited(self) -> bool:
+        return not self.requests_per_minute and not self.tokens_per_minute
+
+
+def _env_limit(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return float(value) or None
+
+
+def limits_for(provider: BaseProvider) -> Limits:
+    """Provider defaults, overridden by e.g. GEMINI_RPM / GEMINI_TPM (0 = unlimited)"""
+    prefix = provider.name.upper()
+    return Limits(
+        requests_per_minute=_env_limit(f"{prefix}_RPM", provider.requests_per_minute),
+        tokens_per_minute=_env_limit(f"{prefix}_TPM", provider.tokens_per_minute),
+    )
+
+
+@dataclass
+class BucketState:
+    """Levels of the request and token buckets at `updated_at`"""
+
+    requests: float
+    tokens: float
+    updated_at: float
+
+
+def _refill(state: Optional[BucketState], limits: Limits, now: float) -> BucketState:
+    rpm = limits.requests_per_minute or 0.0
+    tpm = limits.tokens_per_minute or 0.0
+    if state is None:
+        return BucketState(rpm, tpm, now)
+    elapsed = max(now - state.updated_at, 0.0)
+    return BucketState(
+        min(rpm, state.requests + rpm / 60 * elapsed),
+        min(tpm, state.tokens + tpm / 60 * elapsed),
+        now,
+    )
+
+
+def take(
+    state: Optional[BucketState], limits: Limits, tokens: int, now: float
+) -> Tuple[BucketState, float]:
+    """
+    Refill both buckets, then take one request and `tokens` if both allow it.
+    Returns the new state and 0, or the unchanged levels and the seconds
+    until both buckets will hold enough.
+    """
+    state = _refill(state, limits, now)
+    wait = 0.0
+    if limits.requests_per_minute and state.requests < 1:
+        wait = (1 - state.requests) / (limits.requests_per_minute / 60)
+    if limits.tokens_per_minute:
+        # A request larger than the whole bucket waits for a full bucket
+        needed = min(tokens, limits.tokens_per_minute)
+        if state.tokens < needed:
+            wait = max(wait, (needed - state.tokens) / (limits.tokens_per_minute / 60))
+    if wait == 0.0:
+        if limits.requests_per_minute:
+            state.requests -= 1
+        if limits.tokens_per_minute:
+            state.tokens -= min(tokens, limits.tokens_per_minute)
+    return state, wait
+
+
+def give_back(
+    state: Optional[BucketState], limits: Limits, requests: int, tokens: int, now: float
+) -> BucketState:
+    """Return unused quota to the buckets"""
+    state = _refill(state, limits, now)
+    if limits.requests_per_minute:
+        state.requests = min(limits.requests_per_minute, state.requests + requests)
+    if limits.tokens_per_minute:
+        state.tokens = min(limits.tokens_per_minute, state.tokens + tokens)
+    return state
+
+
+Update = Callable[[Optional[BucketState]], Tuple[Optional[BucketState], float]]
+
+
+class RateLimitBackend(ABC):
+    """Where bucket state lives; `update` must be atomic per key"""
+
+    # Calls do blocking I/O and are run off the event loop
+    blocking = False
+
+    @abstractmethod
+    def update(self, key: str, update: Update) -> float:
+        """Apply `update` to the key's state, store the state it returns, return its result"""
+        pass
+
+    @abstractmethod
+    def read(self, key: str) -> Optional[BucketState]:
+        """The key's stored state, without locking or writing"""
+        pass
+
+    def acquire(self, key: str, limits: Limits, tokens: int) -> float:
+        return self.update(key, lambda state: take(state, limits, tokens, time.time()))
+
+    def peek(self, key: str, limits: Limits, tokens: int) -> float:
+        return take(self.read(key), limits, tokens, time.time())[1]
+
+    def refund(self, key: str, limits: Limits, requests: int, tokens: int):
+        self.update(
+            key, lambda state: (give_back(state, limits, requests, tokens, time.time()), 0.0)
+        )
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Buckets in this process only"""
+
+    def __init__(self):
+        self._states: Dict[str, BucketState] = {}
+        self._lock = threading.Lock()
+
+    def update(self, key: str, update: Update) -> float:
+        with self._lock:
+            state, result = update(self._states.get(key))
+            if state is not None:
+                self._states[key] = state
+            return result
+
+    def read(self, key: str) -> Optional[BucketState]:
+        return self._states.get(key)
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in one SQLite file so every uvicorn worker on the host draws
+    from the same quota. Each update is a single IMMEDIATE transaction,
+    reads take no lock.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            "key TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def read(self, key: str) -> Optional[BucketState]:
+        row = self._connection().execute(
+            "SELECT requests, tokens, updated_at FROM rate_limit_buckets WHERE key = ?",
+            (key,),
+        ).fetchone()
+        return BucketState(*row) if row else None
+
+    def update(self, key: str, update: Update) -> float:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT requests, tokens, updated_at FROM rate_limit_buckets WHERE key = ?",
+                (key,),
+            ).fetchone()
+            state, result = update(BucketState(*row) if row else None)
+            if state is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, requests, tokens, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, state.requests, state.tokens, state.updated_at),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+
+class RateLimiter:
+    """
+    Waits for quota instead of rejecting outright.
+
+    Requests for the same (provider, API key) queue in FIFO order behind one
+    lock, so a burst is served in arrival order and a large request cannot
+    be starved by a stream of small ones. A request whose wait would exceed
+    its budget is rejected with `RateLimitedError` (429, with Retry-After).
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        max_wait_ms: float = RATE_LIMIT_MAX_WAIT_MS,
+        enabled: bool = RATE_LIMIT_ENABLED,
+    ):
+        self.backend = backend
+        self.max_wait_ms = max_wait_ms
+        self.enabled = enabled
+        # Per key: the FIFO lock and how many requests hold or wait on it
+        self._queues: Dict[str, asyncio.Lock] = {}
+        self._members: Dict[str, int] = {}
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.spillovers = 0
+        self._waited = 0
+        self._total_wait_ms = 0.0
+
+    def _key(self, provider: BaseProvider, api_key: str) -> str:
+        return f"{provider.name}:{hash_api_key(api_key)}"
+
+    async def _backend(self, method: Callable[..., Any], *args) -> Any:
+        """Call a backend method, on a worker thread if it blocks"""
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def estimated_wait(self, provider: BaseProvider, api_key: str, tokens: int) -> float:
+        """Seconds a request would wait for quota right now, 0 if it would go straight through"""
+        limits = limits_for(provider)
+        if not self.enabled or limits.unlimited:
+            return 0.0
+        key = self._key(provider, api_key)
+        wait = await self._backend(self.backend.peek, key, limits, tokens)
+        queue = self._queues.get(key)
+        if queue is not None and queue.locked():
+            wait = max(wait, 1e-3)
+        return wait
+
+    def _join(self, key: str) -> asyncio.Lock:
+        """The key's queue, created on first use; pair with `_leave`"""
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Lock()
+        self._members[key] = self._members.get(key, 0) + 1
+        return queue
+
+    def _leave(self, key: str):
+        """Drop the key's queue once nobody holds or waits on it"""
+        self._members[key] -= 1
+        if not self._members[key]:
+            del self._members[key]
+            del self._queues[key]
+
+    async def acquire(
+        self, provider: BaseProvider, api_key: str, tokens: int, max_wait: Optional[float] = None
+    ):
+        """Take quota for one call of about `tokens` tokens, waiting up to `max_wait` seconds"""
+        limits = limits_for(provider)
+        if not self.enabled or limits.unlimited:
+            return
+        key = self._key(provider, api_key)
+        queue = self._queues.get(key)
+        if queue is None or not queue.locked():
+            if await self._backend(self.backend.acquire, key, limits, tokens) == 0:
+                self.admitted += 1
+                return
+
+        budget = self.max_wait_ms / 1000 if max_wait is None else max_wait
+        start = time.monotonic()
+        self.queued += 1
+        queue = self._join(key)
+        try:
+            try:
+                await asyncio.wait_for(queue.acquire(), timeout=max(budget, 0))
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                wait = await self._backend(self.backend.peek, key, limits, tokens)
+                raise RateLimitedError(provider.name, wait or budget)
+            try:
+                while True:
+                    wait = await self._backend(self.backend.acquire, key, limits, tokens)
+                    if wait == 0:
+                        break
+                    if time.monotonic() - start + wait > budget:
+                        self.rejected += 1
+                        raise RateLimitedError(provider.name, wait)
+                    await asyncio.sleep(wait)
+            finally:
+                queue.release()
+        finally:
+            self._leave(key)
+        self.admitted += 1
+        self._waited += 1
+        self._total_wait_ms += (time.monotonic() - start) * 1000
+
+    async def refund(
+        self, provider: BaseProvider, api_key: str, requests: int = 0, tokens: int = 0
+    ):
+        """Give back quota that was taken but not used upstream"""
+        limits = limits_for(provider)
+        if not self.enabled or limits.unlimited or (requests <= 0 and tokens <= 0):
+            return
+        await self._backend(
+            self.backend.refund,
+            self._key(provider, api_key),
+            limits,
+            max(requests, 0),
+            max(tokens, 0),
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "spillovers": self.spillovers,
+            "average_wait_ms": self._total_wait_ms / self._waited if self._waited else 0.0,
+        }
+
+
+def _default_backend() -> RateLimitBackend:
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteRateLimitBackend(RATE_LIMIT_DB_PATH)
+    return MemoryRateLimitBackend()
+
+
+rate_limiter = RateLimiter(_default_backend())
@@ -0,0 +1,332 @@
+"""Deadlines, retries, hedged requests and per-provider circuit breakers"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, Optional, Tuple
+
+from .capture import traffic_capture
+from .models import ChatRequest, ChatResponse
+from .ratelimit import rate_limiter
+from .providers.base import BaseProvider
+from .providers.errors import (
+    CircuitOpenError,
+    ProviderTimeoutError,
+    is_retryable,
+)
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT_MS = int(os.getenv("REQUEST_TIMEOUT_MS", "60000"))
+PROVIDER_MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "2"))
+RETRY_BASE_DELAY_MS = float(os.getenv("RETRY_BASE_DELAY_MS", "100"))
+RETRY_MAX_DELAY_MS = float(os.getenv("RETRY_MAX_DELAY_MS", "2000"))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "50"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed: calls flow, consecutive failures are counted.
+    Open: calls are rejected until `open_seconds` have passed.
+    Half-open: up to `half_open_max_calls` trial calls; one success closes
+    the circuit, one failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        half_open_max_calls: int = CIRCUIT_HALF_OPEN_MAX_CALLS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_calls = 0
+        self.times_opened = 0
+        # Opened because another worker's breaker for the provider opened
+        self.opened_by_peer = False
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self.trial_calls = 0
+        return self._state
+
+    def is_available(self) -> bool:
+        """Whether a call would currently be let through (no side effects)"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            return self.trial_calls < self.half_open_max_calls
+        return False
+
+    def try_acquire(self) -> bool:
+        """Reserve permission for one call"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self.trial_calls < self.half_open_max_calls:
+            self.trial_calls += 1
+            return True
+        return False
+
+    def release(self):
+        """Give back a half-open trial slot for a call that was abandoned"""
+        if self._state == HALF_OPEN and self.trial_calls > 0:
+            self.trial_calls -= 1
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        if self._state != CLOSED:
+            logger.info(f"circuit for {self.name} closed")
+        self._state = CLOSED
+        self.trial_calls = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self._state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self._state != OPEN:
+                logger.warning(
+                    f"circuit for {self.name} opened after "
+                    f"{self.consecutive_failures} consecutive failures"
+                )
+                self.times_opened += 1
+            self._state = OPEN
+            self.opened_at = time.monotonic()
+            self.opened_by_peer = False
+            self.trial_calls = 0
+
+    def open_remaining(self) -> float:
+        """Seconds this breaker stays open for its own failures, 0 if it is not open"""
+        if self.state != OPEN or self.opened_by_peer:
+            return 0.0
+        return self.open_seconds - (time.monotonic() - self.opened_at)
+
+    def adopt_open(self, remaining: float):
+        """Open for `remaining` seconds because a peer worker's breaker opened"""
+        if self.state != CLOSED or remaining <= 0:
+            return
+        logger.info(f"circuit for {self.name} opened by another worker")
+        self._state = OPEN
+        self.opened_at = time.monotonic() - max(self.open_seconds - remaining, 0.0)
+        self.opened_by_peer = True
+        self.trial_calls = 0
+
+
+breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(provider_name: str) -> CircuitBreaker:
+    breaker = breakers.get(provider_name)
+    if breaker is None:
+        breaker = breakers[provider_name] = CircuitBreaker(provider_name)
+    return breaker
+
+
+class ResilienceStats:
+    def __init__(self):
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+        self.circuit_rejections = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+stats = ResilienceStats()
+
+
+def deadline_for(request: ChatRequest) -> float:
+    """Absolute monotonic deadline for the request"""
+    return time.monotonic() + (request.timeout_ms or REQUEST_TIMEOUT_MS) / 1000
+
+
+async def attempt(
+    provider: BaseProvider, request: ChatRequest, api_key: str, deadline: float
+) -> ChatResponse:
+    """One call guarded by the rate limiter, the circuit breaker and the deadline"""
+    breaker = get_breaker(provider.name)
+    if not breaker.is_available():
+        stats.circuit_rejections += 1
+        raise CircuitOpenError(provider.name)
+
+    # Waiting for quota counts against the deadline
+    tokens = provider.count_prompt_tokens(request.message) + request.max_tokens
+    await rate_limiter.acquire(
+        provider,
+        api_key,
+        tokens,
+        max_wait=min(rate_limiter.max_wait_ms / 1000, deadline - time.monotonic()),
+    )
+    if not breaker.try_acquire():
+        await rate_limiter.refund(provider, api_key, requests=1, tokens=tokens)
+        stats.circuit_rejections += 1
+        raise CircuitOpenError(provider.name)
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        breaker.release()
+        await rate_limiter.refund(provider, api_key, requests=1, tokens=tokens)
+        stats.timeouts += 1
+        raise ProviderTimeoutError("request deadline exceeded", provider=provider.name)
+
+    start_time = time.monotonic()
+    try:
+        response = await asyncio.wait_for(
+            provider.chat_completion(request, api_key=api_key), timeout=remaining
+        )
+    except asyncio.TimeoutError:
+        stats.timeouts += 1
+        breaker.record_failure()
+        latency_ms = (time.monotonic() - start_time) * 1000
+        provider.update_metrics(latency_ms, False, "deadline exceeded", api_key=api_key)
+        error = ProviderTimeoutError(
+            f"{provider.name} did not answer within the request deadline",
+            provider=provider.name,
+        )
+        traffic_capture.record_call(provider.name, request, latency_ms, error=error)
+        raise error
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        traffic_capture.record_call(
+            provider.name, request, (time.monotonic() - start_time) * 1000, error=e
+        )
+        # Only failures that say something about the provider trip the
+        # breaker, not e.g. one tenant's invalid key or a safety block
+        if is_retryable(e):
+            breaker.record_failure()
+        else:
+            breaker.release()
+        raise
+    traffic_capture.record_call(
+        provider.name, request, (time.monotonic() - start_time) * 1000, response=response
+    )
+    breaker.record_success()
+    # Quota was taken for max_tokens, return what the answer did not use
+    await rate_limiter.refund(provider, api_key, tokens=tokens - response.token_used)
+    return response
+
+
+async def call_with_retries(
+    provider: BaseProvider,
+    request: ChatRequest,
+    api_key: str,
+    deadline: float,
+    max_retries: Optional[int] = None,
+) -> ChatResponse:
+    """Retry retryable errors with exponential backoff and full jitter"""
+    if max_retries is None:
+        max_retries = PROVIDER_MAX_RETRIES
+    retries = 0
+    while True:
+        try:
+            return await attempt(provider, request, api_key, deadline)
+        except Exception as e:
+            if not is_retryable(e) or retries >= max_retries:
+                raise
+            backoff_ms = min(RETRY_MAX_DELAY_MS, RETRY_BASE_DELAY_MS * 2**retries)
+            delay = random.uniform(0, backoff_ms) / 1000
+            if time.monotonic() + delay >= deadline:
+                raise
+            retries += 1
+            stats.retries += 1
+            logger.info(f"retrying {provider.name} in {delay * 1000:.0f}ms: {e}")
+            await asyncio.sleep(delay)
+
+
+def hedge_delay(provider: BaseProvider) -> float:
+    """Seconds to wait before hedging: the provider's recent HEDGE_PERCENTILE latency"""
+    latency_ms = provider.latency_percentile(HEDGE_PERCENTILE) or 0.0
+    return max(latency_ms, HEDGE_MIN_DELAY_MS) / 1000
+
+
+async def call_hedged(
+    primary: Tuple[BaseProvider, str],
+    hedge: Tuple[BaseProvider, str],
+    request: ChatRequest,
+    deadline: float,
+) -> ChatResponse:
+    """
+    Start the primary call; if it has not finished after the hedge delay,
+    start a duplicate on the hedge target. The first success wins and the
+    other call is cancelled. Fails only if both calls fail.
+    """
+    primary_task = asyncio.ensure_future(
+        call_with_retries(primary[0], request, primary[1], deadline)
+    )
+    tasks = {primary_task}
+    try:
+        delay = min(hedge_delay(primary[0]), max(deadline - time.monotonic(), 0))
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return primary_task.result()
+
+        hedge_task = asyncio.ensure_future(
+            call_with_retries(hedge[0], request, hedge[1], deadline)
+        )
+        tasks.add(hedge_task)
+        stats.hedges_fired += 1
+        logger.debug(f"hedging {primary[0].name} request to {hedge[0].name}")
+
+        pending = set(tasks)
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge_task:
+                        stats.hedge_wins += 1
+                    return task.result()
+                if first_error is None or task is primary_task:
+                    first_error = task.exception()
+        raise first_error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def should_hedge(request: ChatRequest) -> bool:
+    return HEDGE_ENABLED if request.hedge is None else request.hedge
+
+
+async def resilient_completion(
+    provider: BaseProvider,
+    api_key: str,
+    request: ChatRequest,
+    hedge_target: Optional[Tuple[BaseProvider, str]] = None,
+) -> ChatResponse:
+    """chat_completion with a deadline, retries and optional hedging"""
+    deadline = deadline_for(request)
+    if should_hedge(request) and hedge_target is not None:
+        return await call_hedged((provider, api_key), hedge_target, request, deadline)
+    return await call_with_retries(provider, request, api_key, deadline)
+
+
+def resilience_status() -> Dict[str, object]:
+    return {
+        **stats.as_dict(),
+        "circuits": {name: breaker.state for name, breaker in breakers.items()},
+    }
@@ -0,0 +1,186 @@
+"""Smart Router: pick a provider for AUTO requests"""
+
+import logging
+import os
+import random
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Type
+
+from .models import ChatRequest
+from .providers.base import BaseProvider
+from .tokens import count_message_tokens, get_counter
+
+logger = logging.getLogger(__name__)
+
+ROUTING_STRATEGY = os.getenv("ROUTING_STRATEGY", "balanced")
+
+
+def estimate_request_tokens(request: ChatRequest) -> int:
+    """Size of a request: prompt tokens from the local counter plus max output"""
+    return count_message_tokens(get_counter(), request.message) + request.max_tokens
+
+
+def _model(provider: BaseProvider, request: ChatRequest) -> str:
+    return request.model or getattr(provider, "model_name", provider.name)
+
+
+def load(provider: BaseProvider) -> float:
+    """In-flight plus queued calls relative to the provider's concurrency limit"""
+    return (provider.in_flight + provider.queue_depth) / max(provider.max_concurrency, 1)
+
+
+def expected_latency(provider: BaseProvider, percentile: float = 50) -> float:
+    """
+    Recent latency at `percentile`, inflated by current load.
+    Providers with no data yet score 0 so they get explored.
+    """
+    latency = provider.latency_percentile(percentile) or 0.0
+    return latency * (1 + load(provider))
+
+
+class RoutingStrategy(ABC):
+    """Chooses one provider out of the healthy candidates"""
+
+    name: str = ""
+
+    @abstractmethod
+    def choose(self, candidates: List[BaseProvider], request: ChatRequest) -> BaseProvider:
+        pass
+
+
+class LeastLatency(RoutingStrategy):
+    """Lowest load-adjusted p50 latency"""
+
+    name = "least_latency"
+
+    def choose(self, candidates, request):
+        return min(candidates, key=expected_latency)
+
+
+class Cheapest(RoutingStrategy):
+    """Lowest estimated cost for this request, ties broken by latency"""
+
+    name = "cheapest"
+
+    def choose(self, candidates, request):
+        tokens = estimate_request_tokens(request)
+        return min(
+            candidates,
+            key=lambda p: (p.estimated_cost(tokens, _model(p, request)), expected_latency(p)),
+        )
+
+
+class WeightedRoundRobin(RoutingStrategy):
+    """
+    Smooth weighted round-robin. Weights follow recent success rate divided
+    by p50 latency, so faster and more reliable providers get more traffic
+    while every healthy provider keeps getting some.
+    """
+
+    name = "weighted_round_robin"
+
+    def __init__(self):
+        self._current: Dict[str, float] = {}
+
+    def _weight(self, provider: BaseProvider) -> float:
+        latency = provider.latency_percentile(50) or 1.0
+        return provider.recent_success_rate() / max(latency, 1.0)
+
+    def choose(self, candidates, request):
+        weights = {p.name: self._weight(p) for p in candidates}
+        total = sum(weights.values())
+        for p in candidates:
+            self._current[p.name] = self._current.get(p.name, 0.0) + weights[p.name]
+        chosen = max(candidates, key=lambda p: self._current[p.name])
+        self._current[chosen.name] -= total
+        return chosen
+
+
+class PowerOfTwoChoices(RoutingStrategy):
+    """Sample two providers at random and take the less loaded one"""
+
+    name = "power_of_two"
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.rng = rng or random.Random()
+
+    def choose(self, candidates, request):
+        if len(candidates) == 1:
+            return candidates[0]
+        a, b = self.rng.sample(candidates, 2)
+        return min((a, b), key=lambda p: (load(p), expected_latency(p)))
+
+
+class Balanced(RoutingStrategy):
+    """
+    Weighted score over tail latency, error rate, cost and load.
+    Each term is normalised against the worst candidate, lower is better.
+    """
+
+    name = "balanced"
+
+    def __init__(
+        self,
+        latency_weight: float = 0.4,
+        error_weight: float = 0.3,
+        cost_weight: float = 0.2,
+        load_weight: float = 0.1,
+    ):
+        self.latency_weight = latency_weight
+        self.error_weight = error_weight
+        self.cost_weight = cost_weight
+        self.load_weight = load_weight
+
+    def choose(self, candidates, request):
+        if len(candidates) == 1:
+            return candidates[0]
+        tokens = estimate_request_tokens(request)
+        latency = {p.name: expected_latency(p, 95) for p in candidates}
+        errors = {p.name: 1 - p.recent_success_rate() for p in candidates}
+        cost = {p.name: p.estimated_cost(tokens, _model(p, request)) for p in candidates}
+        loads = {p.name: load(p) for p in candidates}
+
+        def normalised(values: Dict[str, float], name: str) -> float:
+            worst = max(values.values())
+            return values[name] / worst if worst > 0 else 0.0
+
+        def score(p: BaseProvider) -> float:
+            return (
+                self.latency_weight * normalised(latency, p.name)
+                + self.error_weight * normalised(errors, p.name)
+                + self.cost_weight * normalised(cost, p.name)
+                + self.load_weight * normalised(loads, p.name)
+            )
+
+        return min(candidates, key=score)
+
+
+STRATEGIES: Dict[str, Type[RoutingStrategy]] = {
+    strategy.name: strategy
+    for strategy in (LeastLatency, Cheapest, WeightedRoundRobin, PowerOfTwoChoices, Balanced)
+}
+
+
+def get_strategy(name: str) -> RoutingStrategy:
+    """Factory function for routing strategies"""
+    if name not in STRATEGIES:
+        supported = ", ".join(STRATEGIES.keys())
+        raise ValueError(
+            f"Routing strategy {name} not supported. Available strategies are: {supported}"
+        )
+    return STRATEGIES[name]()
+
+
+class Router:
+    """Routes AUTO requests across healthy providers with a pluggable strategy"""
+
+    def __init__(self, strategy: RoutingStrategy):
+        self.strategy = strategy
+
+    def select(self, candidates: List[BaseProvider], request: ChatRequest) -> BaseProvider:
+        chosen = self.strategy.choose(candidates, request)
+        logger.debug(f"{self.strategy.name} routed request to {chosen.name}")
+        return chosen
+
+
+router = Router(get_strategy(ROUTING_STRATEGY))
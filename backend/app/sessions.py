@@ -0,0 +1,241 @@
+"""Server-side conversation sessions with windowed history"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import shortuuid
+
+from .models import (
+    APIKeyRequestProvider,
+    ChatMessage,
+    ChatRequest,
+    MessageRole,
+    SessionInfo,
+)
+from .tokens import MESSAGE_OVERHEAD_TOKENS, get_counter
+
+logger = logging.getLogger(__name__)
+
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+SESSION_HISTORY_TOKEN_BUDGET = int(os.getenv("SESSION_HISTORY_TOKEN_BUDGET", "8000"))
+# Summarize windowed-out turns with the session's provider instead of just dropping them
+SESSION_SUMMARIZE = os.getenv("SESSION_SUMMARIZE", "false").lower() == "true"
+SESSION_SUMMARY_MAX_TOKENS = int(os.getenv("SESSION_SUMMARY_MAX_TOKENS", "300"))
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+# (messages to summarize, previous summary, api keys) -> summary
+Summarizer = Callable[
+    [List[ChatMessage], Optional[str], List[APIKeyRequestProvider]], Awaitable[str]
+]
+
+
+def generate_session_id() -> str:
+    return "SES" + shortuuid.ShortUUID().random(length=16)
+
+
+class Session:
+    """
+    One conversation: an optional system prompt, an optional summary of
+    turns that fell out of the window, and the most recent turns within
+    `token_budget` tokens.
+
+    Messages are validated once, when they arrive, and token-counted once.
+    Provider-formatted history is cached per provider and only extended
+    with the new messages each turn; it is rebuilt when the window moves.
+    Turns of one session are serialized by `lock`.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        system: Optional[str] = None,
+        token_budget: int = SESSION_HISTORY_TOKEN_BUDGET,
+    ):
+        self.id = session_id
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.token_budget = token_budget
+        self.system = [ChatMessage(role=MessageRole.SYSTEM, content=system)] if system else []
+        self.summary: Optional[ChatMessage] = None
+        self.turns: List[ChatMessage] = []
+        self.turn_count = 0
+        self.api_keys: List[APIKeyRequestProvider] = []
+        self.lock = asyncio.Lock()
+        self._counter = get_counter()
+        self._tokens: List[int] = []
+        self._history_tokens = 0
+        self._formatted: Dict[str, List[Any]] = {}
+
+    def history(self) -> List[ChatMessage]:
+        summary = [self.summary] if self.summary else []
+        return self.system + summary + self.turns
+
+    def history_tokens(self) -> int:
+        fixed = self.system + ([self.summary] if self.summary else [])
+        return self._history_tokens + sum(
+            self._counter.count(m.content) + MESSAGE_OVERHEAD_TOKENS for m in fixed
+        )
+
+    def expand(self, request: ChatRequest) -> ChatRequest:
+        """The request to send: history followed by the new messages"""
+        history = self.history()
+        expanded = request.model_copy(
+            update={"message": history + list(request.message), "session_id": None}
+        )
+        expanded._session = self
+        expanded._history_len = len(history)
+        return expanded
+
+    def formatted(self, provider_name: str, format_messages: Callable) -> List[Any]:
+        """History in the provider's wire format, formatting only what is new"""
+        history = self.history()
+        cached = self._formatted.setdefault(provider_name, [])
+        if len(cached) < len(history):
+            cached.extend(format_messages(history[len(cached):]))
+        return cached
+
+    def record(
+        self,
+        new_messages: List[ChatMessage],
+        reply: str,
+        api_keys: List[APIKeyRequestProvider],
+    ) -> List[ChatMessage]:
+        """Append a finished turn; returns the turns that fell out of the window"""
+        self.turn_count += 1
+        self.last_used = time.monotonic()
+        if api_keys:
+            self.api_keys = api_keys
+        for message in [*new_messages, ChatMessage(role=MessageRole.ASSISTANT, content=reply)]:
+            tokens = self._counter.count(message.content) + MESSAGE_OVERHEAD_TOKENS
+            self.turns.append(message)
+            self._tokens.append(tokens)
+            self._history_tokens += tokens
+        return self._trim()
+
+    def _trim(self) -> List[ChatMessage]:
+        dropped: List[ChatMessage] = []
+        budget = self.token_budget - (self.history_tokens() - self._history_tokens)
+        while len(self.turns) > 1 and (
+            self._history_tokens > budget
+            # The window should start on a user message
+            or (dropped and self.turns[0].role != MessageRole.USER)
+        ):
+            dropped.append(self.turns.pop(0))
+            self._history_tokens -= self._tokens.pop(0)
+        if dropped:
+            self._formatted.clear()
+        return dropped
+
+    def set_summary(self, text: str):
+        self.summary = ChatMessage(role=MessageRole.SYSTEM, content=SUMMARY_PREFIX + text)
+        self._formatted.clear()
+
+    def info(self) -> SessionInfo:
+        return SessionInfo(
+            id=self.id,
+            created_at=datetime.fromtimestamp(self.created_at, timezone.utc),
+            turns=self.turn_count,
+            history_tokens=self.history_tokens(),
+            token_budget=self.token_budget,
+            summary=self.summary.content[len(SUMMARY_PREFIX):] if self.summary else None,
+            messages=self.history(),
+        )
+
+
+class SessionStore:
+    """In-process sessions, least recently used evicted past `max_sessions`, idle ones expire"""
+
+    def __init__(
+        self,
+        max_sessions: int = SESSION_MAX_COUNT,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+        summarize: bool = SESSION_SUMMARIZE,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.summarize = summarize
+        self.summarizer: Optional[Summarizer] = None
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._summaries: Set[asyncio.Task] = set()
+        self.created = 0
+        self.evicted = 0
+        self.expired = 0
+        self.windowed_messages = 0
+        self.summaries = 0
+
+    def create(self, system: Optional[str] = None, token_budget: Optional[int] = None) -> Session:
+        session = Session(
+            generate_session_id(), system, token_budget or SESSION_HISTORY_TOKEN_BUDGET
+        )
+        self._sessions[session.id] = session
+        self.created += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_used > self.ttl_seconds:
+            del self._sessions[session_id]
+            self.expired += 1
+            return None
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def record(
+        self,
+        session: Session,
+        new_messages: List[ChatMessage],
+        reply: str,
+        api_keys: List[APIKeyRequestProvider],
+    ):
+        """Append a finished turn and summarize what fell out of the window in the background"""
+        dropped = session.record(new_messages, reply, api_keys)
+        self.windowed_messages += len(dropped)
+        if dropped and self.summarize and self.summarizer is not None:
+            task = asyncio.create_task(self._summarize(session, dropped))
+            self._summaries.add(task)
+            task.add_done_callback(self._summaries.discard)
+
+    async def _summarize(self, session: Session, dropped: List[ChatMessage]):
+        previous = session.info().summary
+        try:
+            text = await self.summarizer(dropped, previous, session.api_keys)
+        except Exception as e:
+            logger.warning(f"summarizing session {session.id} failed: {e}")
+            return
+        async with session.lock:
+            session.set_summary(text)
+        self.summaries += 1
+
+    async def close(self):
+        for task in self._summaries:
+            task.cancel()
+        await asyncio.gather(*self._summaries, return_exceptions=True)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "active": len(self._sessions),
+            "created": self.created,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "windowed_messages": self.windowed_messages,
+            "summaries": self.summaries,
+        }
+
+
+session_store = SessionStore()
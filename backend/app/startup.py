@@ -0,0 +1,110 @@
+"""Cold-start timings, provider warm-up and readiness"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from . import IMPORT_STARTED
+from .batch import parse_api_keys_header
+from .providers import BaseProvider, get_provider
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+# `name=key,name=key`; with a key a provider's pooled client connects during warm-up
+WARMUP_API_KEYS = os.getenv("WARMUP_API_KEYS", "")
+# Past this the service reports ready with the unfinished warm-ups marked as failed
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "15"))
+
+
+def _ms_since(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+class Startup:
+    """
+    Times the cold start (importing the app, building each provider with
+    its SDK import, warming it up) and tracks readiness: `/readyz` fails
+    until the warm-up is over, so no traffic is routed to a replica that
+    would make its first requests pay for it.
+    """
+
+    def __init__(self):
+        self.import_ms: Optional[float] = None
+        self.providers: Dict[str, Dict[str, Any]] = {}
+        self.warmup_ms: Optional[float] = None
+        self.ready_ms: Optional[float] = None
+        self.ready = False
+
+    def imported(self):
+        """Mark the app as imported"""
+        self.import_ms = _ms_since(IMPORT_STARTED)
+
+    async def _build(self, name: str) -> Optional[BaseProvider]:
+        start = time.perf_counter()
+        try:
+            provider = await asyncio.to_thread(get_provider, name)
+        except Exception as e:
+            logger.error(f"failed to initialize {name} provider: {e}")
+            self.providers[name] = {"init_ms": _ms_since(start), "error": str(e)}
+            return None
+        self.providers[name] = {"init_ms": _ms_since(start)}
+        return provider
+
+    async def build_providers(self, names: List[str]) -> Dict[str, BaseProvider]:
+        """Build the providers in parallel, each import and constructor on a worker thread"""
+        built = await asyncio.gather(*(self._build(name) for name in names))
+        return {name: provider for name, provider in zip(names, built) if provider is not None}
+
+    async def _warm_up(self, provider: BaseProvider, api_key: Optional[str]):
+        start = time.perf_counter()
+        entry = self.providers.setdefault(provider.name, {})
+        try:
+            await provider.warm_up(api_key)
+            entry["warm"] = True
+        except asyncio.CancelledError:
+            entry["warm"] = False
+            entry["error"] = f"warm-up timed out after {WARMUP_TIMEOUT_SECONDS:g}s"
+            raise
+        except Exception as e:
+            entry["warm"] = False
+            entry["error"] = str(e).split("\n")[0]
+            logger.warning(f"warming up {provider.name} failed: {entry['error']}")
+        finally:
+            entry["warmup_ms"] = _ms_since(start)
+
+    async def warm_up(self, providers: Dict[str, BaseProvider]):
+        """Warm every provider concurrently, then report ready"""
+        start = time.perf_counter()
+        if WARMUP_ENABLED:
+            keys = {k.name: k.api_key for k in parse_api_keys_header(WARMUP_API_KEYS)}
+            tasks = [
+                asyncio.ensure_future(self._warm_up(provider, keys.get(name)))
+                for name, provider in providers.items()
+            ]
+            if tasks:
+                _, pending = await asyncio.wait(tasks, timeout=WARMUP_TIMEOUT_SECONDS)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        self.warmup_ms = _ms_since(start)
+        self.ready_ms = _ms_since(IMPORT_STARTED)
+        self.ready = bool(providers)
+        if self.ready:
+            logger.info(f"ready {self.ready_ms:.0f}ms after import started")
+        else:
+            logger.error("no provider initialized, not ready")
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "import_ms": self.import_ms,
+            "providers": self.providers,
+            "warmup_ms": self.warmup_ms,
+            "ready_ms": self.ready_ms,
+        }
+
+
+startup = Startup()
@@ -0,0 +1,190 @@
+"""HTTP request metrics and the OpenMetrics exporter behind /metrics"""
+
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from .metrics import Histogram
+from .tracing import finish_trace, start_trace, stage_histograms
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class HTTPMetrics:
+    """Request counts, latency and in-flight gauge per handler"""
+
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[str, Histogram] = {}
+        self.in_flight = 0
+
+    def record(self, method: str, handler: str, status: int, seconds: float):
+        key = (method, handler, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.latency.get(handler)
+        if histogram is None:
+            histogram = self.latency[handler] = Histogram()
+        histogram.observe(seconds)
+
+
+http_metrics = HTTPMetrics()
+
+
+class TelemetryMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware buffering, safe for SSE).
+    Counts requests per handler, tracks in-flight requests, and for sampled
+    requests closes the `serialization` stage when the response starts and
+    returns the stage timings in a `Server-Timing` header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        trace = start_trace()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None and trace.spans:
+                    trace.mark("serialization")
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing().encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        http_metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_metrics.in_flight -= 1
+            endpoint = scope.get("endpoint")
+            handler = endpoint.__name__ if endpoint is not None else "unmatched"
+            http_metrics.record(
+                scope["method"], handler, status, time.perf_counter() - start
+            )
+            if trace is not None and trace.spans:
+                finish_trace(trace, handler)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Writer:
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def family(self, name: str, kind: str, help_text: str, unit: str = ""):
+        self.lines.append(f"# TYPE {name} {kind}")
+        if unit:
+            self.lines.append(f"# UNIT {name} {unit}")
+        self.lines.append(f"# HELP {name} {help_text}")
+
+    def sample(self, name: str, value: float, **labels):
+        self.lines.append(f"{name}{_labels(**labels)} {_format(value)}")
+
+    def histogram(self, name: str, histogram: Histogram, **labels):
+        cumulative = histogram.cumulative()
+        for bound, count in zip(list(histogram.bounds) + [float("inf")], cumulative):
+            self.sample(f"{name}_bucket", count, **labels, le=_format(float(bound)))
+        self.sample(f"{name}_count", histogram.count, **labels)
+        self.sample(f"{name}_sum", histogram.sum, **labels)
+
+
+def render_openmetrics(
+    providers: Iterable,
+    cache_stats: Dict[str, float],
+    coalesced: int,
+    resilience: Dict[str, object],
+) -> str:
+    """Render every gateway metric in OpenMetrics text format"""
+    providers = list(providers)
+    w = _Writer()
+
+    w.family("llm_http_requests", "counter", "HTTP requests by handler and status")
+    for (method, handler, status), count in sorted(http_metrics.requests.items()):
+        w.sample("llm_http_requests_total", count, method=method, handler=handler, status=status)
+
+    w.family("llm_http_request_duration_seconds", "histogram", "HTTP request latency", "seconds")
+    for handler, histogram in sorted(http_metrics.latency.items()):
+        w.histogram("llm_http_request_duration_seconds", histogram, handler=handler)
+
+    w.family("llm_http_requests_in_flight", "gauge", "HTTP requests being served")
+    w.sample("llm_http_requests_in_flight", http_metrics.in_flight)
+
+    w.family("llm_provider_requests", "counter", "Provider calls by outcome")
+    for p in providers:
+        w.sample("llm_provider_requests_total", p.successful_requests, provider=p.name, outcome="success")
+        w.sample("llm_provider_requests_total", p.failed_requests, provider=p.name, outcome="error")
+
+    w.family("llm_provider_latency_seconds", "histogram", "Provider call latency", "seconds")
+    for p in providers:
+        w.histogram("llm_provider_latency_seconds", p.latency_histogram, provider=p.name)
+
+    w.family("llm_provider_in_flight", "gauge", "Provider calls running upstream")
+    for p in providers:
+        w.sample("llm_provider_in_flight", p.in_flight, provider=p.name)
+
+    w.family("llm_provider_queue_depth", "gauge", "Provider calls waiting for a concurrency slot")
+    for p in providers:
+        w.sample("llm_provider_queue_depth", p.queue_depth, provider=p.name)
+
+    w.family("llm_provider_tokens", "counter", "Tokens consumed per provider")
+    for p in providers:
+        w.sample("llm_provider_tokens_total", p.total_tokens, provider=p.name)
+
+    w.family("llm_provider_cost_usd", "counter", "Estimated cost per provider in USD")
+    for p in providers:
+        w.sample("llm_provider_cost_usd_total", p.total_cost, provider=p.name)
+
+    w.family("llm_cache_lookups", "counter", "Response cache lookups by result")
+    w.sample("llm_cache_lookups_total", cache_stats["exact_hits"], result="exact_hit")
+    w.sample("llm_cache_lookups_total", cache_stats["semantic_hits"], result="semantic_hit")
+    w.sample("llm_cache_lookups_total", cache_stats["misses"], result="miss")
+
+    w.family("llm_cache_bytes", "gauge", "Bytes held by the in-process response cache", "bytes")
+    w.sample("llm_cache_bytes", cache_stats["bytes"])
+
+    w.family("llm_coalesced_requests", "counter", "Requests that shared an in-flight upstream call")
+    w.sample("llm_coalesced_requests_total", coalesced)
+
+    w.family("llm_provider_retries", "counter", "Retried provider calls")
+    w.sample("llm_provider_retries_total", resilience["retries"])
+
+    w.family("llm_provider_timeouts", "counter", "Provider calls that hit the request deadline")
+    w.sample("llm_provider_timeouts_total", resilience["timeouts"])
+
+    w.family("llm_hedged_requests", "counter", "Hedged duplicate requests fired and won")
+    w.sample("llm_hedged_requests_total", resilience["hedges_fired"], result="fired")
+    w.sample("llm_hedged_requests_total", resilience["hedge_wins"], result="won")
+
+    w.family("llm_circuit_open", "gauge", "1 if the provider's circuit breaker is not closed")
+    for name, state in sorted(resilience["circuits"].items()):
+        w.sample("llm_circuit_open", 0 if state == "closed" else 1, provider=name, state=state)
+
+    w.family("llm_request_stage_duration_seconds", "histogram", "Time per request stage (sampled)", "seconds")
+    for stage, histogram in sorted(stage_histograms.items()):
+        w.histogram("llm_request_stage_duration_seconds", histogram, stage=stage)
+
+    w.lines.append("# EOF")
+    return "\n".join(w.lines) + "\n"
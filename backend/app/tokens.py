@@ -0,0 +1,186 @@
+"""Token counting and context-window pre-flight checks"""
+
+import functools
+import logging
+import math
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from .models import ChatMessage, ChatRequest, MessageRole
+from .providers.errors import ContextLengthError
+
+logger = logging.getLogger(__name__)
+
+# "heuristic", "tiktoken:<encoding>" or "sentencepiece:<model path>",
+# per provider with e.g. GEMINI_TOKENIZER
+TOKENIZER = os.getenv("TOKENIZER", "heuristic")
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "4096"))
+# Shorter texts are cheaper to count than to look up
+TOKEN_COUNT_CACHE_MIN_CHARS = int(os.getenv("TOKEN_COUNT_CACHE_MIN_CHARS", "256"))
+# What to do with a conversation that does not fit: "reject" or "truncate"
+CONTEXT_OVERFLOW = os.getenv("CONTEXT_OVERFLOW", "reject")
+# Role and separator tokens added around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    import sentencepiece
+except ImportError:
+    sentencepiece = None
+
+
+class TokenCounter(ABC):
+    name = "counter"
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        pass
+
+
+# GPT-style pre-tokenization: contractions, letter runs with their leading
+# space, digit groups of up to 3, punctuation runs, whitespace
+_PIECES = re.compile(
+    r"'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?(?:[^\s\w]|_)+|\s+(?!\S)|\s+",
+    re.UNICODE,
+)
+
+
+class HeuristicCounter(TokenCounter):
+    """
+    Dependency-free approximation of a BPE / SentencePiece tokenizer.
+
+    Splits text the way BPE pre-tokenizers do, then estimates the merges
+    inside each piece: common-length ASCII words are one token and longer
+    ones split every ~6 characters, non-ASCII letters (CJK, accents) cost
+    about one token each, punctuation about one token per two characters.
+    """
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        tokens = 0
+        for piece in _PIECES.findall(text):
+            last = piece[-1]
+            if last.isalpha():
+                word = piece.lstrip()
+                if word.isascii():
+                    tokens += math.ceil(len(word) / 6)
+                else:
+                    ascii_chars = sum(1 for ch in word if ch.isascii())
+                    tokens += len(word) - ascii_chars + math.ceil(ascii_chars / 6)
+            elif last.isspace() or last.isdigit():
+                tokens += 1
+            else:
+                tokens += math.ceil(len(piece.strip()) / 2) or 1
+        return tokens
+
+
+class TiktokenCounter(TokenCounter):
+    """Exact counts for OpenAI-style BPE vocabularies (needs `tiktoken`)"""
+
+    def __init__(self, encoding: str):
+        self.name = f"tiktoken:{encoding}"
+        self._encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+class SentencePieceCounter(TokenCounter):
+    """Exact counts for a SentencePiece model file, e.g. Gemma's (needs `sentencepiece`)"""
+
+    def __init__(self, model_path: str):
+        self.name = f"sentencepiece:{model_path}"
+        self._processor = sentencepiece.SentencePieceProcessor(model_file=model_path)
+
+    def count(self, text: str) -> int:
+        return len(self._processor.encode(text))
+
+
+class CachedCounter(TokenCounter):
+    """LRU cache over another counter, for system prompts and history sent again and again"""
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        max_size: int = TOKEN_COUNT_CACHE_SIZE,
+        min_chars: int = TOKEN_COUNT_CACHE_MIN_CHARS,
+    ):
+        self.name = counter.name
+        self.counter = counter
+        self.min_chars = min_chars
+        self._cached = functools.lru_cache(maxsize=max_size)(counter.count)
+
+    def count(self, text: str) -> int:
+        if len(text) < self.min_chars:
+            return self.counter.count(text)
+        return self._cached(text)
+
+    def stats(self) -> Dict[str, int]:
+        info = self._cached.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+
+
+_counters: Dict[str, CachedCounter] = {}
+
+
+def _build_counter(spec: str) -> TokenCounter:
+    kind, _, arg = spec.partition(":")
+    if kind == "tiktoken" and tiktoken is not None:
+        return TiktokenCounter(arg or "cl100k_base")
+    if kind == "sentencepiece" and sentencepiece is not None and arg:
+        return SentencePieceCounter(arg)
+    if kind != "heuristic":
+        logger.warning(f"tokenizer {spec} is not available, using the heuristic counter")
+    return HeuristicCounter()
+
+
+def get_counter(spec: str = TOKENIZER) -> CachedCounter:
+    """Shared cached counter for a tokenizer spec"""
+    counter = _counters.get(spec)
+    if counter is None:
+        counter = _counters[spec] = CachedCounter(_build_counter(spec))
+    return counter
+
+
+def count_message_tokens(counter: TokenCounter, messages: List[ChatMessage]) -> int:
+    return sum(counter.count(m.content) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def fit_to_context(
+    request: ChatRequest,
+    counter: TokenCounter,
+    context_window: Optional[int],
+    provider: Optional[str] = None,
+    policy: Optional[str] = None,
+) -> Tuple[ChatRequest, int]:
+    """
+    Make sure prompt + max_tokens fits the context window.
+    `reject` raises ContextLengthError; `truncate` drops the oldest
+    non-system messages (never the last one), then lowers max_tokens.
+    Returns the request to send and its prompt token count.
+    """
+    prompt_tokens = count_message_tokens(counter, request.message)
+    if context_window is None or prompt_tokens + request.max_tokens <= context_window:
+        return request, prompt_tokens
+    if (policy or CONTEXT_OVERFLOW) != "truncate":
+        raise ContextLengthError(provider, prompt_tokens + request.max_tokens, context_window)
+
+    messages = list(request.message)
+    i = 0
+    while prompt_tokens + request.max_tokens > context_window and i < len(messages) - 1:
+        if messages[i].role == MessageRole.SYSTEM:
+            i += 1
+            continue
+        prompt_tokens -= counter.count(messages[i].content) + MESSAGE_OVERHEAD_TOKENS
+        del messages[i]
+    max_tokens = min(request.max_tokens, context_window - prompt_tokens)
+    if max_tokens < 1:
+        raise ContextLengthError(provider, prompt_tokens + 1, context_window)
+    return request.model_copy(update={"message": messages, "max_tokens": max_tokens}), prompt_tokens
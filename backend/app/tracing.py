@@ -0,0 +1,110 @@
+"""Sampled per-stage request tracing"""
+
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Fraction of requests traced, 0 disables tracing, 1 traces everything
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+# Stage durations of sampled requests, exported on /metrics
+stage_histograms: Dict[str, Histogram] = {}
+
+
+class Trace:
+    """Stage timings of one sampled request"""
+
+    __slots__ = ("trace_id", "start", "spans", "_last")
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self._last = self.start
+
+    def mark(self, stage: str):
+        """Close `stage` as everything that ran since the previous span ended"""
+        now = time.perf_counter()
+        self.spans.append((stage, now - self._last))
+        self._last = now
+
+    def add(self, stage: str, started: float):
+        now = time.perf_counter()
+        self.spans.append((stage, now - started))
+        self._last = now
+
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        """Spans formatted for the `Server-Timing` response header"""
+        return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.spans)
+
+
+def start_trace(sample_rate: float = TRACE_SAMPLE_RATE) -> Optional[Trace]:
+    """Begin a trace for the current request if it is sampled"""
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        return None
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def untraced_context() -> Context:
+    """
+    A copy of the current context (request priority included) without the
+    trace, for sub-tasks whose spans must not land in the parent's trace
+    """
+    context = copy_context()
+    context.run(_current_trace.set, None)
+    return context
+
+
+def mark(stage: str):
+    """Close a stage on the current trace; a no-op for unsampled requests"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.mark(stage)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block on the current trace; a no-op for unsampled requests"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(stage, started)
+
+
+def finish_trace(trace: Trace, handler: str):
+    """Record the trace's stages into the stage histograms and log it"""
+    _current_trace.set(None)
+    for stage, seconds in trace.spans:
+        histogram = stage_histograms.get(stage)
+        if histogram is None:
+            histogram = stage_histograms[stage] = Histogram()
+        histogram.observe(seconds)
+    logger.info(
+        f"trace {trace.trace_id} {handler} total={trace.total() * 1000:.2f}ms "
+        f"{trace.server_timing()}"
+    )
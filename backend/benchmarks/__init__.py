@@ -0,0 +1 @@
+"""Load and performance benchmarks for the LLM platform"""
@@ -0,0 +1,182 @@
+"""
+Goodput under overload with and without admission control.
+
+A stub upstream serves `--capacity` calls at a time, each taking
+`--latency-ms`, and queues the rest, like an LLM API at its limit. Poisson
+arrivals at `--overload` times its capacity go through the whole gateway
+(in process, over an ASGI transport); every request has a `--slo-ms`
+deadline. Goodput is answers that arrived within the deadline per second.
+
+Without admission control every request is accepted, the upstream queue
+grows without bound and nearly every request times out. With it, the
+adaptive limit keeps the upstream at its capacity and the excess is shed
+at once with a 503 and Retry-After, so goodput stays near capacity and
+`--high-share` of high priority requests are served first.
+
+    cd backend && python -m benchmarks.admission_overload --overload 5 --duration 10
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import httpx
+
+# Before the app is imported: the stub replaces the mock, no retries (they
+# would multiply the overload), no circuit breaking, passive health or quota in the way
+os.environ.update(
+    PROVIDERS="mock",
+    JOBS_DB_PATH="",
+    USAGE_BACKEND="none",
+    RATE_LIMIT_ENABLED="false",
+    PROVIDER_MAX_RETRIES="0",
+    CIRCUIT_FAILURE_THRESHOLD="1000000",
+    HEALTH_FAILURE_THRESHOLD="1000000",
+    WARMUP_ENABLED="false",
+    TRACE_SAMPLE_RATE="0",
+)
+
+from app import main  # noqa: E402
+from app.admission import admission  # noqa: E402
+from app.models import ChatRequest, ChatResponse  # noqa: E402
+from app.providers.base import BaseProvider  # noqa: E402
+
+
+class QueueingStubProvider(BaseProvider):
+    """Upstream with `capacity` servers of fixed latency and an unbounded FIFO queue"""
+
+    def __init__(self, capacity: int, latency_ms: float):
+        # The gateway side lets everything through, the upstream is the bottleneck
+        super().__init__("mock", max_concurrency=4096)
+        self.model_name = "stub-model"
+        self.latency_ms = latency_ms
+        self._servers = asyncio.Semaphore(capacity)
+
+    def estimated_cost(self, tokens: int, model: str) -> float:
+        return 0.0
+
+    async def chat_completion(self, request: ChatRequest, api_key: str) -> ChatResponse:
+        start_time = time.time()
+        try:
+            async with self._servers:
+                await asyncio.sleep(self.latency_ms / 1000)
+        except asyncio.CancelledError:
+            self.update_metrics((time.time() - start_time) * 1000, False, "cancelled")
+            raise
+        latency_ms = (time.time() - start_time) * 1000
+        self.update_metrics(latency_ms, True, model=self.model_name, tokens=10)
+        return ChatResponse(
+            provider=self.name,
+            model=self.model_name,
+            response="ok",
+            token_used=10,
+            cost=0.0,
+            latency_ms=f"{latency_ms:.1f}",
+            timestamp=datetime.now(timezone.utc),
+        )
+
+    async def health_check(self, api_key: str):
+        return {"status": True, "error": None}
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * percentile / 100), len(values) - 1)]
+
+
+async def scenario(client: httpx.AsyncClient, enabled: bool, args) -> Dict:
+    main.providers["mock"] = QueueingStubProvider(args.capacity, args.latency_ms)
+    admission.enabled = enabled
+    admission.limits.clear()
+    admission.admitted = admission.shed_limit = admission.shed_loop_lag = 0
+    capacity_rps = args.capacity / (args.latency_ms / 1000)
+    rate = capacity_rps * args.overload
+    rng = random.Random(args.seed)
+    results = []
+
+    async def one(high: bool):
+        body = {
+            "message": [{"role": "user", "content": "hi"}],
+            "api_keys": [{"name": "mock", "api_key": "bench"}],
+            "cache": False,
+            "timeout_ms": int(args.slo_ms),
+        }
+        headers = {"X-Priority": "high" if high else "normal"}
+        start = time.perf_counter()
+        try:
+            response = await client.post("/chat", json=body, headers=headers)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        results.append((high, status, (time.perf_counter() - start) * 1000))
+
+    tasks = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.duration:
+        tasks.append(asyncio.create_task(one(rng.random() < args.high_share)))
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    def good(rows):
+        return [ms for _, status, ms in rows if status == 200 and ms <= args.slo_ms]
+
+    high_rows = [r for r in results if r[0]]
+    shed = [ms for _, status, ms in results if status in (429, 503)]
+    limits = [limit.stats()["limit"] for limit in admission.limits.values()]
+    return {
+        "offered_rps": len(results) / elapsed,
+        "goodput_rps": len(good(results)) / elapsed,
+        "capacity_rps": capacity_rps,
+        "good_share": len(good(results)) / max(len(results), 1),
+        "high_good_share": len(good(high_rows)) / max(len(high_rows), 1),
+        "timeouts": sum(1 for _, status, _ in results if status == 504),
+        "shed": len(shed),
+        "shed_p50_ms": _percentile(shed, 50),
+        "good_p50_ms": _percentile(good(results), 50),
+        "good_p99_ms": _percentile(good(results), 99),
+        "limit": limits[0] if limits else None,
+    }
+
+
+async def run(args):
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            rows = [
+                ("no admission control", await scenario(client, False, args)),
+                ("admission control", await scenario(client, True, args)),
+            ]
+    print(
+        f"capacity {rows[0][1]['capacity_rps']:.0f} rps ({args.capacity} x {args.latency_ms:.0f}ms), "
+        f"offered {args.overload:g}x, deadline {args.slo_ms:.0f}ms, {args.high_share:.0%} high priority"
+    )
+    print(
+        f"{'scenario':>22} {'offered':>8} {'goodput':>8} {'good':>6} {'high good':>10} "
+        f"{'timeouts':>9} {'shed':>6} {'shed p50':>9} {'good p50':>9} {'good p99':>9} {'limit':>6}"
+    )
+    for name, r in rows:
+        limit = f"{r['limit']:.1f}" if r["limit"] is not None else "-"
+        print(
+            f"{name:>22} {r['offered_rps']:>8.0f} {r['goodput_rps']:>8.0f} {r['good_share']:>6.0%} "
+            f"{r['high_good_share']:>10.0%} {r['timeouts']:>9} {r['shed']:>6} "
+            f"{r['shed_p50_ms']:>9.1f} {r['good_p50_ms']:>9.1f} {r['good_p99_ms']:>9.1f} {limit:>6}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--capacity", type=int, default=8, help="upstream calls served at once")
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--overload", type=float, default=5, help="offered load / capacity")
+    parser.add_argument("--slo-ms", type=float, default=2000, help="request deadline")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--high-share", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(run(parser.parse_args()))
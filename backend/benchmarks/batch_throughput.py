@@ -0,0 +1,86 @@
+"""
+Throughput of N chat requests sent as sequential /chat calls, concurrent
+/chat calls, and one /chat/batch call, in-process against a stub provider.
+
+    cd backend && python -m benchmarks.batch_throughput --requests 200 --latency-ms 50
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from app import main
+
+from .stub_provider import StubProvider
+
+API_KEYS = [{"name": "gemini", "api_key": "bench"}]
+
+
+def _requests(total: int, run: str):
+    return [
+        {"message": [{"role": "user", "content": f"{run} question {i}"}], "cache": False}
+        for i in range(total)
+    ]
+
+
+async def sequential(client: httpx.AsyncClient, total: int) -> int:
+    ok = 0
+    for body in _requests(total, "sequential"):
+        r = await client.post("/chat", json={**body, "api_keys": API_KEYS})
+        ok += r.status_code == 200
+    return ok
+
+
+async def concurrent(client: httpx.AsyncClient, total: int, concurrency: int) -> int:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(body):
+        async with semaphore:
+            r = await client.post("/chat", json={**body, "api_keys": API_KEYS})
+            return r.status_code == 200
+
+    results = await asyncio.gather(*(one(b) for b in _requests(total, "concurrent")))
+    return sum(results)
+
+
+async def batch(client: httpx.AsyncClient, total: int) -> int:
+    r = await client.post(
+        "/chat/batch", json={"requests": _requests(total, "batch"), "api_keys": API_KEYS}
+    )
+    return sum(json.loads(line)["status"] == 200 for line in r.text.splitlines())
+
+
+async def run(args):
+    main.providers.clear()
+    main.providers["gemini"] = StubProvider(
+        "gemini", latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 5
+    )
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm the health registry so every mode starts from the same state
+        await client.post("/chat", json={**_requests(1, "warmup")[0], "api_keys": API_KEYS})
+
+        print(f"requests={args.requests} stub latency={args.latency_ms}ms")
+        print(f"{'mode':>24} {'seconds':>8} {'req/s':>8} {'ok':>6}")
+        modes = [
+            ("sequential /chat", lambda: sequential(client, args.requests)),
+            (f"concurrent /chat x{args.concurrency}", lambda: concurrent(client, args.requests, args.concurrency)),
+            ("/chat/batch", lambda: batch(client, args.requests)),
+        ]
+        for name, call in modes:
+            start = time.perf_counter()
+            ok = await call()
+            elapsed = time.perf_counter() - start
+            print(f"{name:>24} {elapsed:>8.2f} {args.requests / elapsed:>8.1f} {ok:>6}")
+    main.providers["gemini"].close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    asyncio.run(run(parser.parse_args()))
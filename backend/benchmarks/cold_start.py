@@ -0,0 +1,101 @@
+"""
+Cold start: how long a fresh process takes from `import app.main` to
+ready, and which imports it spends that on.
+
+Runs a new interpreter with `-X importtime` that imports the app, runs its
+startup and waits for the warm-up, then prints the app's own cold-start
+timings (as `/readyz` reports them) and the slowest imports by cumulative
+time. Set PROVIDERS / WARMUP_API_KEYS as for the server.
+
+    cd backend && PROVIDERS=gemini,mock python -m benchmarks.cold_start --top 10
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import List, Tuple
+
+_CHILD = """
+import asyncio, json
+from app import main
+from app.startup import startup
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        while startup.warmup_ms is None:
+            await asyncio.sleep(0.01)
+        print("REPORT " + json.dumps(startup.report()), flush=True)
+
+asyncio.run(run())
+"""
+
+# import time: self [us] | cumulative | imported package
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _import_tree(stderr: str) -> List[Tuple[int, str, List[Tuple[int, str]]]]:
+    """
+    (cumulative µs, module, direct imports) of the outermost imports: the
+    ones the app's own code triggered, each including everything it
+    imported in turn. importtime lists an import after its children.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            # One space, then two more per nesting level
+            rows.append((len(match.group(3)) // 2, int(match.group(2)), match.group(4)))
+    outermost = min((depth for depth, _, _ in rows), default=0)
+    tree, children = [], []
+    for depth, cumulative, module in rows:
+        if depth == outermost + 1:
+            children.append((cumulative, module))
+        elif depth == outermost:
+            tree.append((cumulative, module, sorted(children, reverse=True)))
+            children = []
+    return tree
+
+
+def main(args):
+    env = {"JOBS_DB_PATH": "", "USAGE_BACKEND": "none", **os.environ}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        capture_output=True,
+        text=True,
+        env=env,
+        timeout=args.timeout,
+    )
+    report_line = next(
+        (line for line in result.stdout.splitlines() if line.startswith("REPORT ")), None
+    )
+    if report_line is None:
+        sys.exit(f"startup did not finish:\n{result.stderr[-2000:]}")
+    report = json.loads(report_line[len("REPORT "):])
+
+    print(f"import app.main      {report['import_ms']:>9.1f} ms")
+    for name, provider in report["providers"].items():
+        warm = "warm" if provider.get("warm") else provider.get("error", "not warmed")
+        print(
+            f"provider {name:<12}{provider.get('init_ms', 0):>9.1f} ms init "
+            f"+ {provider.get('warmup_ms', 0):.1f} ms warm-up ({warm})"
+        )
+    print(f"warm-up              {report['warmup_ms']:>9.1f} ms")
+    print(f"ready                {report['ready_ms']:>9.1f} ms after import started")
+
+    print("\nslowest imports (cumulative), -X importtime:")
+    for cumulative, module, children in sorted(_import_tree(result.stderr), reverse=True)[: args.top]:
+        print(f"  {module:<40}{cumulative / 1000:>9.1f} ms")
+        for child_cumulative, child in children[: args.top]:
+            if child_cumulative >= args.min_ms * 1000:
+                print(f"    {child:<38}{child_cumulative / 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--min-ms", type=float, default=5, help="hide smaller nested imports")
+    parser.add_argument("--timeout", type=float, default=120)
+    main(parser.parse_args())
@@ -0,0 +1,373 @@
+"""
+End-to-end load test of the gateway against the mock provider.
+
+Drives /chat, /health and /status with closed-loop load (N clients each
+sending back to back) and open-loop load (arrivals at a set RPS whether or
+not earlier requests finished), and reports throughput, latency, the
+gateway's overhead on top of the provider's own latency, and memory.
+
+The app runs in this process (`--server inprocess`, through an ASGI
+transport, so client and server share one event loop) or as a real
+uvicorn worker (`--server uvicorn`). Results are written as JSON; pass a
+previous file with `--baseline` to flag regressions.
+
+    cd backend && python -m benchmarks.gateway_load --duration 5 --output results.json
+    cd backend && python -m benchmarks.gateway_load --server uvicorn --baseline results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+API_KEYS = [{"name": "mock", "api_key": "bench"}]
+
+# Metrics compared against --baseline: name -> True if higher is better
+COMPARED = {
+    "throughput_rps": True,
+    "latency_ms.p50": False,
+    "latency_ms.p99": False,
+    "overhead_ms.p50": False,
+    "overhead_ms.p99": False,
+}
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * percentile / 100), len(values) - 1)]
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(_percentile(values, 50), 2),
+        "p90": round(_percentile(values, 90), 2),
+        "p99": round(_percentile(values, 99), 2),
+        "max": round(max(values, default=0.0), 2),
+    }
+
+
+def _rss_mb(pid: Optional[int] = None) -> Dict[str, float]:
+    """Current and peak resident memory of a process (this one by default)"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return {
+            "rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+            "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1),
+        }
+    except (OSError, KeyError):
+        # No procfs (macOS): only this process' peak is known
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+        return {"rss_mb": 0.0, "peak_rss_mb": round(peak_mb, 1)}
+
+
+class Endpoint:
+    """One request against the gateway; returns the provider's share of its latency"""
+
+    def __init__(self, name: str, call: Callable[[httpx.AsyncClient, int], Awaitable[float]]):
+        self.name = name
+        self.call = call
+
+
+async def _chat(client: httpx.AsyncClient, i: int) -> float:
+    r = await client.post(
+        "/chat",
+        json={
+            "provider": "mock",
+            "message": [{"role": "user", "content": f"load test question {i}"}],
+            "api_keys": API_KEYS,
+            "cache": False,
+        },
+    )
+    r.raise_for_status()
+    return float(r.json()["latency_ms"])
+
+
+async def _health(client: httpx.AsyncClient, i: int) -> float:
+    r = await client.post("/health", json={"providers": API_KEYS})
+    r.raise_for_status()
+    return 0.0
+
+
+async def _status(client: httpx.AsyncClient, i: int) -> float:
+    r = await client.get("/status")
+    r.raise_for_status()
+    return 0.0
+
+
+ENDPOINTS = {
+    "chat": Endpoint("/chat", _chat),
+    "health": Endpoint("/health", _health),
+    "status": Endpoint("/status", _status),
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.overheads: List[float] = []
+        self.errors = 0
+        self.sequence = 0
+
+    async def one(self, client: httpx.AsyncClient, endpoint: Endpoint):
+        self.sequence += 1
+        start = time.perf_counter()
+        try:
+            provider_ms = await endpoint.call(client, self.sequence)
+        except Exception:
+            self.errors += 1
+            return
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.latencies.append(latency_ms)
+        self.overheads.append(latency_ms - provider_ms)
+
+
+async def closed_loop(
+    client: httpx.AsyncClient, endpoint: Endpoint, concurrency: int, duration: float
+) -> Recorder:
+    recorder = Recorder()
+    stop_at = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < stop_at:
+            await recorder.one(client, endpoint)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return recorder
+
+
+async def open_loop(
+    client: httpx.AsyncClient,
+    endpoint: Endpoint,
+    rps: float,
+    duration: float,
+    max_in_flight: int,
+    rng: random.Random,
+) -> Recorder:
+    """Poisson arrivals at `rps`; arrivals beyond `max_in_flight` count as errors"""
+    recorder = Recorder()
+    tasks = set()
+    start = time.perf_counter()
+    next_at = start
+    while next_at - start < duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(tasks) >= max_in_flight:
+            recorder.errors += 1
+        else:
+            task = asyncio.create_task(recorder.one(client, endpoint))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        next_at += rng.expovariate(rps)
+    await asyncio.gather(*tasks)
+    return recorder
+
+
+def _result(endpoint: Endpoint, mode: str, level: float, recorder: Recorder, elapsed: float,
+            memory: Dict[str, float]) -> Dict[str, Any]:
+    return {
+        "endpoint": endpoint.name,
+        "mode": mode,
+        "concurrency" if mode == "closed" else "rps": level,
+        "requests": len(recorder.latencies),
+        "errors": recorder.errors,
+        "throughput_rps": round(len(recorder.latencies) / elapsed, 1),
+        "latency_ms": _summary(recorder.latencies),
+        "overhead_ms": _summary(recorder.overheads),
+        **memory,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _mock_env(args) -> Dict[str, str]:
+    return {
+        "PROVIDERS": "mock",
+        "MOCK_LATENCY_DISTRIBUTION": "constant",
+        "MOCK_LATENCY_MS": str(args.latency_ms),
+        "MOCK_INTER_TOKEN_MS": "0",
+        "MOCK_MAX_CONCURRENCY": str(args.provider_concurrency),
+        "JOBS_DB_PATH": "",
+        "RATE_LIMIT_ENABLED": "false",
+    }
+
+
+async def _start_uvicorn(args):
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", "1", "--log-level", "warning"],
+        env={**os.environ, **_mock_env(args)},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(100):
+            try:
+                if (await client.get("/healthz")).status_code == 200:
+                    return process, base_url
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+async def run(args) -> Dict[str, Any]:
+    process = None
+    lifespan = None
+    if args.server == "uvicorn":
+        process, base_url = await _start_uvicorn(args)
+        transport = None
+    else:
+        os.environ.update(_mock_env(args))
+        from app import main
+
+        lifespan = main.app.router.lifespan_context(main.app)
+        await lifespan.__aenter__()
+        transport = httpx.ASGITransport(app=main.app)
+        base_url = "http://bench"
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    results = []
+    rng = random.Random(args.seed)
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url=base_url, limits=limits, timeout=60
+        ) as client:
+            # Warm up health entries, the token counter cache and the connection pool
+            for endpoint in ENDPOINTS.values():
+                await closed_loop(client, endpoint, 4, 0.5)
+
+            print(f"{'endpoint':>8} {'load':>10} {'req/s':>8} {'p50':>7} {'p99':>7} "
+                  f"{'ovh p50':>8} {'ovh p99':>8} {'err':>5} {'rss MB':>7}")
+            for name in args.endpoints.split(","):
+                endpoint = ENDPOINTS[name]
+                runs = [("closed", c) for c in args.concurrency] + [("open", r) for r in args.rps]
+                for mode, level in runs:
+                    start = time.perf_counter()
+                    if mode == "closed":
+                        recorder = await closed_loop(client, endpoint, int(level), args.duration)
+                    else:
+                        recorder = await open_loop(
+                            client, endpoint, level, args.duration, args.max_in_flight, rng
+                        )
+                    elapsed = time.perf_counter() - start
+                    result = _result(endpoint, mode, level, recorder, elapsed,
+                                     _rss_mb(process.pid if process else None))
+                    results.append(result)
+                    load = f"{mode} {level:g}"
+                    print(f"{endpoint.name:>8} {load:>10} {result['throughput_rps']:>8.1f} "
+                          f"{result['latency_ms']['p50']:>7.1f} {result['latency_ms']['p99']:>7.1f} "
+                          f"{result['overhead_ms']['p50']:>8.2f} {result['overhead_ms']['p99']:>8.2f} "
+                          f"{result['errors']:>5} {result['rss_mb']:>7.1f}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    return {
+        "meta": {
+            "server": args.server,
+            "provider_latency_ms": args.latency_ms,
+            "duration_s": args.duration,
+            "python": platform.python_version(),
+            "git": _git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _metric(result: Dict[str, Any], name: str) -> float:
+    value: Any = result
+    for part in name.split("."):
+        value = value[part]
+    return value
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions beyond `tolerance` (0.1 = 10%) for runs present in both files"""
+
+    def key(r):
+        return (r["endpoint"], r["mode"], r.get("concurrency", r.get("rps")))
+
+    previous = {key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        for name, higher_is_better in COMPARED.items():
+            old, new = _metric(before, name), _metric(result, name)
+            if not old:
+                continue
+            change = (new - old) / old
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                endpoint, mode, level = key(result)
+                regressions.append(
+                    f"{endpoint} {mode} {level:g} {name}: {old:g} -> {new:g} ({change:+.0%})"
+                )
+    return regressions
+
+
+def _levels(value: str) -> List[float]:
+    return [float(v) for v in value.split(",") if v]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--endpoints", default="chat,health,status")
+    parser.add_argument("--concurrency", type=_levels, default=[1, 16, 64],
+                        help="closed-loop client counts, comma separated")
+    parser.add_argument("--rps", type=_levels, default=[100, 500],
+                        help="open-loop arrival rates, comma separated")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mock provider latency")
+    parser.add_argument("--provider-concurrency", type=int, default=256)
+    parser.add_argument("--max-in-flight", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,59 @@
+"""
+Throughput of a provider under concurrent requests.
+
+Compares a blocking SDK call made directly on the event loop (the old
+GeminiProvider behaviour) with the same call routed through
+`BaseProvider.run_blocking`.
+
+    cd backend && python -m benchmarks.provider_concurrency
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.models import ChatMessage, ChatRequest
+
+from .stub_provider import StubProvider
+
+
+async def _run(provider: StubProvider, concurrency: int, total: int) -> float:
+    request = ChatRequest(message=[ChatMessage(role="user", content="hello")])
+    pending = iter(range(total))
+
+    async def worker():
+        for _ in pending:
+            await provider.chat_completion(request, api_key="bench")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - start)
+
+
+async def main(args):
+    print(f"latency={args.latency_ms}ms requests={args.requests}")
+    print(f"{'concurrency':>11} {'blocking rps':>13} {'executor rps':>13} {'peak queue':>11}")
+    for concurrency in args.concurrency:
+        blocking = StubProvider(latency_ms=args.latency_ms, blocking=True)
+        pooled = StubProvider(
+            latency_ms=args.latency_ms, max_concurrency=args.max_concurrency
+        )
+        blocking_rps = await _run(blocking, concurrency, args.requests)
+        pooled_rps = await _run(pooled, concurrency, args.requests)
+        print(
+            f"{concurrency:>11} {blocking_rps:>13.1f} {pooled_rps:>13.1f} "
+            f"{pooled.peak_queue_depth:>11}"
+        )
+        blocking.close()
+        pooled.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32]
+    )
+    asyncio.run(main(parser.parse_args()))
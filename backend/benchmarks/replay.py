@@ -0,0 +1,277 @@
+"""
+Deterministic replay of captured /chat traffic against the gateway.
+
+Reads files written with CAPTURE_PATH, sends every captured request to
+the app (in process, over an ASGI transport) at its recorded arrival
+time, divided by `--speed` (2 = twice the original rate), and answers
+provider calls from the captured cassettes with the recorded latencies
+(times `--latency-scale`). Nothing leaves the process, no API keys are
+needed, and two runs of the same capture on the same code see the same
+arrivals and provider behaviour.
+
+The report puts the replay next to what was recorded: throughput,
+latency percentiles of successful requests, errors, cache hits, provider
+calls per request and where requests were routed. Write it with
+`--output`, and pass a previous replay's JSON to `--baseline` to judge a
+routing or caching change on the same workload.
+
+    cd backend && python -m benchmarks.replay capture.jsonl --output before.json
+    cd backend && python -m benchmarks.replay capture.jsonl --speed 4 --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+# Metrics compared against --baseline: name -> True if higher is better
+COMPARED = {
+    "throughput_rps": True,
+    "success_share": True,
+    "latency_ms.p50": False,
+    "latency_ms.p99": False,
+    "calls_per_request": False,
+}
+
+# (status, latency ms, cached, provider that answered)
+Outcome = Tuple[int, float, bool, Optional[str]]
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * percentile / 100), len(values) - 1)]
+
+
+def load(paths: List[str], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Captured exchanges from all files, in arrival order"""
+    exchanges = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            exchanges.extend(json.loads(line) for line in f if line.strip())
+    exchanges.sort(key=lambda e: e["ts"])
+    return exchanges[:limit] if limit else exchanges
+
+
+def provider_names(exchanges: List[Dict[str, Any]]) -> List[str]:
+    """Every provider the captured requests named or were sent to"""
+    names = set()
+    for exchange in exchanges:
+        names.update(call["provider"] for call in exchange["calls"])
+        names.update(key["name"] for key in exchange["request"]["api_keys"])
+        if exchange["request"]["provider"] != "auto":
+            names.add(exchange["request"]["provider"])
+    return sorted(names)
+
+
+def _recorded(exchange: Dict[str, Any]) -> Outcome:
+    answered = [c["provider"] for c in exchange["calls"] if c["status"] == 200]
+    return (
+        exchange["status"],
+        exchange["latency_ms"],
+        exchange.get("cached", False),
+        answered[-1] if answered else None,
+    )
+
+
+def summarize(outcomes: List[Outcome], elapsed: float, calls: int) -> Dict[str, Any]:
+    ok = [o for o in outcomes if o[0] == 200]
+    latencies = [o[1] for o in ok]
+    # Recorded cache hits made no provider call, so shares are of the known ones
+    routed = Counter(o[3] for o in ok if o[3])
+    return {
+        "requests": len(outcomes),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "success_share": round(len(ok) / max(len(outcomes), 1), 4),
+        "errors": dict(Counter(str(o[0]) for o in outcomes if o[0] != 200)),
+        "cache_hit_share": round(sum(1 for o in ok if o[2]) / max(len(ok), 1), 4),
+        "calls_per_request": round(calls / max(len(outcomes), 1), 3),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50), 1),
+            "p90": round(_percentile(latencies, 90), 1),
+            "p99": round(_percentile(latencies, 99), 1),
+            "max": round(max(latencies, default=0.0), 1),
+        },
+        "routed": {
+            name: round(n / sum(routed.values()), 4) for name, n in sorted(routed.items())
+        },
+    }
+
+
+async def _send(client: httpx.AsyncClient, exchange: Dict[str, Any]) -> Outcome:
+    body = dict(exchange["request"])
+    body["api_keys"] = [{"name": key["name"], "api_key": "replay"} for key in body["api_keys"]]
+    start = time.perf_counter()
+    cached, provider = False, None
+    try:
+        if exchange["endpoint"] == "/chat/stream":
+            async with client.stream("POST", "/chat/stream", json=body) as response:
+                status = response.status_code
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:") and event == "error":
+                        status = json.loads(line[5:])["status"]
+                    elif line.startswith("data:") and event == "done":
+                        provider = json.loads(line[5:])["provider"]
+        else:
+            response = await client.post("/chat", json=body)
+            status = response.status_code
+            if status == 200:
+                data = response.json()
+                cached, provider = data.get("cached", False), data["provider"]
+    except httpx.HTTPError:
+        status = 0
+    return status, (time.perf_counter() - start) * 1000, cached, provider
+
+
+async def replay(exchanges: List[Dict[str, Any]], args) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    names = provider_names(exchanges)
+    # Before the app is imported: the enum of providers is built from PROVIDERS
+    os.environ.update(
+        PROVIDERS=",".join(names),
+        JOBS_DB_PATH="",
+        USAGE_BACKEND="none",
+        WARMUP_ENABLED="false",
+        CAPTURE_PATH="",
+        TRACE_SAMPLE_RATE="0",
+    )
+    from app import main
+
+    from .replay_provider import ReplayProvider
+
+    calls: Dict[str, List[Dict[str, Any]]] = {name: [] for name in names}
+    for exchange in exchanges:
+        for call in exchange["calls"]:
+            calls[call["provider"]].append(call)
+    random.seed(args.seed)
+
+    async with main.app.router.lifespan_context(main.app):
+        for name in names:
+            if calls[name]:
+                main.providers[name] = ReplayProvider(name, calls[name], args.latency_scale)
+            else:
+                main.providers.pop(name, None)
+        replayed = [p for p in main.providers.values() if isinstance(p, ReplayProvider)]
+        transport = httpx.ASGITransport(app=main.app)
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://replay", limits=limits, timeout=None
+        ) as client:
+            first = exchanges[0]["ts"]
+            tasks = []
+            start = time.perf_counter()
+            for exchange in exchanges:
+                delay = start + (exchange["ts"] - first) / args.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(_send(client, exchange)))
+            outcomes = await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+        matched = sum(p.matched for p in replayed)
+        unmatched = sum(p.unmatched for p in replayed)
+        # Answered and failed calls alike (calls cancelled by hedging are not counted)
+        replayed_calls = sum(p.total_requests for p in replayed)
+
+    recorded_elapsed = (
+        exchanges[-1]["ts"] + exchanges[-1]["latency_ms"] / 1000 - first
+    ) or 1.0
+    recorded = summarize(
+        [_recorded(e) for e in exchanges], recorded_elapsed, sum(len(e["calls"]) for e in exchanges)
+    )
+    result = summarize(outcomes, elapsed, replayed_calls)
+    result["cassettes_matched"] = round(matched / max(matched + unmatched, 1), 4)
+    return recorded, result
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions beyond `tolerance` (0.1 = 10%) of the replay against a previous one"""
+    regressions = []
+    for name, higher_is_better in COMPARED.items():
+        old, new = baseline, current
+        for part in name.split("."):
+            old, new = old[part], new[part]
+        if not old:
+            continue
+        change = (new - old) / old
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            regressions.append(f"{name}: {old:g} -> {new:g} ({change:+.0%})")
+    return regressions
+
+
+def _print(rows: List[Tuple[str, Dict[str, Any]]]):
+    print(f"{'':>10} {'requests':>9} {'ok/s':>7} {'ok':>6} {'p50':>8} {'p90':>8} {'p99':>8} "
+          f"{'cached':>7} {'calls/req':>10}  routed")
+    for name, r in rows:
+        latency = r["latency_ms"]
+        routed = ", ".join(f"{p} {share:.0%}" for p, share in r["routed"].items())
+        print(f"{name:>10} {r['requests']:>9} {r['throughput_rps']:>7.1f} {r['success_share']:>6.1%} "
+              f"{latency['p50']:>8.1f} {latency['p90']:>8.1f} {latency['p99']:>8.1f} "
+              f"{r['cache_hit_share']:>7.1%} {r['calls_per_request']:>10.2f}  {routed}")
+        if r["errors"]:
+            print(f"{'':>10} errors: {', '.join(f'{s} x{n}' for s, n in sorted(r['errors'].items()))}")
+
+
+def main(args) -> int:
+    exchanges = load(args.captures, args.limit)
+    if not exchanges:
+        print("no captured exchanges")
+        return 1
+    recorded, result = asyncio.run(replay(exchanges, args))
+    print(
+        f"{len(exchanges)} exchanges, speed {args.speed:g}x, latency scale {args.latency_scale:g}, "
+        f"{result['cassettes_matched']:.0%} of provider calls matched a cassette"
+    )
+    rows = [("recorded", recorded), ("replay", result)]
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["replay"]
+        rows.insert(1, ("baseline", baseline))
+    _print(rows)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "meta": {
+                        "captures": args.captures,
+                        "speed": args.speed,
+                        "latency_scale": args.latency_scale,
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    },
+                    "recorded": recorded,
+                    "replay": result,
+                },
+                f,
+                indent=2,
+            )
+    if baseline is not None:
+        regressions = compare(baseline, result, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", nargs="+", help="files written with CAPTURE_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="arrival rate multiplier")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="multiplier on the recorded provider latencies")
+    parser.add_argument("--limit", type=int, help="replay only the first N exchanges")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="report of a previous replay to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    sys.exit(main(parser.parse_args()))
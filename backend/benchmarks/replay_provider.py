@@ -0,0 +1,128 @@
+"""Provider that answers from captured cassettes, used by benchmarks/replay.py"""
+
+import asyncio
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Union
+
+from app.capture import fingerprint
+from app.models import ChatRequest, ChatResponse
+from app.providers.base import BaseProvider
+from app.providers.errors import ProviderError, ProviderTimeoutError
+
+
+class ReplayProvider(BaseProvider):
+    """
+    Plays back the provider calls captured for one provider name: each
+    call waits the recorded latency (times `latency_scale`), then returns
+    the recorded answer or raises the recorded error.
+
+    Calls are matched to cassettes by request fingerprint, in recorded
+    order, cycling when a request is replayed more often than it was
+    recorded. A request that was never sent to this provider (e.g. a
+    routing change sends it elsewhere now) gets one of its cassettes
+    picked by fingerprint, so the choice is the same on every run.
+    """
+
+    def __init__(self, name: str, calls: List[Dict[str, Any]], latency_scale: float = 1.0):
+        super().__init__(name, max_concurrency=4096)
+        self.calls = calls
+        self.latency_scale = latency_scale
+        self.model_name = next((c["model"] for c in calls if c.get("model")), f"{name}-model")
+        self._by_key: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        for call in calls:
+            self._by_key[call["key"]].append(call)
+        self.matched = 0
+        self.unmatched = 0
+
+    def _cassette(self, request: ChatRequest) -> Dict[str, Any]:
+        key = fingerprint(request)
+        queue = self._by_key.get(key)
+        if queue:
+            self.matched += 1
+            call = queue[0]
+            queue.rotate(-1)
+            return call
+        self.unmatched += 1
+        return self.calls[int(key, 16) % len(self.calls)]
+
+    def _error(self, call: Dict[str, Any]) -> ProviderError:
+        if call["error"] == "ProviderTimeoutError":
+            return ProviderTimeoutError(call["detail"], provider=self.name)
+        return ProviderError(
+            call["detail"],
+            provider=self.name,
+            retryable=call.get("retryable", False),
+            status_code=call["status"],
+        )
+
+    def estimated_cost(self, tokens: int, model: str) -> float:
+        return 0.0
+
+    def _record(
+        self,
+        call: Dict[str, Any],
+        start_time: float,
+        api_key: str,
+        ttft_ms: Optional[float] = None,
+    ) -> ChatResponse:
+        latency_ms = (time.time() - start_time) * 1000
+        prompt_tokens = call.get("prompt_tokens") or 0
+        completion_tokens = call.get("completion_tokens") or self.count_tokens(call["response"])
+        tokens = prompt_tokens + completion_tokens
+        model = call.get("model") or self.model_name
+        self.update_metrics(
+            latency_ms, True, api_key=api_key, ttft_ms=ttft_ms, model=model, tokens=tokens
+        )
+        return ChatResponse(
+            provider=self.name,
+            model=model,
+            response=call["response"],
+            token_used=tokens,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost=call.get("cost") or 0.0,
+            latency_ms=f"{latency_ms:.1f}",
+            timestamp=datetime.now(timezone.utc),
+        )
+
+    async def chat_completion(self, request: ChatRequest, api_key: str) -> ChatResponse:
+        start_time = time.time()
+        call = self._cassette(request)
+        await asyncio.sleep(call["latency_ms"] * self.latency_scale / 1000)
+        if call["status"] != 200:
+            error = self._error(call)
+            self.update_metrics(
+                (time.time() - start_time) * 1000, False, str(error), api_key=api_key
+            )
+            raise error
+        return self._record(call, start_time, api_key)
+
+    async def stream_chat_completion(
+        self, request: ChatRequest, api_key: str
+    ) -> AsyncIterator[str]:
+        start_time = time.time()
+        call = self._cassette(request)
+        latency = call["latency_ms"] * self.latency_scale / 1000
+        if call["status"] != 200:
+            await asyncio.sleep(latency)
+            error = self._error(call)
+            self.update_metrics((time.time() - start_time) * 1000, False, str(error), api_key=api_key)
+            raise error
+        # Recorded time to first token, then the rest spread evenly over the words
+        ttft_ms = call["ttft_ms"] if call.get("ttft_ms") is not None else call["latency_ms"]
+        ttft = ttft_ms * self.latency_scale / 1000
+        words = call["response"].split(" ")
+        gap = max(latency - ttft, 0.0) / max(len(words) - 1, 1)
+        await asyncio.sleep(ttft)
+        ttft_ms = (time.time() - start_time) * 1000
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(gap)
+            yield word if i == 0 else " " + word
+        self._record(call, start_time, api_key, ttft_ms=ttft_ms)
+
+    async def health_check(self, api_key: str) -> Dict[str, Union[bool, str]]:
+        self.last_check = datetime.now(timezone.utc)
+        return {"status": True, "error": None}
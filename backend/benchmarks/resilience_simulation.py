@@ -0,0 +1,114 @@
+"""
+Drive a fault-injecting stub provider through the resilience layer and
+compare scenarios: plain calls, retries, retries + hedging.
+
+The primary provider has a slow tail and a retryable error rate; the
+hedge target is a second, healthy stub.
+
+    cd backend && python -m benchmarks.resilience_simulation --rps 100 --requests 1000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List
+
+from app import resilience
+from app.models import ChatMessage, ChatRequest
+
+from .stub_provider import StubProvider
+
+SCENARIOS = {
+    # name: (max_retries, hedge)
+    "no retries": (0, False),
+    "retries": (2, False),
+    "retries + hedging": (2, True),
+}
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * percentile / 100), len(values) - 1)]
+
+
+async def simulate(name: str, args) -> Dict:
+    max_retries, hedge = SCENARIOS[name]
+    resilience.PROVIDER_MAX_RETRIES = max_retries
+    resilience.breakers.clear()
+    resilience.stats = resilience.ResilienceStats()
+
+    rng = random.Random(args.seed)
+    primary = StubProvider("primary", latency_ms=40, jitter_ms=20, error_rate=args.error_rate,
+                           tail_rate=args.tail_rate, tail_ms=args.tail_ms, max_concurrency=64)
+    backup = StubProvider("backup", latency_ms=60, jitter_ms=20, max_concurrency=64)
+    # Warm the latency window so the hedge delay reflects the primary's p95
+    await asyncio.gather(*(
+        primary.chat_completion(_request(), api_key="sim") for _ in range(50)
+    ), return_exceptions=True)
+
+    latencies: List[float] = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        request = _request(timeout_ms=args.timeout_ms, hedge=hedge)
+        start = time.perf_counter()
+        try:
+            await resilience.resilient_completion(
+                primary, "sim", request, hedge_target=(backup, "sim")
+            )
+        except Exception:
+            errors += 1
+            return
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tasks = []
+    for _ in range(args.requests):
+        tasks.append(asyncio.create_task(one()))
+        await asyncio.sleep(rng.expovariate(args.rps))
+    await asyncio.gather(*tasks)
+    primary.close()
+    backup.close()
+
+    return {
+        "scenario": name,
+        "success_rate": 1 - errors / args.requests,
+        "p50": _percentile(latencies, 50),
+        "p99": _percentile(latencies, 99),
+        **resilience.stats.as_dict(),
+    }
+
+
+def _request(timeout_ms: int = None, hedge: bool = False) -> ChatRequest:
+    return ChatRequest(
+        message=[ChatMessage(role="user", content="hello")],
+        timeout_ms=timeout_ms,
+        hedge=hedge,
+    )
+
+
+async def main(args):
+    print(
+        f"rps={args.rps} requests={args.requests} error_rate={args.error_rate} "
+        f"tail={args.tail_rate}@{args.tail_ms}ms timeout={args.timeout_ms}ms"
+    )
+    print(f"{'scenario':>18} {'success':>8} {'p50 ms':>8} {'p99 ms':>8} {'retries':>8} {'hedges':>8} {'won':>6}")
+    for name in SCENARIOS:
+        r = await simulate(name, args)
+        print(
+            f"{name:>18} {r['success_rate']:>8.2%} {r['p50']:>8.1f} {r['p99']:>8.1f} "
+            f"{r['retries']:>8} {r['hedges_fired']:>8} {r['hedge_wins']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rps", type=float, default=100.0)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--tail-ms", type=float, default=1000.0)
+    parser.add_argument("--timeout-ms", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main(parser.parse_args()))
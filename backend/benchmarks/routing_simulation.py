@@ -0,0 +1,102 @@
+"""
+Replay synthetic traffic against stub providers and compare tail latency
+across routing strategies.
+
+Three providers with different profiles share the load:
+- fast: low latency, small concurrency limit, occasional slow tail
+- steady: medium latency, large concurrency limit
+- cheap: slow but almost free
+
+    cd backend && python -m benchmarks.routing_simulation --rps 150 --requests 1500
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List
+
+from app.models import ChatMessage, ChatRequest
+from app.routing import STRATEGIES, Router, get_strategy
+
+from .stub_provider import StubProvider
+
+
+def _providers() -> List[StubProvider]:
+    return [
+        StubProvider("fast", latency_ms=20, jitter_ms=10, tail_rate=0.05, tail_ms=300,
+                     max_concurrency=4, cost_per_1k_tokens=0.5),
+        StubProvider("steady", latency_ms=60, jitter_ms=20, max_concurrency=32,
+                     cost_per_1k_tokens=0.2),
+        StubProvider("cheap", latency_ms=150, jitter_ms=50, max_concurrency=32,
+                     cost_per_1k_tokens=0.01),
+    ]
+
+
+def _request(rng: random.Random) -> ChatRequest:
+    words = " ".join("word" for _ in range(rng.randint(5, 400)))
+    return ChatRequest(
+        message=[ChatMessage(role="user", content=words)],
+        max_tokens=rng.choice([50, 200, 1000]),
+    )
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * percentile / 100), len(values) - 1)]
+
+
+async def simulate(strategy_name: str, rps: float, total: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    providers = _providers()
+    router = Router(get_strategy(strategy_name))
+    latencies: List[float] = []
+    cost = 0.0
+    chosen: Dict[str, int] = {p.name: 0 for p in providers}
+
+    async def one(request: ChatRequest):
+        nonlocal cost
+        start = time.perf_counter()
+        provider = router.select(providers, request)
+        chosen[provider.name] += 1
+        response = await provider.chat_completion(request, api_key="sim")
+        latencies.append((time.perf_counter() - start) * 1000)
+        cost += response.cost
+
+    tasks = []
+    for _ in range(total):
+        tasks.append(asyncio.create_task(one(_request(rng))))
+        await asyncio.sleep(rng.expovariate(rps))
+    await asyncio.gather(*tasks)
+    for p in providers:
+        p.close()
+
+    return {
+        "strategy": strategy_name,
+        "p50": _percentile(latencies, 50),
+        "p95": _percentile(latencies, 95),
+        "p99": _percentile(latencies, 99),
+        "cost": cost,
+        "split": chosen,
+    }
+
+
+async def main(args):
+    print(f"rps={args.rps} requests={args.requests}")
+    print(f"{'strategy':>22} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'cost $':>8}  split")
+    for name in args.strategies:
+        r = await simulate(name, args.rps, args.requests, args.seed)
+        split = " ".join(f"{k}={v}" for k, v in r["split"].items())
+        print(
+            f"{name:>22} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f} "
+            f"{r['cost']:>8.4f}  {split}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rps", type=float, default=150.0)
+    parser.add_argument("--requests", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES.keys()))
+    asyncio.run(main(parser.parse_args()))
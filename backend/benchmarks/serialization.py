@@ -0,0 +1,193 @@
+"""
+Per-request CPU cost of the JSON path around /chat: decoding and
+validating the request, encoding the response, building Gemini's request
+payload, and the whole gateway (ASGI app in, mock provider at zero
+latency, response bytes out) measured as process CPU time.
+
+Each step is timed for the previous way of doing it next to the current one.
+
+    cd backend && python -m benchmarks.serialization --iterations 20000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+# The provider enum is built from PROVIDERS when the app is first imported
+os.environ.update(
+    PROVIDERS="mock",
+    MOCK_LATENCY_DISTRIBUTION="constant",
+    MOCK_LATENCY_MS="0",
+    MOCK_INTER_TOKEN_MS="0",
+    JOBS_DB_PATH="",
+    USAGE_BACKEND="none",
+    RATE_LIMIT_ENABLED="false",
+    TRACE_SAMPLE_RATE="0",
+)
+
+from app.models import ChatRequest, ChatResponse
+from app.serialization import FastJSONResponse, loads, orjson
+
+
+def _request_body(turns: int) -> bytes:
+    messages = [{"role": "system", "content": "You are a helpful assistant. " * 20}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"question {i} " * 30})
+        messages.append({"role": "assistant", "content": f"answer {i} " * 60})
+    messages.append({"role": "user", "content": "and one more thing"})
+    return json.dumps(
+        {
+            "message": messages,
+            "api_keys": [{"name": "mock", "api_key": "bench"}],
+            "max_tokens": 512,
+            "temperature": 0.7,
+            "cache": False,
+        }
+    ).encode()
+
+
+def _response() -> ChatResponse:
+    return ChatResponse(
+        provider="gemini",
+        model="gemini-2.0-flash",
+        response="lorem ipsum dolor sit amet " * 80,
+        token_used=900,
+        prompt_tokens=500,
+        completion_tokens=400,
+        cost=0.0,
+        latency_ms="812.4",
+        timestamp=datetime.now(timezone.utc),
+    )
+
+
+def measure(fn: Callable[[], object], iterations: int) -> float:
+    """Microseconds of CPU per call"""
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def _decode(body: bytes, iterations: int) -> List:
+    return [
+        ("json.loads + validate", measure(lambda: ChatRequest.model_validate(json.loads(body)), iterations)),
+        ("loads + validate", measure(lambda: ChatRequest.model_validate(loads(body)), iterations)),
+    ]
+
+
+def _encode(iterations: int) -> List:
+    response = _response()
+    field = create_response_field("response", ChatResponse)
+
+    def fastapi_default():
+        # What `response_model=ChatResponse` does: dump, re-validate, dump, then encode.
+        # `serialize_response` never suspends here, so drive it without a loop
+        try:
+            serialize_response(field=field, response_content=response).send(None)
+        except StopIteration as done:
+            JSONResponse(done.value)
+
+    return [
+        ("response_model + JSONResponse", measure(fastapi_default, iterations)),
+        ("FastJSONResponse(model)", measure(lambda: FastJSONResponse(response), iterations)),
+    ]
+
+
+def _gemini(body: bytes, iterations: int) -> List:
+    try:
+        import google.generativeai as genai
+
+        from app.providers.gemini_provider import GeminiProvider
+    except ImportError:
+        return []
+    provider = GeminiProvider()
+    request = ChatRequest.model_validate_json(body)
+
+    def rebuilt_per_call():
+        # The config and role map as they were built on every call before
+        role_map = {"user": "user", "assistant": "model", "system": "system"}
+        [{"role": role_map[m.role], "parts": [{"text": m.content}]} for m in request.message]
+        genai.types.GenerationConfig(
+            temperature=request.temperature,
+            max_output_tokens=request.max_tokens,
+            candidate_count=1,
+            top_p=0.8,
+            top_k=10,
+        )
+        threshold = genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
+        {
+            genai.types.HarmCategory.HARM_CATEGORY_HARASSMENT: threshold,
+            genai.types.HarmCategory.HARM_CATEGORY_HATE_SPEECH: threshold,
+            genai.types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: threshold,
+            genai.types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: threshold,
+        }
+
+    def precomputed():
+        provider._format_message(request.message)
+        provider._request_config(request)
+
+    return [
+        ("gemini payload, rebuilt per call", measure(rebuilt_per_call, iterations)),
+        ("gemini payload, precomputed", measure(precomputed, iterations)),
+    ]
+
+
+async def _gateway(body: bytes, iterations: int) -> List:
+    from app import main
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/chat",
+        "raw_path": b"/chat",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            raise RuntimeError(f"/chat answered {message['status']}")
+
+    async with main.app.router.lifespan_context(main.app):
+        for _ in range(100):
+            await main.app(dict(scope), receive, send)
+        start = time.process_time()
+        for _ in range(iterations):
+            await main.app(dict(scope), receive, send)
+        elapsed = time.process_time() - start
+    return [("/chat end to end (mock, 0ms)", elapsed / iterations * 1e6)]
+
+
+def main(args):
+    body = _request_body(args.turns)
+    print(f"request {len(body)} bytes, {2 * args.turns + 2} messages; orjson={'yes' if orjson else 'no'}")
+    rows = _decode(body, args.iterations) + _encode(args.iterations) + _gemini(body, args.iterations)
+    rows += asyncio.run(_gateway(body, args.gateway_iterations))
+    print(f"{'step':>36} {'µs CPU/request':>16}")
+    for name, micros in rows:
+        print(f"{name:>36} {micros:>16.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--gateway-iterations", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=4, help="user/assistant turns in the request")
+    main(parser.parse_args())
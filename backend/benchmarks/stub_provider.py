@@ -0,0 +1,93 @@
+"""Stubbed provider used by the benchmarks"""
+
+import random
+import time
+from datetime import datetime, timezone
+from typing import Dict, Union
+
+from app.models import ChatRequest, ChatResponse
+from app.providers.base import BaseProvider
+from app.providers.errors import ProviderError
+
+
+class StubProvider(BaseProvider):
+    """
+    Provider that simulates a blocking SDK call with a fixed latency.
+
+    `blocking=True` reproduces the old behaviour (sync call on the event loop),
+    `blocking=False` goes through `BaseProvider.run_blocking`.
+    Faults: `error_rate` raises a retryable `ProviderError`, `fatal_error_rate`
+    a non-retryable one, `tail_rate` adds `tail_ms` of extra latency.
+    """
+
+    def __init__(
+        self,
+        name: str = "stub",
+        latency_ms: float = 50.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        blocking: bool = False,
+        max_concurrency: int = None,
+        tail_rate: float = 0.0,
+        tail_ms: float = 0.0,
+        cost_per_1k_tokens: float = 0.0,
+        fatal_error_rate: float = 0.0,
+    ):
+        super().__init__(name, max_concurrency=max_concurrency)
+        self.model_name = f"{name}-model"
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.blocking = blocking
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.cost_per_1k_tokens = cost_per_1k_tokens
+        self.fatal_error_rate = fatal_error_rate
+
+    def _generate(self, request: ChatRequest) -> str:
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if random.random() < self.tail_rate:
+            delay += self.tail_ms
+        time.sleep(delay / 1000)
+        roll = random.random()
+        if roll < self.error_rate:
+            raise ProviderError("stub provider overloaded", provider=self.name, retryable=True)
+        if roll < self.error_rate + self.fatal_error_rate:
+            raise ProviderError("stub provider rejected the request", provider=self.name)
+        return f"echo: {request.message[-1].content}"
+
+    def estimated_cost(self, tokens: int, model: str) -> float:
+        return tokens / 1000 * self.cost_per_1k_tokens
+
+    async def chat_completion(self, request: ChatRequest, api_key: str) -> ChatResponse:
+        start_time = time.time()
+        try:
+            if self.blocking:
+                text = self._generate(request)
+            else:
+                text = await self.run_blocking(self._generate, request)
+        except Exception as e:
+            self.update_metrics(
+                (time.time() - start_time) * 1000, False, str(e), model=self.model_name
+            )
+            raise
+        latency_ms = (time.time() - start_time) * 1000
+        prompt_tokens = self.count_prompt_tokens(request.message)
+        completion_tokens = self.count_tokens(text)
+        tokens = prompt_tokens + completion_tokens
+        cost = self.estimated_cost(tokens, self.model_name)
+        self.update_metrics(latency_ms, True, model=self.model_name, tokens=tokens, cost=cost)
+        return ChatResponse(
+            provider=self.name,
+            model=self.model_name,
+            response=text,
+            token_used=tokens,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost=cost,
+            latency_ms=f"{latency_ms:.1f}",
+            timestamp=datetime.now(timezone.utc),
+        )
+
+    async def health_check(self, api_key: str) -> Dict[str, Union[bool, str]]:
+        return {"status": True, "error": None}
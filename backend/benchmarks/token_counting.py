@@ -0,0 +1,77 @@
+"""
+Token counting throughput: the local heuristic counter on fresh text, the
+cached counter on conversations that repeat a long system prompt, and
+tiktoken when it is installed.
+
+    cd backend && python -m benchmarks.token_counting --conversations 2000
+"""
+
+import argparse
+import random
+import time
+
+from app.models import ChatMessage
+from app.tokens import (
+    CachedCounter,
+    HeuristicCounter,
+    TokenCounter,
+    count_message_tokens,
+    tiktoken,
+)
+
+WORDS = (
+    "the model returns a response with token usage metadata while latency and cost "
+    "depend on provider routing cache hits retries internationalization 2024 12345 "
+    "snake_case camelCase naïve café 日本語 ; : , . ! ? ( ) { } => == !="
+).split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _conversations(total: int, seed: int):
+    rng = random.Random(seed)
+    system_prompt = ChatMessage(role="system", content=_text(rng, 400))
+    return [
+        [system_prompt, ChatMessage(role="user", content=_text(rng, rng.randint(10, 200)))]
+        for _ in range(total)
+    ]
+
+
+def measure(counter: TokenCounter, conversations) -> dict:
+    start = time.perf_counter()
+    tokens = sum(count_message_tokens(counter, messages) for messages in conversations)
+    elapsed = time.perf_counter() - start
+    chars = sum(len(m.content) for messages in conversations for m in messages)
+    return {"tokens": tokens, "seconds": elapsed, "tokens_per_second": tokens / elapsed,
+            "chars_per_token": chars / tokens}
+
+
+def main(args):
+    conversations = _conversations(args.conversations, args.seed)
+    counters = [
+        ("heuristic", HeuristicCounter()),
+        ("heuristic + LRU cache", CachedCounter(HeuristicCounter())),
+    ]
+    if tiktoken is not None:
+        from app.tokens import TiktokenCounter
+
+        counters.append(("tiktoken cl100k_base", TiktokenCounter("cl100k_base")))
+        counters.append(("tiktoken + LRU cache", CachedCounter(TiktokenCounter("cl100k_base"))))
+
+    print(f"conversations={args.conversations} (shared 400-word system prompt)")
+    print(f"{'counter':>24} {'tokens':>10} {'seconds':>8} {'tokens/s':>12} {'chars/token':>12}")
+    for name, counter in counters:
+        r = measure(counter, conversations)
+        print(
+            f"{name:>24} {r['tokens']:>10} {r['seconds']:>8.3f} "
+            f"{r['tokens_per_second']:>12,.0f} {r['chars_per_token']:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
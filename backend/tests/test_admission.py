@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from app.admission import HIGH, LOW, NORMAL, AdaptiveLimit, OverloadedError, is_overload
+from app.providers.errors import ProviderError, ProviderTimeoutError
+
+
+def limiter(**kwargs) -> AdaptiveLimit:
+    options = {"max_limit": 10, "initial": 2, "min_limit": 1, "backoff": 0.5}
+    return AdaptiveLimit("test", **{**options, **kwargs})
+
+
+def test_initial_limit_is_clamped_between_min_and_max():
+    assert limiter(initial=50).limit == 10
+    assert limiter(initial=0).limit == 1
+    assert limiter(max_limit=3, min_limit=5).min_limit == 3
+
+
+def test_low_priority_is_shed_when_full():
+    async def run():
+        limit = limiter()
+        await limit.acquire(NORMAL, retry_after=1)
+        await limit.acquire(NORMAL, retry_after=1)
+        with pytest.raises(OverloadedError) as error:
+            await limit.acquire(LOW, retry_after=3)
+        return error.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 503 and error.retry_after == 3
+
+
+def test_waiters_are_woken_by_priority_then_arrival():
+    async def run():
+        limit = limiter(initial=1, queue_timeout_ms=5000)
+        await limit.acquire(NORMAL, retry_after=1)
+        order = []
+
+        async def wait(name: str, priority: int):
+            await limit.acquire(priority, retry_after=1)
+            order.append(name)
+
+        tasks = []
+        for name, priority in (("normal-1", NORMAL), ("high", HIGH), ("normal-2", NORMAL)):
+            tasks.append(asyncio.create_task(wait(name, priority)))
+            await asyncio.sleep(0)
+        for _ in tasks:
+            limit.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order, limit
+
+    order, limit = asyncio.run(run())
+    assert order == ["high", "normal-1", "normal-2"]
+    assert limit.in_flight == 1 and limit._waiters == []
+
+
+def test_waiter_is_shed_after_the_queue_timeout():
+    async def run():
+        limit = limiter(initial=1, queue_timeout_ms=10)
+        await limit.acquire(NORMAL, retry_after=1)
+        with pytest.raises(OverloadedError):
+            await limit.acquire(NORMAL, retry_after=1)
+        with pytest.raises(OverloadedError):
+            await limit.acquire(HIGH, retry_after=1, max_wait=0.001)
+        limit.release()
+        return limit
+
+    limit = asyncio.run(run())
+    assert limit.in_flight == 0
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def run():
+        limit = limiter(initial=1, queue_timeout_ms=5000)
+        await limit.acquire(NORMAL, retry_after=1)
+        task = asyncio.create_task(limit.acquire(NORMAL, retry_after=1))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        limit.release()
+        return limit
+
+    limit = asyncio.run(run())
+    assert limit.in_flight == 0
+
+
+def test_overload_cuts_once_per_round_trip():
+    limit = limiter(initial=8)
+    limit.on_sample(0.0, None, True)
+    assert limit.limit == 4 and limit.decreases == 1
+    # Started before the cut: the same overload episode
+    limit.on_sample(0.0, None, True)
+    assert limit.limit == 4 and limit.decreases == 1
+    limit.on_sample(limit._last_cut, None, True)
+    assert limit.limit == 2
+    for _ in range(5):
+        limit.on_sample(limit._last_cut, None, True)
+    assert limit.limit == 1
+
+
+def test_success_grows_the_limit_only_while_it_is_in_use():
+    limit = limiter(initial=4)
+    limit.on_sample(0.0, 10, False)
+    assert limit.limit == 4
+    limit.in_flight = 2
+    limit.on_sample(0.0, 10, False)
+    assert limit.limit == pytest.approx(4.25)
+    limit.in_flight = 10
+    for _ in range(1000):
+        limit.on_sample(0.0, 10, False)
+    assert limit.limit == 10
+
+
+def test_latency_counts_as_overload_only_with_a_tolerance():
+    limit = limiter(initial=8)
+    limit.on_sample(0.0, 10, False)
+    limit.on_sample(0.0, 1000, False)
+    assert limit.decreases == 0
+
+    limit = limiter(initial=8, tolerance=2)
+    limit.on_sample(0.0, 10, False)
+    limit.on_sample(0.0, 1000, False)
+    assert limit.decreases == 1
+
+
+def test_is_overload():
+    assert is_overload(asyncio.TimeoutError())
+    assert is_overload(ProviderTimeoutError("slow", provider="test"))
+    assert is_overload(ProviderError("busy", provider="test", status_code=429, retryable=True))
+    assert not is_overload(ProviderError("bad", provider="test", status_code=400, retryable=False))
+    assert not is_overload(OverloadedError("shed", retry_after=1))
+    assert not is_overload(ValueError())
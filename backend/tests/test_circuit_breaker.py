@@ -0,0 +1,94 @@
+import pytest
+
+from app import resilience
+from app.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+
+def breaker(**kwargs) -> CircuitBreaker:
+    options = {"failure_threshold": 3, "open_seconds": 10, "half_open_max_calls": 1}
+    return CircuitBreaker("test", **{**options, **kwargs})
+
+
+def test_opens_after_threshold_consecutive_failures(clock):
+    b = breaker()
+    b.record_failure()
+    b.record_failure()
+    assert b.state == CLOSED and b.try_acquire()
+    b.record_failure()
+    assert b.state == OPEN
+    assert not b.is_available() and not b.try_acquire()
+    assert b.times_opened == 1
+
+
+def test_success_resets_the_failure_count(clock):
+    b = breaker()
+    b.record_failure()
+    b.record_failure()
+    b.record_success()
+    b.record_failure()
+    b.record_failure()
+    assert b.state == CLOSED
+
+
+def test_half_open_after_open_seconds_limits_trial_calls(clock):
+    b = breaker(half_open_max_calls=2)
+    for _ in range(3):
+        b.record_failure()
+    clock.now += 9.9
+    assert b.state == OPEN
+    clock.now += 0.1
+    assert b.state == HALF_OPEN
+    assert b.try_acquire() and b.try_acquire()
+    assert not b.try_acquire() and not b.is_available()
+    b.release()
+    assert b.is_available()
+
+
+def test_half_open_success_closes(clock):
+    b = breaker()
+    for _ in range(3):
+        b.record_failure()
+    clock.now += 10
+    assert b.try_acquire()
+    b.record_success()
+    assert b.state == CLOSED and b.consecutive_failures == 0
+
+
+def test_half_open_failure_reopens_for_a_full_period(clock):
+    b = breaker()
+    for _ in range(3):
+        b.record_failure()
+    clock.now += 10
+    assert b.try_acquire()
+    b.record_failure()
+    assert b.state == OPEN
+    assert b.open_remaining() == pytest.approx(10)
+    assert b.times_opened == 2
+
+
+def test_adopt_open_only_from_closed_and_not_reported_back(clock):
+    b = breaker()
+    b.adopt_open(4)
+    assert b.state == OPEN and b.opened_by_peer
+    assert b.open_remaining() == 0.0
+    clock.now += 4
+    assert b.state == HALF_OPEN
+
+    b = breaker()
+    b.adopt_open(0)
+    assert b.state == CLOSED
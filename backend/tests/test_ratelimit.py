@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from app.providers.errors import RateLimitedError
+from app.ratelimit import (
+    BucketState,
+    Limits,
+    MemoryRateLimitBackend,
+    RateLimiter,
+    SQLiteRateLimitBackend,
+    give_back,
+    take,
+)
+
+
+class FakeProvider:
+    def __init__(self, name: str = "testprovider", rpm=None, tpm=None):
+        self.name = name
+        self.requests_per_minute = rpm
+        self.tokens_per_minute = tpm
+
+
+def test_take_from_a_new_bucket_starts_full():
+    state, wait = take(None, Limits(requests_per_minute=60, tokens_per_minute=600), 100, now=0)
+    assert wait == 0
+    assert state.requests == 59 and state.tokens == 500
+
+
+def test_take_waits_for_the_slower_bucket():
+    limits = Limits(requests_per_minute=60, tokens_per_minute=600)
+    empty = BucketState(requests=0.5, tokens=0, updated_at=0)
+    state, wait = take(empty, limits, 100, now=0)
+    # 0.5 request at 1/s, 100 tokens at 10/s
+    assert wait == pytest.approx(10)
+    assert state.requests == 0.5 and state.tokens == 0
+
+
+def test_take_refills_continuously_up_to_the_limit():
+    limits = Limits(requests_per_minute=60)
+    state, wait = take(BucketState(0, 0, updated_at=0), limits, 0, now=2.5)
+    assert wait == 0 and state.requests == pytest.approx(1.5)
+    state, _ = take(BucketState(0, 0, updated_at=0), limits, 0, now=3600)
+    assert state.requests == 59
+
+
+def test_request_larger_than_the_bucket_waits_for_a_full_bucket():
+    limits = Limits(tokens_per_minute=600)
+    state, wait = take(BucketState(0, 300, updated_at=0), limits, 10_000, now=0)
+    assert wait == pytest.approx(30)
+    state, wait = take(BucketState(0, 600, updated_at=0), limits, 10_000, now=0)
+    assert wait == 0 and state.tokens == 0
+
+
+def test_give_back_is_capped_at_the_limit():
+    limits = Limits(requests_per_minute=60, tokens_per_minute=600)
+    state = give_back(BucketState(59, 550, updated_at=0), limits, 5, 500, now=0)
+    assert state.requests == 60 and state.tokens == 600
+
+
+def test_peek_does_not_take_quota():
+    backend = MemoryRateLimitBackend()
+    limits = Limits(requests_per_minute=1)
+    assert backend.peek("k", limits, 0) == 0
+    assert backend.peek("k", limits, 0) == 0
+    assert backend.acquire("k", limits, 0) == 0
+    assert backend.peek("k", limits, 0) > 0
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "data" / "ratelimit.db")
+    limits = Limits(requests_per_minute=2)
+    first, second = SQLiteRateLimitBackend(path), SQLiteRateLimitBackend(path)
+    assert first.acquire("k", limits, 0) == 0
+    assert second.acquire("k", limits, 0) == 0
+    assert first.acquire("k", limits, 0) > 0
+    assert second.peek("k", limits, 0) > 0
+
+
+def test_acquire_rejects_when_the_wait_exceeds_the_budget():
+    limiter = RateLimiter(MemoryRateLimitBackend(), max_wait_ms=100)
+    provider = FakeProvider(rpm=60)
+
+    async def run():
+        for _ in range(60):
+            await limiter.acquire(provider, "key", 0)
+        with pytest.raises(RateLimitedError) as error:
+            await limiter.acquire(provider, "key", 0)
+        return error.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 429
+    assert limiter.admitted == 60 and limiter.rejected == 1
+
+
+def test_waiters_are_served_in_arrival_order_and_queues_are_dropped():
+    limiter = RateLimiter(MemoryRateLimitBackend(), max_wait_ms=5000)
+    # 1200 req/min: one request every 50ms once the bucket is empty
+    provider = FakeProvider(rpm=1200)
+    order = []
+
+    async def one(i: int):
+        await limiter.acquire(provider, "key", 0)
+        order.append(i)
+
+    async def run():
+        for _ in range(1200):
+            await limiter.acquire(provider, "key", 0)
+        tasks = []
+        for i in range(4):
+            tasks.append(asyncio.create_task(one(i)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == [0, 1, 2, 3]
+    assert limiter._queues == {} and limiter._members == {}
+
+
+def test_keys_have_separate_quotas_and_refund_restores_them():
+    limiter = RateLimiter(MemoryRateLimitBackend(), max_wait_ms=0)
+    provider = FakeProvider(rpm=1)
+
+    async def run():
+        await limiter.acquire(provider, "a", 0)
+        await limiter.acquire(provider, "b", 0)
+        assert await limiter.estimated_wait(provider, "a", 0) > 0
+        await limiter.refund(provider, "a", requests=1)
+        assert await limiter.estimated_wait(provider, "a", 0) == 0
+
+    asyncio.run(run())
+
+
+def test_unlimited_and_disabled_limiters_admit_everything():
+    async def run(limiter, provider):
+        for _ in range(100):
+            await limiter.acquire(provider, "key", 10**6)
+
+    asyncio.run(run(RateLimiter(MemoryRateLimitBackend()), FakeProvider()))
+    asyncio.run(
+        run(RateLimiter(MemoryRateLimitBackend(), enabled=False), FakeProvider(rpm=1))
+    )